@@ -0,0 +1,94 @@
+"""
+Bearer token authentication for API endpoints.
+
+``get_current_user`` validates the access token issued by ``/users/login``.
+The resolved identity is cached per token until the token expires, so
+repeat requests with the same token skip both the JWT signature check and
+the user lookup and cost about the same as anonymous ones.
+"""
+import time
+from typing import Optional
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import LRUCache
+from app.database import Settings, get_async_db
+from app.models import User
+from app.schemas import CurrentUser
+from app.security import ACCESS_TOKEN_EXPIRE_MINUTES, InvalidTokenError, decode_access_token
+
+# auto_error=False so a missing header gets the same 401 as a bad token
+bearer_scheme = HTTPBearer(auto_error=False)
+
+_claims_cache: Optional[LRUCache] = None
+
+
+def get_claims_cache() -> LRUCache:
+    """Return the process-wide cache of validated tokens, building it on first use."""
+    global _claims_cache
+    if _claims_cache is None:
+        settings = Settings()
+        _claims_cache = LRUCache(settings.token_cache_max_entries, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    return _claims_cache
+
+
+def credentials_error() -> HTTPException:
+    """Build the response used for missing, invalid or expired tokens."""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> CurrentUser:
+    """
+    Dependency returning the user the bearer token was issued to.
+
+    On a cache miss the token is decoded and the user is checked to still
+    exist; the result is then cached until the token's ``exp``.
+
+    Raises:
+        HTTPException: 401 if the token is missing, invalid, expired or
+            belongs to a user that no longer exists
+    """
+    if credentials is None:
+        raise credentials_error()
+    token = credentials.credentials
+
+    cache = get_claims_cache()
+    user = await cache.get(token)
+    if user is not None:
+        return user
+
+    try:
+        claims = decode_access_token(token)
+        user_id = UUID(claims["uid"])
+        expires_at = float(claims["exp"])
+    except (InvalidTokenError, KeyError, TypeError, ValueError):
+        raise credentials_error()
+
+    username = await db.scalar(select(User.username).where(User.id == user_id))
+    if username is None:
+        raise credentials_error()
+
+    user = CurrentUser(id=user_id, username=username)
+    await cache.set(token, user, ttl=expires_at - time.time())
+    return user
+
+
+async def forget_tokens() -> None:
+    """
+    Drop every cached token so the next request re-validates its user.
+
+    Called when a user is updated or deleted; tokens are not indexed by
+    user, and these changes are rare enough that a full clear is cheap.
+    """
+    await get_claims_cache().clear()
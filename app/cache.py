@@ -0,0 +1,187 @@
+"""
+Read-through cache for single-resource lookups.
+
+Backends share the async ``CacheBackend`` interface so a shared cache
+(e.g. Redis) can replace the default in-process LRU without touching the
+endpoints. Entries are invalidated explicitly by the handlers that modify
+the underlying rows; the TTL bounds staleness for changes made elsewhere.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.database import Settings
+
+
+class CacheBackend(ABC):
+    """Interface implemented by every cache backend."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key``, or None on a miss."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store ``value`` under ``key``; ``ttl`` overrides the default lifetime."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove ``key`` if present."""
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str) -> None:
+        """Remove every key starting with ``prefix``."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Remove every entry."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current size."""
+
+
+class NullCache(CacheBackend):
+    """Backend that never stores anything; used to disable caching."""
+
+    def __init__(self):
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def delete_prefix(self, prefix: str) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "none", "size": 0, "hits": 0, "misses": self.misses,
+                "evictions": 0, "expirations": 0}
+
+
+class LRUCache(CacheBackend):
+    """
+    In-process least-recently-used cache with a per-entry TTL.
+
+    Attributes:
+        max_entries: Entries kept before the least recently used is evicted
+        ttl_seconds: Default entry lifetime
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        lifetime = self.ttl_seconds if ttl is None else ttl
+        if lifetime <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self._clock() + lifetime)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Backend factories by Settings.cache_backend name; register shared backends here
+CACHE_BACKENDS: Dict[str, Callable[[Settings], CacheBackend]] = {
+    "memory": lambda settings: LRUCache(settings.cache_max_entries, settings.cache_ttl_seconds),
+    "none": lambda settings: NullCache(),
+}
+
+_cache: Optional[CacheBackend] = None
+
+
+def get_cache() -> CacheBackend:
+    """
+    Return the process-wide cache, building it from settings on first use.
+
+    Raises:
+        ValueError: If ``cache_backend`` names an unknown backend
+    """
+    global _cache
+    if _cache is None:
+        settings = Settings()
+        factory = CACHE_BACKENDS.get(settings.cache_backend)
+        if factory is None:
+            raise ValueError(
+                f"Unknown cache backend: {settings.cache_backend}. "
+                f"Supported backends: {', '.join(CACHE_BACKENDS)}"
+            )
+        _cache = factory(settings)
+    return _cache
+
+
+USER_PREFIX = "user:"
+CALCULATION_PREFIX = "calculation:"
+
+
+def user_key(user_id) -> str:
+    """Cache key for a user."""
+    return f"{USER_PREFIX}{user_id}"
+
+
+def calculation_key(calc_id) -> str:
+    """Cache key for a calculation."""
+    return f"{CALCULATION_PREFIX}{calc_id}"
@@ -0,0 +1,87 @@
+"""
+Command-line maintenance tasks.
+
+Usage:
+    python -m app.cli init-db
+    python -m app.cli rebuild-stats
+    python -m app.cli recompute [--type TYPE ...] [--chunk-size N] [--pause SECONDS] [--restart]
+"""
+import argparse
+import sys
+
+from app.database import get_engine, init_db
+from app.factory import CalculationFactory
+from app.recompute import DEFAULT_CHUNK_SIZE, recompute_results
+from app.statistics import rebuild_statistics
+
+
+def cmd_init_db(args: argparse.Namespace) -> int:
+    """Create any missing database tables and upgrade existing ones."""
+    for change in init_db():
+        print(change)
+    print("Database schema is up to date")
+    return 0
+
+
+def cmd_rebuild_stats(args: argparse.Namespace) -> int:
+    """Recompute the calculation statistics rollup from the calculations table."""
+    with get_engine().begin() as connection:
+        rows = rebuild_statistics(connection)
+    print(f"Rebuilt {rows} statistics rows")
+    return 0
+
+
+def cmd_recompute(args: argparse.Namespace) -> int:
+    """Rewrite stored calculation results with the current operation implementations."""
+    def report(totals: dict) -> None:
+        print(f"chunk {totals['chunks']}: {totals['rows_updated']} results updated so far", flush=True)
+
+    totals = recompute_results(
+        get_engine(),
+        operation_types=args.type,
+        chunk_size=args.chunk_size,
+        job=args.job,
+        restart=args.restart,
+        pause=args.pause,
+        progress=report,
+    )
+    resumed = " (resumed)" if totals["resumed"] else ""
+    print(f"Recomputed {totals['rows_updated']} results in {totals['chunks']} chunks{resumed}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with one sub-command per task."""
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    init_parser = subparsers.add_parser("init-db", help="Create missing tables and upgrade existing ones")
+    init_parser.set_defaults(func=cmd_init_db)
+
+    stats_parser = subparsers.add_parser("rebuild-stats", help="Recompute the calculation statistics rollup")
+    stats_parser.set_defaults(func=cmd_rebuild_stats)
+
+    recompute_parser = subparsers.add_parser(
+        "recompute", help="Recompute stored calculation results in chunks (resumable)"
+    )
+    recompute_parser.add_argument("--type", action="append", choices=CalculationFactory.get_supported_operations(),
+                                  help="Operation type to recompute (repeatable); defaults to all")
+    recompute_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                                  help="Rows per UPDATE transaction")
+    recompute_parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks")
+    recompute_parser.add_argument("--job", help="Checkpoint name (default derived from the types)")
+    recompute_parser.add_argument("--restart", action="store_true",
+                                  help="Ignore a previous checkpoint and start from the beginning")
+    recompute_parser.set_defaults(func=cmd_recompute)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """Parse arguments and run the selected command."""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Streaming export of stored rows as NDJSON or CSV.
+
+Rows are read through a server-side cursor in fixed-size partitions and
+each partition is encoded and sent before the next one is fetched, so
+memory use stays constant regardless of how many rows are exported.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas import ExportFormat
+
+# Rows fetched from the cursor (and encoded) per chunk
+EXPORT_CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def _plain(value):
+    """Convert database values to JSON/CSV friendly scalars."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_ndjson(columns: Sequence[str], rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, map(_plain, row))), separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+def _encode_csv(columns: Sequence[str], rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        ["" if value is None else _plain(value) for value in row] for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def stream_rows(
+    db: AsyncSession,
+    stmt,
+    export_format: ExportFormat,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> AsyncIterator[str]:
+    """
+    Execute ``stmt`` with a server-side cursor and yield encoded chunks.
+
+    Args:
+        db: Session the statement runs on; it must stay open while the
+            response streams
+        stmt: Core select of the columns to export
+        export_format: Output format
+        chunk_size: Rows fetched and encoded per chunk
+
+    Yields:
+        Encoded text, one chunk per partition (CSV starts with a header row)
+    """
+    result = await db.stream(stmt.execution_options(yield_per=chunk_size))
+    columns = list(result.keys())
+
+    if export_format == ExportFormat.CSV:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue()
+        encode = _encode_csv
+    else:
+        encode = _encode_ndjson
+
+    async for partition in result.partitions():
+        yield encode(columns, partition)
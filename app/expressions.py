@@ -0,0 +1,228 @@
+"""
+Compiled arithmetic expressions over named variables.
+
+An expression such as ``(a + b) * c / 2`` is parsed with Python's ``ast``
+module (only numbers, variable names, parentheses, unary +/- and the four
+binary operators are accepted) and compiled into a flat evaluation plan:
+a list of steps, each applying one registered ``Operation`` from
+``CalculationFactory`` to two value slots. Constant sub-expressions are
+folded at compile time and compiled plans are cached per source string, so
+repeated formulas skip parsing entirely.
+
+A plan evaluates either scalars, going through ``CalculationFactory.calculate``,
+or equal-length arrays, going through each operation's vectorized
+``calculate_array`` with per-element error reporting like batch requests.
+"""
+import ast
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.factory import NOT_FINITE, CalculationFactory
+
+# Compiled plans kept by source string
+EXPRESSION_CACHE_SIZE = int(os.getenv("EXPRESSION_CACHE_SIZE", "1024"))
+MAX_EXPRESSION_LENGTH = 1000
+
+# Python operators and the registered operation implementing each
+OPERATORS: Dict[type, str] = {
+    ast.Add: "Add",
+    ast.Sub: "Subtract",
+    ast.Mult: "Multiply",
+    ast.Div: "Divide",
+}
+
+Value = Union[float, Sequence[float]]
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression cannot be compiled or evaluated with the given variables."""
+
+
+class ExpressionPlan:
+    """
+    A compiled expression.
+
+    Values live in numbered slots: first the variables, then the constants,
+    then one temporary per step.
+
+    Attributes:
+        source: The expression text
+        variables: Variable names, in order of first use
+        constants: Literal values after constant folding
+        steps: ``(operation name, left slot, right slot)``; step ``i`` writes
+            slot ``len(variables) + len(constants) + i``
+        output: Slot holding the result
+    """
+
+    def __init__(
+        self,
+        source: str,
+        variables: Sequence[str],
+        constants: Sequence[float],
+        steps: Sequence[Tuple[str, int, int]],
+        output: int
+    ):
+        self.source = source
+        self.variables = tuple(variables)
+        self.constants = tuple(constants)
+        self.steps = tuple(steps)
+        self.output = output
+
+    def _inputs(self, values: Mapping[str, Value]) -> list:
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise ExpressionError(f"Missing variables: {', '.join(missing)}")
+        unknown = [name for name in values if name not in self.variables]
+        if unknown:
+            raise ExpressionError(f"Unknown variables: {', '.join(unknown)}")
+        return [values[name] for name in self.variables] + list(self.constants)
+
+    def evaluate(
+        self,
+        values: Mapping[str, Value]
+    ) -> Tuple[Union[float, np.ndarray], Optional[List[Optional[str]]]]:
+        """
+        Evaluate the plan over scalar or array variables.
+
+        Scalars may be mixed with arrays; every array must have the same length.
+
+        Returns:
+            ``(result, None)`` for scalar inputs; for array inputs, the result
+            array and per-element errors (``errors[i]`` is None on success,
+            otherwise ``result[i]`` is NaN)
+
+        Raises:
+            ExpressionError: If variables are missing, unknown or of mismatched length
+            ValueError: If a scalar evaluation is invalid (e.g. division by zero) or overflows
+        """
+        inputs = self._inputs(values)
+        lengths = {len(value) for value in inputs if not isinstance(value, (int, float))}
+        if not lengths:
+            return self.evaluate_scalar(inputs), None
+        if len(lengths) > 1:
+            raise ExpressionError("Array variables must all have the same length")
+        return self.evaluate_array(inputs, lengths.pop())
+
+    def evaluate_scalar(self, inputs: List[float]) -> float:
+        """Evaluate over scalar slot values (variables then constants)."""
+        slots = [float(value) for value in inputs]
+        for name, left, right in self.steps:
+            slots.append(CalculationFactory.calculate(name, slots[left], slots[right]))
+        # Steps check their own results; a plan without steps returns an input as is
+        if not math.isfinite(slots[self.output]):
+            raise ValueError(NOT_FINITE)
+        return slots[self.output]
+
+    def evaluate_array(self, inputs: list, length: int) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """Evaluate element-wise over slot values, broadcasting scalars to ``length``."""
+        slots = [np.broadcast_to(np.asarray(value, dtype=float), (length,)) for value in inputs]
+        failed = np.zeros(length, dtype=bool)
+        errors: List[Optional[str]] = [None] * length
+        for name, left, right in self.steps:
+            operation = CalculationFactory.create_operation(name)
+            a, b = slots[left], slots[right]
+            invalid = operation.invalid_inputs(a, b) & ~failed
+            with np.errstate(over="ignore", invalid="ignore"):
+                result = np.array(operation.calculate_array(a, b), dtype=float)
+            overflow = ~failed & ~invalid & ~np.isfinite(result)
+            for i in np.flatnonzero(invalid):
+                errors[i] = operation.invalid_message
+            for i in np.flatnonzero(overflow):
+                errors[i] = NOT_FINITE
+            failed |= invalid | overflow
+            result[failed] = np.nan
+            slots.append(result)
+        output = np.array(slots[self.output], dtype=float)
+        for i in np.flatnonzero(~failed & ~np.isfinite(output)):
+            errors[i] = NOT_FINITE
+        failed |= ~np.isfinite(output)
+        output[failed] = np.nan
+        return output, errors
+
+
+class _Compiler:
+    """Turns a parsed expression into an ``ExpressionPlan``."""
+
+    def __init__(self):
+        self.variables: List[str] = []
+        self.constants: List[float] = []
+        # Operands are references ("var" | "const" | "step", index) until
+        # compile() maps them to slots
+        self.steps: List[Tuple[str, Tuple[str, int], Tuple[str, int]]] = []
+
+    def compile(self, source: str, tree: ast.Expression) -> ExpressionPlan:
+        output = self.visit(tree.body)
+        offsets = {"var": 0, "const": len(self.variables), "step": len(self.variables) + len(self.constants)}
+
+        def slot(ref: Tuple[str, int]) -> int:
+            return offsets[ref[0]] + ref[1]
+
+        steps = [(name, slot(left), slot(right)) for name, left, right in self.steps]
+        return ExpressionPlan(source, self.variables, self.constants, steps, slot(output))
+
+    def constant(self, value: Union[int, float]) -> Tuple[str, int]:
+        try:
+            value = float(value)
+        except OverflowError as e:
+            # Integer literals can exceed the float range
+            raise ExpressionError(NOT_FINITE) from e
+        if not math.isfinite(value):
+            raise ExpressionError(NOT_FINITE)
+        self.constants.append(value)
+        return ("const", len(self.constants) - 1)
+
+    def operation(self, name: str, left: Tuple[str, int], right: Tuple[str, int]) -> Tuple[str, int]:
+        if left[0] == "const" and right[0] == "const":
+            # Both operands are known: fold instead of emitting a step
+            folded = CalculationFactory.calculate(name, self.constants[left[1]], self.constants[right[1]])
+            return self.constant(folded)
+        self.steps.append((name, left, right))
+        return ("step", len(self.steps) - 1)
+
+    def visit(self, node: ast.AST) -> Tuple[str, int]:
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return self.constant(node.value)
+        if isinstance(node, ast.Name):
+            if node.id not in self.variables:
+                self.variables.append(node.id)
+            return ("var", self.variables.index(node.id))
+        if isinstance(node, ast.BinOp):
+            name = OPERATORS.get(type(node.op))
+            if name is None:
+                raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+            left = self.visit(node.left)
+            right = self.visit(node.right)
+            return self.operation(name, left, right)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            operand = self.visit(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            # Multiplying by -1 keeps the sign of zero, unlike 0 - x
+            return self.operation("Multiply", self.constant(-1.0), operand)
+        raise ExpressionError(f"Unsupported syntax in expression: {type(node).__name__}")
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(source: str) -> ExpressionPlan:
+    """
+    Parse and compile an expression, reusing the cached plan for repeated sources.
+
+    Raises:
+        ExpressionError: If the expression is too long, malformed or uses
+            anything other than numbers, names, parentheses and + - * /
+        ValueError: If a constant sub-expression is invalid (e.g. ``1 / 0``)
+    """
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except (SyntaxError, RecursionError, MemoryError) as e:
+        raise ExpressionError("Invalid expression syntax") from e
+    try:
+        return _Compiler().compile(source, tree)
+    except RecursionError as e:
+        raise ExpressionError("Expression is nested too deeply") from e
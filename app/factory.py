@@ -3,9 +3,39 @@ Factory pattern for calculation operations.
 
 This module implements the Factory design pattern to create different
 calculation operations (Add, Subtract, Multiply, Divide) dynamically.
+Operations can also be evaluated column-wise over NumPy arrays for batch
+requests. Duplicate items within a batch are evaluated once; an optional
+LRU memo for repeated scalar inputs is off by default, since a dispatch is
+cheaper than the memo lookup. Every path rejects results that
+are not finite (overflow to infinity, or NaN from infinite operands).
 """
+import math
+import os
+import sys
 from abc import ABC, abstractmethod
-from typing import Dict, Type
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+from sqlalchemy import and_, case, func, or_
+
+from app.schemas import OperationType
+
+# Distinct (type, a, b) inputs whose results are remembered; 0 (the default)
+# disables the memo. Only worth enabling for operations far costlier than
+# the built-in arithmetic.
+CALCULATION_MEMO_SIZE = int(os.getenv("CALCULATION_MEMO_SIZE", "0"))
+
+NOT_FINITE = "Result is not a finite number"
+FLOAT_MAX = sys.float_info.max
+
+
+def _same_sign(a, b):
+    return or_(and_(a > 0, b > 0), and_(a < 0, b < 0))
+
+
+def _opposite_sign(a, b):
+    return or_(and_(a > 0, b < 0), and_(a < 0, b > 0))
 
 
 class Operation(ABC):
@@ -13,7 +43,12 @@ class Operation(ABC):
     Abstract base class for all calculation operations.
     
     Each concrete operation must implement the calculate method.
+    Operations that reject some inputs override ``invalid_inputs`` and set
+    ``invalid_message``.
     """
+
+    #: Error reported for inputs flagged by invalid_inputs
+    invalid_message: Optional[str] = None
     
     @abstractmethod
     def calculate(self, a: float, b: float) -> float:
@@ -29,6 +64,44 @@ class Operation(ABC):
         """
         pass
 
+    def calculate_array(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """
+        Perform the calculation element-wise over two arrays.
+
+        The default implementation calls ``calculate`` per element; concrete
+        operations override it with a NumPy ufunc. Results for elements
+        flagged by ``invalid_inputs`` are unspecified.
+        """
+        return np.array([self.calculate(x, y) for x, y in zip(a, b)], dtype=float)
+
+    def invalid_inputs(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Return a boolean mask of operand pairs this operation rejects."""
+        return np.zeros(len(a), dtype=bool)
+
+    def sql_expression(self, a, b):
+        """
+        Build the SQL expression computing this operation.
+
+        Args:
+            a: SQL expression for the first operand (column or bound value)
+            b: SQL expression for the second operand
+
+        The default uses ``calculate``, which works for operations that only
+        apply arithmetic operators to their arguments.
+        """
+        return self.calculate(a, b)
+
+    def sql_invalid(self, a, b):
+        """
+        Build a SQL condition that is true for operands this operation
+        rejects, or None if every input is valid.
+
+        Operations whose result can overflow include that in the condition.
+        The condition itself must not overflow or divide by zero for any
+        operands, since the database may evaluate every branch of it.
+        """
+        return None
+
 
 class AddOperation(Operation):
     """Addition operation."""
@@ -37,6 +110,12 @@ class AddOperation(Operation):
         """Add two numbers."""
         return a + b
 
+    def calculate_array(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.add(a, b)
+
+    def sql_invalid(self, a, b):
+        return and_(_same_sign(a, b), func.abs(a) > FLOAT_MAX - func.abs(b))
+
 
 class SubtractOperation(Operation):
     """Subtraction operation."""
@@ -45,6 +124,12 @@ class SubtractOperation(Operation):
         """Subtract b from a."""
         return a - b
 
+    def calculate_array(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.subtract(a, b)
+
+    def sql_invalid(self, a, b):
+        return and_(_opposite_sign(a, b), func.abs(a) > FLOAT_MAX - func.abs(b))
+
 
 class MultiplyOperation(Operation):
     """Multiplication operation."""
@@ -53,9 +138,18 @@ class MultiplyOperation(Operation):
         """Multiply two numbers."""
         return a * b
 
+    def calculate_array(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.multiply(a, b)
+
+    def sql_invalid(self, a, b):
+        # |a * b| > MAX, dividing by max(|b|, 1) so the bound cannot overflow
+        return func.abs(a) > FLOAT_MAX / case((func.abs(b) > 1, func.abs(b)), else_=1.0)
+
 
 class DivideOperation(Operation):
     """Division operation."""
+
+    invalid_message = "Division by zero is not allowed"
     
     def calculate(self, a: float, b: float) -> float:
         """
@@ -68,12 +162,33 @@ class DivideOperation(Operation):
             raise ValueError("Division by zero is not allowed")
         return a / b
 
+    def calculate_array(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # Zero divisors are reported through invalid_inputs, not as warnings
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.divide(a, b)
+
+    def invalid_inputs(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return b == 0
+
+    def sql_expression(self, a, b):
+        # Zero divisors must be guarded with sql_invalid in a CASE evaluated
+        # first: conditions in a WHERE clause may run in any order
+        return a / b
+
+    def sql_invalid(self, a, b):
+        # |a / b| > MAX, multiplying by min(|b|, 1) so the bound cannot overflow
+        return or_(b == 0, func.abs(a) > FLOAT_MAX * case((func.abs(b) < 1, func.abs(b)), else_=1.0))
+
 
 class CalculationFactory:
     """
     Factory class for creating calculation operations.
     
     Uses a registry pattern to map operation types to their implementations.
+    Operations are stateless, so each registered class is instantiated once
+    and ``calculate`` dispatches straight to the shared instance's bound
+    method. This is the only calculation engine: the API and the batch,
+    SQL and vectorized paths all go through it.
     """
     
     # Registry mapping operation names to their classes
@@ -83,28 +198,68 @@ class CalculationFactory:
         "Multiply": MultiplyOperation,
         "Divide": DivideOperation,
     }
+
+    # Shared instances and calculate methods, keyed by name and OperationType
+    _instances: Dict[Union[str, OperationType], Operation] = {}
+    _dispatch: Dict[Union[str, OperationType], Callable[[float, float], float]] = {}
+
+    # LRU memo over _compute (None when disabled) and batch dedup counters
+    _memo: Optional[Callable[[Union[str, OperationType], float, float], float]] = None
+    _batch_items = 0
+    _batch_duplicates = 0
+
+    @classmethod
+    def _build_dispatch(cls) -> None:
+        """Instantiate every registered operation and rebuild the dispatch table."""
+        instances = {}
+        for name, operation_class in cls._operations.items():
+            operation = operation_class()
+            instances[name] = operation
+            if name in OperationType._value2member_map_:
+                instances[OperationType(name)] = operation
+        cls._instances = instances
+        cls._dispatch = {key: operation.calculate for key, operation in instances.items()}
+        # Remembered results may come from a replaced implementation
+        cls._memo = lru_cache(maxsize=CALCULATION_MEMO_SIZE)(cls._compute) if CALCULATION_MEMO_SIZE > 0 else None
+
+    @classmethod
+    def register_operation(cls, name: str, operation_class: Type[Operation]) -> None:
+        """
+        Register (or replace) an operation implementation.
+
+        Args:
+            name: Operation type name
+            operation_class: Operation subclass implementing it
+        """
+        cls._operations[name] = operation_class
+        cls._build_dispatch()
+
+    @classmethod
+    def _unsupported(cls, operation_type) -> ValueError:
+        name = getattr(operation_type, "value", operation_type)
+        return ValueError(
+            f"Unsupported operation type: {name}. "
+            f"Supported types: {', '.join(cls._operations.keys())}"
+        )
     
     @classmethod
-    def create_operation(cls, operation_type: str) -> Operation:
+    def create_operation(cls, operation_type: Union[str, OperationType]) -> Operation:
         """
-        Create an operation instance based on the operation type.
+        Get the operation instance for an operation type.
         
         Args:
             operation_type: Type of operation (Add, Subtract, Multiply, Divide)
             
         Returns:
-            An instance of the appropriate Operation subclass
+            The shared instance of the appropriate Operation subclass
             
         Raises:
             ValueError: If operation_type is not supported
         """
-        operation_class = cls._operations.get(operation_type)
-        if operation_class is None:
-            raise ValueError(
-                f"Unsupported operation type: {operation_type}. "
-                f"Supported types: {', '.join(cls._operations.keys())}"
-            )
-        return operation_class()
+        operation = cls._instances.get(operation_type)
+        if operation is None:
+            raise cls._unsupported(operation_type)
+        return operation
     
     @classmethod
     def get_supported_operations(cls) -> list[str]:
@@ -117,9 +272,22 @@ class CalculationFactory:
         return list(cls._operations.keys())
     
     @classmethod
-    def calculate(cls, operation_type: str, a: float, b: float) -> float:
+    def _compute(cls, operation_type: Union[str, OperationType], a: float, b: float) -> float:
+        calculate = cls._dispatch.get(operation_type)
+        if calculate is None:
+            raise cls._unsupported(operation_type)
+        return calculate(a, b)
+
+    @classmethod
+    def calculate(cls, operation_type: Union[str, OperationType], a: float, b: float) -> float:
         """
-        Convenience method to create an operation and calculate in one step.
+        Calculate a result through the dispatch table.
+
+        With the memo enabled, results are memoized per
+        ``(operation_type, a, b)``; failures are not.
+        Zero operands bypass the memo because 0.0 and -0.0 are equal keys
+        but can produce results of different sign. Results that are not
+        finite are rejected like invalid operands.
         
         Args:
             operation_type: Type of operation
@@ -128,6 +296,157 @@ class CalculationFactory:
             
         Returns:
             Result of the calculation
+
+        Raises:
+            ValueError: If operation_type is not supported, the operands
+                are invalid for it (e.g. division by zero) or the result is
+                not finite
+        """
+        if cls._memo is None or a == 0 or b == 0:
+            result = cls._compute(operation_type, a, b)
+        else:
+            result = cls._memo(operation_type, a, b)
+        if not math.isfinite(result):
+            raise ValueError(NOT_FINITE)
+        return result
+
+    @classmethod
+    def memo_stats(cls) -> dict:
+        """Return memo hit/miss counters and how many batch items were duplicates."""
+        info = cls._memo.cache_info() if cls._memo is not None else None
+        hits = info.hits if info else 0
+        misses = info.misses if info else 0
+        return {
+            "enabled": info is not None,
+            "size": info.currsize if info else 0,
+            "max_entries": CALCULATION_MEMO_SIZE,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "batch_items": cls._batch_items,
+            "batch_duplicates": cls._batch_duplicates,
+        }
+
+    @classmethod
+    def sql_result(cls, operation_type, a, b):
+        """
+        Build the SQL expression computing a calculation result.
+
+        Args:
+            operation_type: Operation name, or a SQL expression (e.g. the
+                ``type`` column) evaluated per row with a CASE
+            a: SQL expression for the first operand
+            b: SQL expression for the second operand
+
+        Raises:
+            ValueError: If a named operation_type is not supported
+        """
+        if isinstance(operation_type, str):
+            return cls.create_operation(operation_type).sql_expression(a, b)
+        return case(
+            {name: cls.create_operation(name).sql_expression(a, b) for name in cls._operations},
+            value=operation_type
+        )
+
+    @classmethod
+    def sql_invalid(cls, operation_type, a, b):
         """
-        operation = cls.create_operation(operation_type)
-        return operation.calculate(a, b)
+        Build a SQL condition that is true when the operands are invalid for
+        the operation, or None when no input can be invalid.
+
+        Args:
+            operation_type: Operation name, or a SQL expression such as the
+                ``type`` column
+            a: SQL expression for the first operand
+            b: SQL expression for the second operand
+        """
+        if isinstance(operation_type, str):
+            return cls.create_operation(operation_type).sql_invalid(a, b)
+        conditions = []
+        for name in cls._operations:
+            condition = cls.create_operation(name).sql_invalid(a, b)
+            if condition is not None:
+                conditions.append(and_(operation_type == name, condition))
+        return or_(*conditions) if conditions else None
+
+    @classmethod
+    def calculate_batch(
+        cls,
+        operation_types: Sequence[Union[str, OperationType]],
+        a: Sequence[float],
+        b: Sequence[float]
+    ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        Evaluate many calculations column-wise.
+
+        Identical items are evaluated once; the remaining items are grouped by
+        operation type and each group is evaluated with a single vectorized
+        call. Failures are reported per item instead of aborting the whole
+        batch.
+
+        Args:
+            operation_types: Operation type of each item
+            a: First operand of each item
+            b: Second operand of each item
+
+        Returns:
+            Tuple of (results, errors). ``errors[i]`` is None when item ``i``
+            succeeded; otherwise ``results[i]`` is NaN.
+        """
+        # Compare by name: NumPy does not treat str-based enum members as equal to their values
+        types = np.asarray([getattr(t, "value", t) for t in operation_types], dtype=object)
+        a_values = np.asarray(a, dtype=float)
+        b_values = np.asarray(b, dtype=float)
+        count = len(a_values)
+
+        if count > 1:
+            # Identical items share (type, bit pattern of a, bit pattern of b);
+            # comparing bits keeps 0.0 and -0.0 apart
+            keys = zip(types.tolist(), a_values.view(np.int64).tolist(), b_values.view(np.int64).tolist())
+            seen: Dict[tuple, int] = {}
+            inverse = np.fromiter((seen.setdefault(key, len(seen)) for key in keys), dtype=np.intp, count=count)
+            cls._batch_items += count
+            cls._batch_duplicates += count - len(seen)
+            if len(seen) < count:
+                first = np.unique(inverse, return_index=True)[1]
+                results, errors = cls._evaluate_batch(types[first], a_values[first], b_values[first])
+                return results[inverse], [errors[i] for i in inverse]
+
+        return cls._evaluate_batch(types, a_values, b_values)
+
+    @classmethod
+    def _evaluate_batch(
+        cls,
+        types: np.ndarray,
+        a_values: np.ndarray,
+        b_values: np.ndarray
+    ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        results = np.full(len(a_values), np.nan)
+        errors: List[Optional[str]] = [None] * len(a_values)
+
+        for operation_type in set(types.tolist()):
+            mask = types == operation_type
+            indices = np.flatnonzero(mask)
+            try:
+                operation = cls.create_operation(operation_type)
+            except ValueError as e:
+                for i in indices:
+                    errors[i] = str(e)
+                continue
+
+            group_a, group_b = a_values[mask], b_values[mask]
+            invalid = operation.invalid_inputs(group_a, group_b)
+            with np.errstate(over="ignore", invalid="ignore"):
+                group_results = operation.calculate_array(group_a, group_b)
+            overflow = ~invalid & ~np.isfinite(group_results)
+            for i in indices[invalid]:
+                errors[i] = operation.invalid_message
+            for i in indices[overflow]:
+                errors[i] = NOT_FINITE
+            group_results[invalid | overflow] = np.nan
+            results[indices] = group_results
+
+        return results, errors
+
+
+CalculationFactory._build_dispatch()
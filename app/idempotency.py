@@ -0,0 +1,272 @@
+"""
+Idempotency keys for retried POST requests.
+
+A client that retries a POST after a timeout cannot tell whether the first
+attempt succeeded. When the request carries an ``Idempotency-Key`` header,
+``IdempotencyMiddleware`` stores the first response (status, headers and
+body) for a TTL and replays it for later requests with the same key,
+without running the handler again. A duplicate arriving while the first
+request is still running waits for it instead of racing it.
+
+Keys are scoped to the route and to the caller's Authorization header, and
+a key reused with a different request body is rejected.
+"""
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app.cache import LRUCache
+from app.database import Settings
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse(NamedTuple):
+    """A completed response kept for replay."""
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class IdempotencyBackend(ABC):
+    """Interface implemented by every idempotency store."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        """Return the stored response for ``key``, or None."""
+
+    @abstractmethod
+    async def acquire(self, key: str) -> bool:
+        """
+        Mark ``key`` as in flight.
+
+        Returns:
+            True if the caller now owns the key, False if another request does
+        """
+
+    @abstractmethod
+    async def wait(self, key: str, timeout: float) -> bool:
+        """
+        Wait until ``key`` is no longer in flight.
+
+        Returns:
+            False if it was still in flight after ``timeout`` seconds
+        """
+
+    @abstractmethod
+    async def release(self, key: str, response: Optional[StoredResponse]) -> None:
+        """Store ``response`` (if given) and wake the requests waiting on ``key``."""
+
+
+class MemoryIdempotencyBackend(IdempotencyBackend):
+    """
+    In-process store; keys are only shared by requests served by one worker.
+
+    Attributes:
+        responses: TTL/LRU cache of completed responses
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.responses = LRUCache(max_entries, ttl_seconds)
+        self._in_flight: Dict[str, asyncio.Event] = {}
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        return await self.responses.get(key)
+
+    async def acquire(self, key: str) -> bool:
+        if key in self._in_flight:
+            return False
+        self._in_flight[key] = asyncio.Event()
+        return True
+
+    async def wait(self, key: str, timeout: float) -> bool:
+        event = self._in_flight.get(key)
+        if event is None:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def release(self, key: str, response: Optional[StoredResponse]) -> None:
+        if response is not None:
+            await self.responses.set(key, response)
+        event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+# Backend factories by Settings.idempotency_backend name; register shared backends here
+IDEMPOTENCY_BACKENDS: Dict[str, Callable[[Settings], IdempotencyBackend]] = {
+    "memory": lambda settings: MemoryIdempotencyBackend(
+        settings.idempotency_max_entries, settings.idempotency_ttl_seconds
+    ),
+}
+
+_backend: Optional[IdempotencyBackend] = None
+_disabled = False
+
+
+def get_idempotency_backend() -> Optional[IdempotencyBackend]:
+    """
+    Return the process-wide store, or None when idempotency keys are disabled.
+
+    Raises:
+        ValueError: If ``idempotency_backend`` names an unknown backend
+    """
+    global _backend, _disabled
+    if _backend is None and not _disabled:
+        settings = Settings()
+        if settings.idempotency_backend == "none":
+            _disabled = True
+            return None
+        factory = IDEMPOTENCY_BACKENDS.get(settings.idempotency_backend)
+        if factory is None:
+            raise ValueError(
+                f"Unknown idempotency backend: {settings.idempotency_backend}. "
+                f"Supported backends: {', '.join(IDEMPOTENCY_BACKENDS)}, none"
+            )
+        _backend = factory(settings)
+    return _backend
+
+
+def reset_idempotency_backend() -> None:
+    """Drop the process-wide store so it is rebuilt (empty) on next use."""
+    global _backend, _disabled
+    _backend = None
+    _disabled = False
+
+
+def should_store(status: int) -> bool:
+    """
+    Whether a response is final for its key.
+
+    Server errors and rate limiting are transient, so a retry with the same
+    key runs the handler again.
+    """
+    return status < 500 and status != 429
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware replaying stored responses for repeated idempotency keys.
+
+    Only requests to ``routes`` that carry the ``Idempotency-Key`` header
+    are affected; everything else passes straight through.
+
+    Attributes:
+        routes: ``(method, path)`` pairs that accept idempotency keys
+        wait_seconds: How long a duplicate waits for the in-flight original;
+            read from settings on first use when not given
+    """
+
+    def __init__(self, app, routes: Iterable[Tuple[str, str]], wait_seconds: Optional[float] = None):
+        self.app = app
+        self.routes = set(routes)
+        self.wait_seconds = wait_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        backend = get_idempotency_backend() if idempotency_key is not None else None
+        if backend is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._error(scope, receive, send, 400,
+                              f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+            return
+
+        body = await self._read_body(receive)
+        route = f"{scope['method']} {scope['path']}"
+        fingerprint = hashlib.sha256(route.encode() + b"\n" + body).hexdigest()
+        caller = hashlib.sha256(headers.get("authorization", "").encode()).hexdigest()
+        key = f"{route}:{caller}:{idempotency_key}"
+        if self.wait_seconds is None:
+            self.wait_seconds = Settings().idempotency_wait_seconds
+
+        while True:
+            stored = await backend.get(key)
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    await self._error(scope, receive, send, 422,
+                                      f"{IDEMPOTENCY_HEADER} was already used with a different request")
+                    return
+                await self._replay(stored, send)
+                return
+            if await backend.acquire(key):
+                break
+            if not await backend.wait(key, self.wait_seconds):
+                await self._error(scope, receive, send, 409,
+                                  "A request with this idempotency key is still in progress")
+                return
+
+        await self._run(scope, receive, send, body, backend, key, fingerprint)
+
+    async def _run(self, scope, receive, send, body: bytes, backend: IdempotencyBackend,
+                   key: str, fingerprint: str) -> None:
+        """Run the handler once, capturing its response for later replays."""
+        status = None
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        complete = False
+        body_sent = False
+
+        async def replay_receive():
+            # The body was consumed up front to fingerprint it
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            nonlocal status, complete
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers.extend(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        stored = None
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            if complete and should_store(status):
+                stored = StoredResponse(fingerprint, status, response_headers, b"".join(chunks))
+        finally:
+            await backend.release(key, stored)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _replay(stored: StoredResponse, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": stored.headers + [(REPLAYED_HEADER.lower().encode(), b"true")],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
+
+    @staticmethod
+    async def _error(scope, receive, send, status_code: int, detail: str) -> None:
+        await JSONResponse({"detail": detail}, status_code=status_code)(scope, receive, send)
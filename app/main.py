@@ -1,36 +1,186 @@
 """
 Main FastAPI application with user management endpoints.
 """
-from fastapi import FastAPI, Depends, HTTPException, status
+import math
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy import Float, delete, insert, literal, not_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import UUID
 
-from app.database import get_db, engine, Base
-from app.models import User, Calculation
+from app.database import get_async_db, get_async_engine, dispose_engines, pool_stats, Base
+from app.models import User, Calculation, CalculationStats, Expression
+from app.pagination import KeysetOrder, InvalidCursorError
+from app.auth import get_current_user, forget_tokens
 from app.schemas import (
-    UserCreate, UserRead, UserUpdate, UserLogin,
-    CalculationCreate, CalculationRead, CalculationUpdate, OperationType
+    UserCreate, UserRead, UserUpdate, UserLogin, CurrentUser,
+    CalculationCreate, CalculationRead, CalculationUpdate,
+    CalculationBatchCreate, CalculationBatchRead, CalculationBatchResult, ExportFormat,
+    CalculationStatsRead, OperationType, ExpressionCreate, ExpressionRead, TotalMode
+)
+from app.export import stream_rows, MEDIA_TYPES
+from app.cache import get_cache, user_key, calculation_key, CALCULATION_PREFIX
+from app.factory import NOT_FINITE, CalculationFactory
+from app.expressions import compile_expression
+from app.metrics import MetricsMiddleware, registry, record_pool, observe_hashing, CONTENT_TYPE, RATE_LIMITED
+from app.ratelimit import get_rate_limiter, RateLimitExceededError
+from app.statistics import record_results, remove_result, describe
+from app.responses import json_list_response, USER_LIST, CALCULATION_LIST
+from app.idempotency import IdempotencyMiddleware
+from app.totals import (
+    exact_table_count, estimated_table_count, user_calculation_count, set_total_headers,
+    start_count_refresh, stop_count_refresh
+)
+from app.writebehind import (
+    CalculationWriter, WriteBehindFullError, get_calculation_writer, close_calculation_writer
 )
-from app.security import hash_password, verify_password, create_access_token
+from app.security import (
+    hash_password_async, verify_password_async, create_access_token,
+    hashing_pool, HashingPoolFullError, ACCESS_TOKEN_EXPIRE_MINUTES,
+    configure_bcrypt_rounds, needs_rehash
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Manage per-process resources.
+
+    The database engine is created lazily by the first request in each
+    worker; on shutdown its pool and the password hashing threads are
+    released. Schema creation is a deployment step (``python -m app.cli
+    init-db``) rather than part of worker startup.
+
+    At startup the bcrypt cost factor is calibrated for this machine and
+    the background refresh of cached table counts is started. On shutdown
+    calculations still queued for a group commit are flushed before the
+    engine is disposed.
+    """
+    configure_bcrypt_rounds()
+    start_count_refresh()
+    yield
+    await stop_count_refresh()
+    await close_calculation_writer()
+    hashing_pool.shutdown()
+    await dispose_engines()
 
-# Create all tables on startup
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Secure FastAPI Application",
     description="User management with secure password hashing and database integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson encodes the validated response content faster than the stdlib
+    default_response_class=ORJSONResponse
 )
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database tables on startup."""
-    Base.metadata.create_all(bind=engine)
+# Retried creates replay their first response instead of running again
+app.add_middleware(
+    IdempotencyMiddleware,
+    routes=[("POST", "/calculations"), ("POST", "/users/register"), ("POST", "/expressions")]
+)
+app.add_middleware(MetricsMiddleware)
+hashing_pool.observers.append(observe_hashing)
+registry.add_collector(lambda: record_pool(pool_stats.snapshot(get_async_engine().pool)))
+
+
+@app.exception_handler(RequestValidationError)
+async def request_validation_error(request: Request, exc: RequestValidationError) -> ORJSONResponse:
+    """
+    Return 422 like FastAPI's default handler, encoded with orjson.
+
+    Rejected inputs are echoed back and may be NaN or infinite (e.g. an
+    expression variable), which the stdlib encoder refuses; orjson writes
+    them as null.
+    """
+    return ORJSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": jsonable_encoder(exc.errors())}
+    )
+
+
+# Stable orderings for list endpoints. Each uses a single direction so a
+# page is one row-value range scan: users over ix_users_created_at_id,
+# calculations forwards or backwards over ix_calculations_user_history
+USER_ORDER = KeysetOrder([(User.created_at, False), (User.id, False)])
+CALCULATION_ORDER = KeysetOrder([(Calculation.created_at, False), (Calculation.id, False)])
+USER_HISTORY_ORDER = KeysetOrder([(Calculation.created_at, True), (Calculation.id, True)])
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+INCLUDE_TOTAL_DESCRIPTION = "Return the total in X-Total-Count, exact (cached) or estimated"
+
+
+async def fetch_page(
+    db: AsyncSession,
+    stmt,
+    order: KeysetOrder,
+    response: Response,
+    cursor: Optional[str],
+    skip: Optional[int],
+    limit: int
+) -> list:
+    """
+    Run a list query with keyset pagination, or legacy offset pagination
+    when ``skip`` is given without a cursor.
+
+    ``stmt`` selects plain columns (not ORM entities) and the page is
+    returned as rows. The cursor for the following page is returned in the
+    X-Next-Cursor header; it is omitted on the last page.
+    """
+    if skip is not None and cursor is None:
+        stmt = stmt.order_by(*order.order_by()).offset(skip).limit(limit)
+        return (await db.execute(stmt)).all()
+
+    try:
+        stmt = order.apply(stmt, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    rows, next_cursor = order.page((await db.execute(stmt)).all(), limit)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+def hashing_unavailable() -> HTTPException:
+    """Build the response used when the password hashing pool is saturated."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please retry",
+        headers={"Retry-After": "1"}
+    )
+
+
+async def limit_password_attempts(request: Request, route: str, username: str) -> None:
+    """
+    Apply the per-IP and per-username limits for a password endpoint.
+
+    Must run before any password hashing so rejected attempts cost no
+    bcrypt time.
+
+    Raises:
+        HTTPException: 429 with Retry-After when a limit is exceeded
+    """
+    client_ip = request.client.host if request.client else None
+    try:
+        await get_rate_limiter().check(route, client_ip, username)
+    except RateLimitExceededError as e:
+        RATE_LIMITED.inc(route, e.scope)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please retry later",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
 
 
 @app.get("/health", tags=["Health"])
@@ -38,10 +188,56 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "message": "Application is running"}
 
+
+@app.get("/health/db-pool", tags=["Health"])
+async def database_pool_status():
+    """
+    Report connection pool usage.
+
+    Returns checked-out, idle and overflow connections together with how long
+    requests have waited to obtain a connection.
+    """
+    return pool_stats.snapshot(get_async_engine().pool)
+
+
+@app.get("/health/cache", tags=["Health"])
+async def cache_status():
+    """Report read-through cache size and hit/miss/eviction counters."""
+    return get_cache().stats()
+
+
+@app.get("/health/calculation-memo", tags=["Health"])
+async def calculation_memo_status():
+    """Report the calculation result memo's hit rate and batch duplicate counts."""
+    return CalculationFactory.memo_stats()
+
+
+@app.get("/health/write-behind", tags=["Health"])
+async def write_behind_status(writer: Optional[CalculationWriter] = Depends(get_calculation_writer)):
+    """Report the calculation group-commit queue depth and flush sizes."""
+    if writer is None:
+        return {"enabled": False}
+    return writer.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+async def metrics():
+    """
+    Expose Prometheus metrics for this worker process.
+
+    Includes per-route latency histograms, in-flight requests, SQL statement
+    timings, connection pool gauges and bcrypt hash/verify durations.
+    """
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
 # --- User Endpoints ---
 
 @app.post("/users/register", response_model=UserRead, status_code=status.HTTP_201_CREATED, tags=["Users"])
-async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) -> UserRead:
+async def register_user(
+    user_data: UserCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+) -> UserRead:
     """
     Register a new user.
     
@@ -49,12 +245,17 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
     - **email**: Valid, unique email address
     - **password**: Password (minimum 8 characters)
     
-    Returns the created user without password_hash.
+    Returns the created user without password_hash. Attempts are rate
+    limited per client IP and per username (429 with Retry-After).
     """
+    await limit_password_attempts(request, "register", user_data.username)
+    try:
+        # Hash the password before storing, off the event loop
+        password_hash = await hash_password_async(user_data.password)
+    except HashingPoolFullError:
+        raise hashing_unavailable()
+
     try:
-        # Hash the password before storing
-        password_hash = hash_password(user_data.password)
-        
         # Create new user instance
         db_user = User(
             username=user_data.username,
@@ -64,13 +265,13 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
         
         # Add to database
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         return db_user
     
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         if "username" in str(e):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -87,75 +288,165 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
         )
 
 @app.post("/users/login", tags=["Users"])
-async def login_user(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_data: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Login a user.
     
-    Verifies username and password.
+    Verifies username and password. Attempts are rate limited per client
+    IP and per username (429 with Retry-After).
     """
-    user = db.query(User).filter(User.username == user_data.username).first()
+    await limit_password_attempts(request, "login", user_data.username)
+    user = await db.scalar(select(User).where(User.username == user_data.username))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
     
-    if not verify_password(user_data.password, user.password_hash):
+    try:
+        password_ok = await verify_password_async(user_data.password, user.password_hash)
+    except HashingPoolFullError:
+        raise hashing_unavailable()
+
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
+
+    if needs_rehash(user.password_hash):
+        await rehash_password(db, user, user_data.password)
     
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(
+        data={"sub": user.username, "uid": str(user.id)},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
     return {"access_token": access_token, "token_type": "bearer", "user_id": str(user.id)}
 
+async def rehash_password(db: AsyncSession, user: User, password: str) -> None:
+    """
+    Re-hash a verified password with the current bcrypt cost factor.
+
+    Best effort: skipped when the hashing pool is saturated, and the
+    UPDATE only applies if the stored hash has not changed meanwhile.
+    """
+    try:
+        new_hash = await hash_password_async(password)
+    except HashingPoolFullError:
+        return
+    await db.execute(
+        update(User)
+        .where(User.id == user.id, User.password_hash == user.password_hash)
+        .values(password_hash=new_hash)
+    )
+    await db.commit()
+
 @app.get("/users/{user_id}", response_model=UserRead, tags=["Users"])
-async def get_user(user_id: str, db: Session = Depends(get_db)) -> UserRead:
+async def get_user(user_id: UUID, db: AsyncSession = Depends(get_async_db)) -> UserRead:
     """Get a user by ID."""
-    user = db.query(User).filter(User.id == user_id).first()
+    cache = get_cache()
+    cached = await cache.get(user_key(user_id))
+    if cached is not None:
+        return cached
+
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return user
+    user_read = UserRead.model_validate(user)
+    await cache.set(user_key(user_id), user_read)
+    return user_read
 
 
 @app.get("/users", response_model=List[UserRead], tags=["Users"])
-async def list_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)) -> List[UserRead]:
+async def list_users(
+    response: Response,
+    limit: int = Query(10, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    skip: Optional[int] = Query(None, ge=0, description="Legacy offset pagination"),
+    include_total: Optional[TotalMode] = Query(None, description=INCLUDE_TOTAL_DESCRIPTION),
+    db: AsyncSession = Depends(get_async_db)
+) -> Response:
     """
     List all users with pagination.
+
+    Users are ordered by creation time. Pass the X-Next-Cursor response
+    header back as ``cursor`` to fetch the next page. With ``include_total``
+    the number of users is returned in X-Total-Count: ``exact`` is a COUNT
+    recounted in the background every ``total_count_refresh_seconds``,
+    ``estimate`` comes from the database's table statistics.
+    """
+    stmt = select(User.id, User.username, User.email, User.created_at)
+    users = await fetch_page(db, stmt, USER_ORDER, response, cursor, skip, limit)
+    if include_total == TotalMode.EXACT:
+        set_total_headers(response, await exact_table_count(db, User.__table__), include_total)
+    elif include_total == TotalMode.ESTIMATE:
+        set_total_headers(response, await estimated_table_count(db, User.__table__), include_total)
+    return json_list_response(USER_LIST, users, response)
+
+
+@app.get("/users/{user_id}/calculations", response_model=List[CalculationRead], tags=["Users"])
+async def list_user_calculations(
+    user_id: UUID,
+    response: Response,
+    limit: int = Query(10, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> Response:
     """
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    List a user's calculation history, newest first.
+
+    Each page is one backward range scan of the (user_id, created_at, id)
+    index. Pass the X-Next-Cursor response header back as ``cursor`` to
+    fetch older calculations.
+
+    Raises:
+        HTTPException: 403 if ``user_id`` is not the authenticated user
+    """
+    if user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Cannot read another user's calculations"
+        )
+    stmt = select(*Calculation.__table__.columns).where(Calculation.user_id == user_id)
+    calculations = await fetch_page(db, stmt, USER_HISTORY_ORDER, response, cursor, None, limit)
+    return json_list_response(CALCULATION_LIST, calculations, response)
 
 
 @app.put("/users/{user_id}", response_model=UserRead, tags=["Users"])
 async def update_user(
-    user_id: str,
+    user_id: UUID,
     user_data: UserUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> UserRead:
-    """Update user information (username or email)."""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
+    """
+    Update user information (username or email).
+
+    Runs as a single UPDATE ... RETURNING.
+    """
+    values = user_data.model_dump(exclude_none=True)
     try:
-        if user_data.username is not None:
-            user.username = user_data.username
-        if user_data.email is not None:
-            user.email = user_data.email
+        if values:
+            stmt = update(User).where(User.id == user_id).values(**values).returning(User)
+            user = (await db.scalars(stmt)).first()
+        else:
+            user = await db.get(User, user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
         
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await get_cache().delete(user_key(user_id))
+        await forget_tokens()
         return user
     
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         if "username" in str(e):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -173,106 +464,380 @@ async def update_user(
 
 
 @app.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Users"])
-async def delete_user(user_id: str, db: Session = Depends(get_db)):
-    """Delete a user by ID."""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+async def delete_user(user_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    """
+    Delete a user by ID.
+
+    Runs as a single DELETE ... RETURNING; the database detaches the user's
+    calculations (ON DELETE SET NULL) without loading them.
+    """
+    deleted_id = await db.scalar(delete(User).where(User.id == user_id).returning(User.id))
+    if deleted_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    db.delete(user)
-    db.commit()
+    await db.commit()
+    cache = get_cache()
+    await cache.delete(user_key(user_id))
+    # The user's calculations were detached (user_id set to NULL)
+    await cache.delete_prefix(CALCULATION_PREFIX)
+    await forget_tokens()
 
 # --- Calculation Endpoints ---
+#
+# Every calculation endpoint requires a bearer token and only sees the
+# calculations owned by its user; other users' calculations are reported
+# as not found.
+
+
+def check_owner(requested_user_id: Optional[UUID], current_user: CurrentUser) -> UUID:
+    """
+    Resolve the owner of new calculations.
+
+    Raises:
+        HTTPException: 403 if the request names a different user
+    """
+    if requested_user_id is not None and requested_user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Cannot create calculations for another user"
+        )
+    return current_user.id
 
-def perform_calculation(a: float, b: float, op: OperationType) -> float:
-    if op == OperationType.ADD:
-        return a + b
-    elif op == OperationType.SUBTRACT:
-        return a - b
-    elif op == OperationType.MULTIPLY:
-        return a * b
-    elif op == OperationType.DIVIDE:
-        if b == 0:
-            raise ValueError("Division by zero")
-        return a / b
-    raise ValueError("Invalid operation")
 
 @app.post("/calculations", response_model=CalculationRead, status_code=status.HTTP_201_CREATED, tags=["Calculations"])
-async def create_calculation(calc_data: CalculationCreate, db: Session = Depends(get_db)) -> CalculationRead:
-    """Create a new calculation."""
+async def create_calculation(
+    calc_data: CalculationCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    writer: Optional[CalculationWriter] = Depends(get_calculation_writer),
+    db: AsyncSession = Depends(get_async_db)
+) -> CalculationRead:
+    """
+    Create a new calculation owned by the authenticated user.
+
+    With group commit enabled the row is handed to the write-behind queue
+    and the response waits until the shared commit containing it succeeds.
+    """
+    owner_id = check_owner(calc_data.user_id, current_user)
     try:
-        result = perform_calculation(calc_data.a, calc_data.b, calc_data.type)
+        result = CalculationFactory.calculate(calc_data.type, calc_data.a, calc_data.b)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+    if writer is not None:
+        try:
+            return await writer.submit({
+                "a": calc_data.a,
+                "b": calc_data.b,
+                "type": calc_data.type.value,
+                "result": result,
+                "user_id": owner_id,
+            })
+        except WriteBehindFullError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+
     db_calc = Calculation(
         a=calc_data.a,
         b=calc_data.b,
-        type=calc_data.type,
+        type=calc_data.type.value,
         result=result,
-        user_id=calc_data.user_id
+        user_id=owner_id
     )
     db.add(db_calc)
-    db.commit()
-    db.refresh(db_calc)
+    await record_results(db, owner_id, [(db_calc.type, result)])
+    await db.commit()
+    await db.refresh(db_calc)
     return db_calc
 
+@app.post("/calculations/batch", response_model=CalculationBatchRead, status_code=status.HTTP_201_CREATED, tags=["Calculations"])
+async def create_calculations_batch(
+    batch: CalculationBatchCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> CalculationBatchRead:
+    """
+    Create many calculations in one request.
+
+    Items are evaluated column-wise and every valid item is stored with a
+    single multi-row INSERT ... RETURNING. Invalid items (e.g. division by
+    zero) are reported by index and do not prevent the others from being
+    stored.
+    """
+    owner_id = check_owner(batch.user_id, current_user)
+    items = batch.items
+    results, errors = CalculationFactory.calculate_batch(
+        [item.type for item in items],
+        [item.a for item in items],
+        [item.b for item in items]
+    )
+
+    valid = [i for i, error in enumerate(errors) if error is None]
+    rows = []
+    if valid:
+        stmt = insert(Calculation).returning(Calculation, sort_by_parameter_order=True)
+        rows = (await db.scalars(stmt, [
+            {
+                "a": items[i].a,
+                "b": items[i].b,
+                "type": items[i].type.value,
+                "result": float(results[i]),
+                "user_id": owner_id,
+            }
+            for i in valid
+        ])).all()
+        await record_results(db, owner_id, [(items[i].type.value, results[i]) for i in valid])
+        await db.commit()
+
+    stored = dict(zip(valid, rows))
+    return CalculationBatchRead(
+        created=len(rows),
+        failed=len(items) - len(rows),
+        results=[
+            CalculationBatchResult(
+                index=i,
+                calculation=CalculationRead.model_validate(stored[i]) if i in stored else None,
+                error=errors[i]
+            )
+            for i in range(len(items))
+        ]
+    )
+
 @app.get("/calculations", response_model=List[CalculationRead], tags=["Calculations"])
-async def list_calculations(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)) -> List[CalculationRead]:
-    """List all calculations."""
-    calcs = db.query(Calculation).offset(skip).limit(limit).all()
-    return calcs
+async def list_calculations(
+    response: Response,
+    limit: int = Query(10, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    skip: Optional[int] = Query(None, ge=0, description="Legacy offset pagination"),
+    include_total: Optional[TotalMode] = Query(None, description=INCLUDE_TOTAL_DESCRIPTION),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> Response:
+    """
+    List the authenticated user's calculations.
+
+    Calculations are ordered by creation time. Pass the X-Next-Cursor
+    response header back as ``cursor`` to fetch the next page. With
+    ``include_total`` the user's number of calculations is returned in
+    X-Total-Count; it is read from the statistics rollup, so it is exact
+    in both modes.
+    """
+    stmt = select(*Calculation.__table__.columns).where(Calculation.user_id == current_user.id)
+    calculations = await fetch_page(db, stmt, CALCULATION_ORDER, response, cursor, skip, limit)
+    if include_total is not None:
+        set_total_headers(response, await user_calculation_count(db, current_user.id), TotalMode.EXACT)
+    return json_list_response(CALCULATION_LIST, calculations, response)
+
+@app.get("/calculations/export", tags=["Calculations"])
+async def export_calculations(
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    created_from: Optional[datetime] = Query(None, description="Inclusive lower bound on created_at"),
+    created_to: Optional[datetime] = Query(None, description="Exclusive upper bound on created_at"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> StreamingResponse:
+    """
+    Stream the authenticated user's calculation history as NDJSON or CSV.
+
+    Rows are ordered by creation time and read through a server-side cursor,
+    so exports of any size use constant memory.
+    """
+    stmt = select(*Calculation.__table__.columns).where(Calculation.user_id == current_user.id)
+    if created_from is not None:
+        stmt = stmt.where(Calculation.created_at >= created_from)
+    if created_to is not None:
+        stmt = stmt.where(Calculation.created_at < created_to)
+    stmt = stmt.order_by(*CALCULATION_ORDER.order_by())
+
+    # The session from get_async_db stays open until the response has been sent
+    return StreamingResponse(
+        stream_rows(db, stmt, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="calculations.{export_format.value}"'}
+    )
+
+@app.get("/calculations/statistics", response_model=List[CalculationStatsRead], tags=["Calculations"])
+async def calculation_statistics(
+    operation_type: Optional[OperationType] = Query(None, alias="type"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> List[CalculationStatsRead]:
+    """
+    Aggregate statistics of the authenticated user's results per operation type.
+
+    Reads one precomputed row per type (count, sum, mean, min, max and
+    standard deviation) instead of scanning the calculations.
+    """
+    stmt = select(CalculationStats).where(CalculationStats.user_id == current_user.id)
+    if operation_type is not None:
+        stmt = stmt.where(CalculationStats.type == operation_type.value)
+    rows = (await db.scalars(stmt.order_by(CalculationStats.type))).all()
+    return [describe(row) for row in rows]
 
 @app.get("/calculations/{calc_id}", response_model=CalculationRead, tags=["Calculations"])
-async def get_calculation(calc_id: str, db: Session = Depends(get_db)) -> CalculationRead:
-    """Get a calculation by ID."""
-    calc = db.query(Calculation).filter(Calculation.id == calc_id).first()
-    if not calc:
+async def get_calculation(
+    calc_id: UUID,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> CalculationRead:
+    """Get one of the authenticated user's calculations by ID."""
+    cache = get_cache()
+    cached = await cache.get(calculation_key(calc_id))
+    if cached is not None:
+        if cached.user_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Calculation not found")
+        return cached
+
+    calc = await db.get(Calculation, calc_id)
+    if not calc or calc.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Calculation not found")
-    return calc
+    calc_read = CalculationRead.model_validate(calc)
+    await cache.set(calculation_key(calc_id), calc_read)
+    return calc_read
 
 @app.put("/calculations/{calc_id}", response_model=CalculationRead, tags=["Calculations"])
-async def update_calculation(calc_id: str, calc_data: CalculationUpdate, db: Session = Depends(get_db)) -> CalculationRead:
-    """Update a calculation."""
-    calc = db.query(Calculation).filter(Calculation.id == calc_id).first()
-    if not calc:
+async def update_calculation(
+    calc_id: UUID,
+    calc_data: CalculationUpdate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> CalculationRead:
+    """
+    Update one of the authenticated user's calculations.
+
+    The stored row is read (and locked) first so the new operands can be
+    validated like a create and the statistics rollup can be adjusted; the
+    update itself is a single UPDATE ... RETURNING that recomputes the
+    result from the new (or stored) operands and type.
+    """
+    old = (await db.execute(
+        select(Calculation.type, Calculation.result, Calculation.a, Calculation.b)
+        .where(Calculation.id == calc_id, Calculation.user_id == current_user.id)
+        .with_for_update()
+    )).first()
+    if old is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Calculation not found")
+    try:
+        CalculationFactory.calculate(
+            calc_data.type or old.type,
+            old.a if calc_data.a is None else calc_data.a,
+            old.b if calc_data.b is None else calc_data.b
+        )
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # Use new values if provided, else the stored columns
+    a = literal(calc_data.a, Float) if calc_data.a is not None else Calculation.a
+    b = literal(calc_data.b, Float) if calc_data.b is not None else Calculation.b
+    op_type = calc_data.type.value if calc_data.type is not None else Calculation.type
 
-    # Update fields if provided
-    if calc_data.a is not None:
-        calc.a = calc_data.a
-    if calc_data.b is not None:
-        calc.b = calc_data.b
+    values = calc_data.model_dump(exclude_none=True)
     if calc_data.type is not None:
-        calc.type = calc_data.type
+        values["type"] = calc_data.type.value
+    values["result"] = CalculationFactory.sql_result(op_type, a, b)
 
-    # Recompute result
-    try:
-        # Use new values if provided, else existing
-        a = calc.a
-        b = calc.b
-        op = OperationType(calc.type) # Ensure it's the enum
-        
-        if op == OperationType.DIVIDE and b == 0:
-             raise ValueError("Division by zero")
+    stmt = (
+        update(Calculation)
+        .where(Calculation.id == calc_id, Calculation.user_id == current_user.id)
+        .values(**values)
+        .returning(Calculation)
+    )
+    # The same checks in SQL, so a row is never written with an invalid result
+    invalid = CalculationFactory.sql_invalid(op_type, a, b)
+    if invalid is not None:
+        stmt = stmt.where(not_(invalid))
 
-        calc.result = perform_calculation(a, b, op)
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    calc = (await db.scalars(stmt)).first()
+    if calc is None:
+        # The row exists (it is locked above), so the new operands were rejected
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=NOT_FINITE)
 
-    db.commit()
-    db.refresh(calc)
+    if (calc.type, calc.result) != (old.type, old.result):
+        # Statistics rows are locked in type order, like every other writer,
+        # so concurrent type changes cannot deadlock. Within one type the new
+        # result must be recorded before the old one is removed.
+        if old.type < calc.type:
+            await remove_result(db, current_user.id, old.type, old.result)
+            await record_results(db, current_user.id, [(calc.type, calc.result)])
+        else:
+            await record_results(db, current_user.id, [(calc.type, calc.result)])
+            await remove_result(db, current_user.id, old.type, old.result)
+    await db.commit()
+    await get_cache().delete(calculation_key(calc_id))
     return calc
 
 @app.delete("/calculations/{calc_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Calculations"])
-async def delete_calculation(calc_id: str, db: Session = Depends(get_db)):
-    """Delete a calculation."""
-    calc = db.query(Calculation).filter(Calculation.id == calc_id).first()
-    if not calc:
+async def delete_calculation(
+    calc_id: UUID,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Delete one of the authenticated user's calculations with a single DELETE ... RETURNING."""
+    stmt = (
+        delete(Calculation)
+        .where(Calculation.id == calc_id, Calculation.user_id == current_user.id)
+        .returning(Calculation.type, Calculation.result)
+    )
+    deleted = (await db.execute(stmt)).first()
+    if deleted is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Calculation not found")
     
-    db.delete(calc)
-    db.commit()
+    await remove_result(db, current_user.id, deleted.type, deleted.result)
+    await db.commit()
+    await get_cache().delete(calculation_key(calc_id))
+
+
+@app.post("/expressions", response_model=ExpressionRead, status_code=status.HTTP_201_CREATED, tags=["Expressions"])
+async def evaluate_expression(
+    data: ExpressionCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> Expression:
+    """
+    Evaluate an arithmetic expression and store it with its result.
+
+    The expression is compiled once into a cached plan of registered
+    operations. With array variables it is evaluated element-wise, and
+    elements that fail (e.g. division by zero) get a null result and an
+    entry in ``errors`` instead of failing the request.
+    """
+    try:
+        plan = compile_expression(data.expression)
+        result, errors = plan.evaluate(data.variables)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if errors is not None:
+        result = [None if error else value for value, error in zip(result.tolist(), errors)]
+        if not any(errors):
+            errors = None
+    expression = Expression(
+        expression=data.expression,
+        variables=data.variables,
+        result=result,
+        errors=errors,
+        user_id=current_user.id
+    )
+    db.add(expression)
+    await db.commit()
+    return expression
+
+
+@app.get("/expressions/{expression_id}", response_model=ExpressionRead, tags=["Expressions"])
+async def get_expression(
+    expression_id: UUID,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> Expression:
+    """Get one of the authenticated user's evaluated expressions by ID."""
+    expression = await db.get(Expression, expression_id)
+    if not expression or expression.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expression not found")
+    return expression
@@ -0,0 +1,367 @@
+"""
+Prometheus metrics for requests, SQL statements, the connection pool and
+password hashing.
+
+Metrics are kept in a small in-process registry and rendered in the
+Prometheus text exposition format by the ``/metrics`` endpoint. Each
+worker process reports its own values.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import event
+
+# Upper bounds (seconds) shared by the latency histograms
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Label used for requests that matched no API route (404s, static files)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """
+    Base class for a named metric with optional labels.
+
+    Attributes:
+        name: Metric name
+        documentation: HELP text
+        labelnames: Names of the labels every sample carries
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self) -> List[str]:
+        """Return the exposition lines for this metric's samples."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render HELP, TYPE and sample lines."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing value per label set."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increase the counter for ``labels`` by ``amount``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, *labels: str) -> None:
+        """Copy a running total kept elsewhere (e.g. pool statistics) for ``labels``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, *labels: str) -> float:
+        """Current value for ``labels`` (0 if never incremented)."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Gauge(Metric):
+    """Value that can go up and down per label set."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set the gauge for ``labels``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increase the gauge for ``labels`` by ``amount`` (negative to decrease)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        """Decrease the gauge for ``labels`` by ``amount``."""
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        """Current value for ``labels`` (0 if never set)."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Attributes:
+        buckets: Sorted bucket upper bounds; ``+Inf`` is implied
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation for ``labels``."""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labels: str) -> int:
+        """Number of observations recorded for ``labels``."""
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(names, key + (bound,))} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Add ``metric`` to the registry and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callable run before rendering to refresh sampled gauges."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Refresh collectors and render every metric in the text format."""
+        for collector in self._collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served.",
+    ("method",),
+))
+SQL_DURATION = registry.register(Histogram(
+    "db_statement_duration_seconds",
+    "SQL statement execution time by statement type.",
+    ("statement",),
+))
+SQL_ERRORS = registry.register(Counter(
+    "db_statement_errors_total",
+    "SQL statements that raised an error, by statement type.",
+    ("statement",),
+))
+POOL_CONNECTIONS = registry.register(Gauge(
+    "db_pool_connections",
+    "Connection pool connections by state.",
+    ("state",),
+))
+POOL_CHECKOUTS = registry.register(Counter(
+    "db_pool_checkouts_total",
+    "Connections handed out by the pool since startup.",
+))
+POOL_TIMEOUTS = registry.register(Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that timed out waiting for a connection.",
+))
+POOL_WAIT_SECONDS = registry.register(Counter(
+    "db_pool_wait_seconds_total",
+    "Total time spent waiting for a pooled connection.",
+))
+RATE_LIMITED = registry.register(Counter(
+    "http_rate_limited_total",
+    "Requests rejected by a rate limit, by route and limit.",
+    ("route", "limit"),
+))
+PASSWORD_HASHING_DURATION = registry.register(Histogram(
+    "password_hashing_duration_seconds",
+    "bcrypt hash/verify time, excluding time queued for a worker thread.",
+    ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.5, 5.0),
+))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency and in-flight requests.
+
+    Requests are labelled with the matched route template (e.g.
+    ``/calculations/{calc_id}``) rather than the raw path, which keeps the
+    number of series bounded. Streaming responses are timed until their
+    last body chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc(method)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(method)
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method,
+                getattr(route, "path", UNMATCHED_ROUTE),
+                str(status_code),
+            )
+
+
+def _statement_type(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["metrics_query_start"].pop()
+    SQL_DURATION.observe(time.perf_counter() - start, _statement_type(statement))
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("metrics_query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+    SQL_ERRORS.inc(_statement_type(exception_context.statement or ""))
+
+
+def instrument_engine(engine) -> None:
+    """
+    Time every SQL statement run through ``engine``.
+
+    Accepts sync or asyncio engines.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def record_pool(snapshot: dict) -> None:
+    """Copy a ``PoolStats.snapshot`` into the pool gauges and counters."""
+    for state in ("checked_out", "idle", "overflow"):
+        if snapshot.get(state) is not None:
+            POOL_CONNECTIONS.set(snapshot[state], state)
+    POOL_CHECKOUTS.set_total(snapshot["checkouts"])
+    POOL_TIMEOUTS.set_total(snapshot["timeouts"])
+    POOL_WAIT_SECONDS.set_total(snapshot["wait_seconds_total"])
+
+
+def observe_hashing(operation: str, seconds: float) -> None:
+    """``HashingPool`` observer recording bcrypt durations."""
+    PASSWORD_HASHING_DURATION.observe(seconds, operation)
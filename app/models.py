@@ -2,8 +2,8 @@
 SQLAlchemy models for the application.
 """
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Float, ForeignKey, func, Uuid
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, DateTime, Float, ForeignKey, Index, Integer, JSON, func, Uuid
+from sqlalchemy.orm import backref, relationship
 import uuid
 
 from app.database import Base
@@ -21,12 +21,18 @@ class User(Base):
         created_at: Timestamp when user was created
     """
     __tablename__ = "users"
+    __table_args__ = (
+        # Supports keyset pagination ordered by (created_at, id)
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
     username = Column(String(50), unique=True, nullable=False, index=True)
     email = Column(String(100), unique=True, nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
-    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # Set client-side with microsecond precision so pagination cursors compare
+    # exactly; the server default still covers rows inserted with raw SQL
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
 
     def __repr__(self) -> str:
         return f"<User(id={self.id}, username={self.username}, email={self.email})>"
@@ -46,17 +52,116 @@ class Calculation(Base):
         created_at: Timestamp when calculation was created
     """
     __tablename__ = "calculations"
+    __table_args__ = (
+        # Every listing is per owner: scanned forwards for GET /calculations
+        # and exports (created_at, id), backwards for the newest-first
+        # history (created_at DESC, id DESC). The user_id prefix also covers
+        # plain lookups by owner.
+        Index("ix_calculations_user_history", "user_id", "created_at", "id"),
+        # Replaced by ix_calculations_user_history; dropped by init-db
+        {"info": {"obsolete_indexes": [
+            "ix_calculations_user_id",
+            "ix_calculations_created_at_id",
+            "ix_calculations_user_id_created_at_id",
+        ]}},
+    )
 
     id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
     a = Column(Float, nullable=False)
     b = Column(Float, nullable=False)
     type = Column(String(20), nullable=False)
     result = Column(Float, nullable=False)
-    user_id = Column(Uuid, ForeignKey("users.id"), nullable=True, index=True)
-    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    user_id = Column(Uuid, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
 
-    # Relationship to User (optional)
-    user = relationship("User", backref="calculations")
+    # Relationship to User (optional). The database detaches calculations
+    # when their user is deleted, so the ORM never loads them to do it.
+    user = relationship("User", backref=backref("calculations", passive_deletes=True))
 
     def __repr__(self) -> str:
         return f"<Calculation(id={self.id}, type={self.type}, a={self.a}, b={self.b}, result={self.result})>"
+
+
+class CalculationStats(Base):
+    """
+    Running aggregates of calculation results per user and operation type.
+
+    Maintained incrementally in the same transaction as every calculation
+    write, so statistics are read from a handful of rows instead of scanning
+    the calculations table. ``python -m app.cli rebuild-stats`` recomputes
+    it from scratch.
+
+    Attributes:
+        user_id: Owner of the calculations (part of the primary key)
+        type: Operation type (part of the primary key)
+        count: Number of calculations
+        total: Sum of results
+        minimum: Smallest result
+        maximum: Largest result
+        sum_squares: Sum of squared results (for variance)
+    """
+    __tablename__ = "calculation_stats"
+
+    user_id = Column(Uuid, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    type = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+    sum_squares = Column(Float, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<CalculationStats(user_id={self.user_id}, type={self.type}, count={self.count})>"
+
+
+class Expression(Base):
+    """
+    An evaluated arithmetic expression and its result.
+
+    Attributes:
+        id: UUID primary key
+        expression: The expression text
+        variables: Variable values it was evaluated with (numbers or equal-length arrays)
+        result: Result number, or one result per element (null where it failed)
+        errors: Per-element errors for array evaluations, otherwise null
+        user_id: Owner of the expression
+        created_at: Timestamp when the expression was evaluated
+    """
+    __tablename__ = "expressions"
+    __table_args__ = (
+        Index("ix_expressions_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    expression = Column(String(1000), nullable=False)
+    variables = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=False)
+    errors = Column(JSON, nullable=True)
+    user_id = Column(Uuid, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<Expression(id={self.id}, expression={self.expression!r})>"
+
+
+class RecomputeCheckpoint(Base):
+    """
+    Progress of a bulk recompute job, committed with each chunk it updates.
+
+    Attributes:
+        job: Job name (primary key)
+        last_id: Highest calculation ID already processed
+        chunks: Chunks completed
+        rows_updated: Results changed so far
+        updated_at: When the last chunk was committed
+    """
+    __tablename__ = "recompute_checkpoints"
+
+    job = Column(String(100), primary_key=True)
+    last_id = Column(Uuid, nullable=True)
+    chunks = Column(Integer, nullable=False, default=0)
+    rows_updated = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<RecomputeCheckpoint(job={self.job}, last_id={self.last_id}, chunks={self.chunks})>"
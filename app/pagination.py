@@ -0,0 +1,122 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Instead of ``OFFSET n``, each page continues strictly after the sort key of
+the last row of the previous page, so every page costs one index range
+scan no matter how deep it is. The position is handed to clients as an
+opaque, URL-safe cursor string.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, tuple_
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+class KeysetOrder:
+    """
+    An ordering over one or more columns used for keyset pagination.
+
+    The last column must be unique (normally the primary key) so every row
+    has a distinct position.
+
+    Attributes:
+        keys: Sequence of ``(column, descending)`` pairs, most significant first
+    """
+
+    def __init__(self, keys: Sequence[Tuple[Any, bool]]):
+        self.keys = list(keys)
+
+    def order_by(self) -> list:
+        """Return the ORDER BY clauses for this ordering."""
+        return [column.desc() if descending else column.asc() for column, descending in self.keys]
+
+    def encode(self, row: Any) -> str:
+        """Encode the sort key of ``row`` as an opaque cursor."""
+        values = []
+        for column, _ in self.keys:
+            value = getattr(row, column.key)
+            values.append(value.isoformat() if isinstance(value, datetime) else str(value))
+        raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode(self, cursor: str) -> list:
+        """
+        Decode a cursor produced by :meth:`encode`.
+
+        Raises:
+            InvalidCursorError: If the cursor is malformed
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise ValueError("wrong number of values")
+            decoded = []
+            for (column, _), value in zip(self.keys, values):
+                python_type = column.type.python_type
+                if python_type is datetime:
+                    decoded.append(datetime.fromisoformat(value))
+                else:
+                    decoded.append(python_type(value))
+            return decoded
+        except (ValueError, TypeError, UnicodeError, binascii.Error) as e:
+            raise InvalidCursorError("Invalid pagination cursor") from e
+
+    def after(self, values: Sequence[Any]):
+        """
+        Build the WHERE clause selecting rows strictly after ``values``.
+
+        Uses a single row-value comparison when all keys share a direction
+        (which the database can answer with one index range scan). Mixed
+        directions need the expanded OR form, which databases cannot turn
+        into an index bound; it is prefixed with a redundant inclusive bound
+        on the leading column so the scan at least starts at the cursor.
+        """
+        directions = {descending for _, descending in self.keys}
+        if len(directions) == 1:
+            columns = tuple_(*(column for column, _ in self.keys))
+            bound = tuple_(*values)
+            return columns < bound if directions.pop() else columns > bound
+
+        clauses = []
+        for i, (column, descending) in enumerate(self.keys):
+            ties = [self.keys[j][0] == values[j] for j in range(i)]
+            step = column < values[i] if descending else column > values[i]
+            clauses.append(and_(*ties, step))
+        leading, descending = self.keys[0]
+        start = leading <= values[0] if descending else leading >= values[0]
+        return and_(start, or_(*clauses))
+
+    def apply(self, stmt, cursor: Optional[str], limit: int):
+        """
+        Restrict ``stmt`` to the page after ``cursor``.
+
+        One extra row is fetched so :meth:`page` can tell whether another
+        page exists.
+
+        Raises:
+            InvalidCursorError: If the cursor is malformed
+        """
+        if cursor:
+            stmt = stmt.where(self.after(self.decode(cursor)))
+        return stmt.order_by(*self.order_by()).limit(limit + 1)
+
+    def page(self, rows: Sequence[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+        """
+        Trim the look-ahead row and compute the cursor for the next page.
+
+        Returns:
+            The rows of this page and the next cursor, or None on the last page
+        """
+        rows = list(rows)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, self.encode(rows[-1])
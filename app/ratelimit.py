@@ -0,0 +1,185 @@
+"""
+Token-bucket rate limiting for password endpoints.
+
+Every login or registration costs a bcrypt hash, so attempts are limited
+per client IP and per username before any hashing starts. Buckets live in
+a backend behind the async ``RateLimitBackend`` interface so a shared
+store (e.g. Redis) can replace the default in-process one when several
+workers or hosts must share limits.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from app.database import Settings
+
+
+class RateLimitExceededError(Exception):
+    """
+    Raised when a request exceeds its rate limit.
+
+    Attributes:
+        retry_after: Seconds until the request would be allowed
+        scope: Which limit was hit ("ip" or "username")
+    """
+
+    def __init__(self, retry_after: float, scope: str):
+        super().__init__(f"Rate limit exceeded for {scope}; retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+class RateLimitBackend(ABC):
+    """Interface implemented by every rate limit backend."""
+
+    @abstractmethod
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """
+        Take one token from the bucket for ``key``.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available
+        """
+
+    @abstractmethod
+    async def reset(self) -> None:
+        """Forget every bucket."""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets.
+
+    Attributes:
+        max_keys: Buckets kept before the least recently used is dropped
+    """
+
+    def __init__(self, max_keys: int, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        # key -> (tokens, last refill time)
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill_per_second
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # A dropped bucket only resets to full, which errs towards allowing
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    async def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RateLimiter:
+    """
+    Per-IP and per-username limits for one kind of password attempt.
+
+    Attributes:
+        backend: Bucket store
+        ip_capacity: Burst allowed per client IP
+        ip_refill_per_second: Sustained rate per client IP
+        username_capacity: Burst allowed per username
+        username_refill_per_second: Sustained rate per username
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        ip_capacity: float,
+        ip_refill_per_second: float,
+        username_capacity: float,
+        username_refill_per_second: float
+    ):
+        self.backend = backend
+        self.ip_capacity = ip_capacity
+        self.ip_refill_per_second = ip_refill_per_second
+        self.username_capacity = username_capacity
+        self.username_refill_per_second = username_refill_per_second
+
+    async def check(self, route: str, client_ip: Optional[str], username: Optional[str]) -> None:
+        """
+        Take a token from the IP bucket and then the username bucket.
+
+        Raises:
+            RateLimitExceededError: If either bucket is empty
+        """
+        if client_ip:
+            wait = await self.backend.take(f"{route}:ip:{client_ip}", self.ip_capacity, self.ip_refill_per_second)
+            if wait > 0:
+                raise RateLimitExceededError(wait, "ip")
+        if username:
+            wait = await self.backend.take(
+                f"{route}:username:{username.lower()}",
+                self.username_capacity,
+                self.username_refill_per_second
+            )
+            if wait > 0:
+                raise RateLimitExceededError(wait, "username")
+
+
+class NullRateLimiter(RateLimiter):
+    """Limiter that allows everything; used to disable rate limiting."""
+
+    def __init__(self):
+        pass
+
+    async def check(self, route: str, client_ip: Optional[str], username: Optional[str]) -> None:
+        pass
+
+
+# Backend factories by Settings.rate_limit_backend name; register shared backends here
+RATE_LIMIT_BACKENDS: Dict[str, Callable[[Settings], RateLimitBackend]] = {
+    "memory": lambda settings: MemoryRateLimitBackend(settings.rate_limit_max_keys),
+}
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Return the process-wide limiter, building it from settings on first use.
+
+    Raises:
+        ValueError: If ``rate_limit_backend`` names an unknown backend
+    """
+    global _limiter
+    if _limiter is None:
+        settings = Settings()
+        if settings.rate_limit_backend == "none":
+            _limiter = NullRateLimiter()
+            return _limiter
+        factory = RATE_LIMIT_BACKENDS.get(settings.rate_limit_backend)
+        if factory is None:
+            raise ValueError(
+                f"Unknown rate limit backend: {settings.rate_limit_backend}. "
+                f"Supported backends: {', '.join(RATE_LIMIT_BACKENDS)}, none"
+            )
+        _limiter = RateLimiter(
+            factory(settings),
+            ip_capacity=settings.rate_limit_ip_burst,
+            ip_refill_per_second=settings.rate_limit_ip_per_minute / 60,
+            username_capacity=settings.rate_limit_username_burst,
+            username_refill_per_second=settings.rate_limit_username_per_minute / 60,
+        )
+    return _limiter
+
+
+def reset_rate_limiter() -> None:
+    """Drop the process-wide limiter so it is rebuilt (empty) on next use."""
+    global _limiter
+    _limiter = None
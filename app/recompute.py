@@ -0,0 +1,165 @@
+"""
+Bulk recompute of stored calculation results.
+
+When an operation's implementation changes, or rows were imported with
+stale results, ``recompute_results`` rewrites ``calculations.result`` with
+set-based UPDATEs instead of one request per row. The table is walked in
+primary-key order in chunks of ``chunk_size`` rows; each chunk is a single
+``UPDATE ... SET result = CASE type WHEN 'Add' THEN a + b ... END`` over an
+ID range, committed on its own so row locks are only held for one chunk.
+Rows whose result is already correct are not rewritten, and rows with
+operands their operation rejects (e.g. a zero divisor) are left alone:
+the new value is ``CASE WHEN <invalid> THEN result ELSE ... END``, since
+the database may evaluate WHERE conditions in any order.
+
+The statistics rollup is adjusted in the same transaction as each chunk,
+only for the (user, type) rows whose calculations changed, so it is never
+rebuilt wholesale and types outside ``operation_types`` are not touched.
+Progress is committed in ``recompute_checkpoints`` together with each
+chunk, so an interrupted job resumes after the last committed chunk, and
+the checkpoint is removed when the job finishes. Cached API responses may
+show the old results until their TTL expires.
+"""
+import time
+from datetime import datetime
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import and_, case, delete, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from app.factory import CalculationFactory
+from app.models import Calculation, RecomputeCheckpoint
+from app.statistics import apply_result_changes
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def job_name(operation_types: Sequence[str]) -> str:
+    """Default checkpoint name for recomputing ``operation_types``."""
+    return "recompute:" + ",".join(sorted(operation_types))
+
+
+def _chunk_end(connection: Connection, after, chunk_size: int):
+    """Return the ID closing the next chunk, or None if it runs to the end of the table."""
+    stmt = select(Calculation.id).order_by(Calculation.id).offset(chunk_size - 1).limit(1)
+    if after is not None:
+        stmt = stmt.where(Calculation.id > after)
+    return connection.execute(stmt).scalar()
+
+
+def _recompute_statements(operation_types: Sequence[str]):
+    """
+    Build the statements rewriting stale results of ``operation_types`` (bounds bound per chunk).
+
+    Returns:
+        A SELECT locking the stale rows with their owner, type, old and new
+        result, and the UPDATE rewriting exactly those rows
+    """
+    new_result = CalculationFactory.sql_result(Calculation.type, Calculation.a, Calculation.b)
+    invalid = CalculationFactory.sql_invalid(Calculation.type, Calculation.a, Calculation.b)
+    if invalid is not None:
+        # WHERE conditions may run in any order, so a NOT invalid condition
+        # would not stop PostgreSQL from dividing by zero or overflowing.
+        # CASE evaluates the guard first; invalid rows keep their result and
+        # so never match result != new_result.
+        new_result = case((invalid, Calculation.result), else_=new_result)
+    conditions = [Calculation.type.in_(operation_types), Calculation.result != new_result]
+    changes = (
+        select(Calculation.user_id, Calculation.type, Calculation.result, new_result.label("new_result"))
+        .where(and_(*conditions))
+        .with_for_update()
+    )
+    return changes, update(Calculation).where(and_(*conditions)).values(result=new_result)
+
+
+def recompute_results(
+    engine: Engine,
+    operation_types: Optional[Sequence[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    job: Optional[str] = None,
+    restart: bool = False,
+    pause: float = 0.0,
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Recompute stored results chunk by chunk, resuming a previous run of the same job.
+
+    Args:
+        engine: Sync engine to run against
+        operation_types: Operation types to recompute (default: every registered one)
+        chunk_size: Rows covered by each UPDATE
+        job: Checkpoint name (default derived from ``operation_types``)
+        restart: Ignore an existing checkpoint and start from the beginning
+        pause: Seconds to sleep between chunks, to leave room for other writers
+        progress: Called after every chunk with the running totals
+
+    Returns:
+        Totals: ``chunks``, ``rows_updated``, ``resumed`` and ``statistics_rows``
+        (statistics rows adjusted by this run)
+
+    Raises:
+        ValueError: If an operation type is not supported or chunk_size is not positive
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    operation_types = list(operation_types or CalculationFactory.get_supported_operations())
+    for operation_type in operation_types:
+        CalculationFactory.create_operation(operation_type)
+    job = job or job_name(operation_types)
+    changes, stmt = _recompute_statements(operation_types)
+
+    with engine.begin() as connection:
+        checkpoint = connection.execute(
+            select(RecomputeCheckpoint).where(RecomputeCheckpoint.job == job)
+        ).first()
+        if checkpoint is not None and restart:
+            connection.execute(delete(RecomputeCheckpoint).where(RecomputeCheckpoint.job == job))
+            checkpoint = None
+        if checkpoint is None:
+            connection.execute(insert(RecomputeCheckpoint).values(
+                job=job, last_id=None, chunks=0, rows_updated=0, updated_at=datetime.utcnow()
+            ))
+    totals = {
+        "job": job,
+        "resumed": checkpoint is not None,
+        "last_id": checkpoint.last_id if checkpoint else None,
+        "chunks": checkpoint.chunks if checkpoint else 0,
+        "rows_updated": checkpoint.rows_updated if checkpoint else 0,
+        "statistics_rows": 0,
+    }
+
+    # A checkpoint past the last chunk only has to be removed
+    walked = totals["chunks"] > 0 and totals["last_id"] is None
+    while not walked:
+        with engine.begin() as connection:
+            after = totals["last_id"]
+            end = _chunk_end(connection, after, chunk_size)
+            bounds = []
+            if after is not None:
+                bounds.append(Calculation.id > after)
+            if end is not None:
+                bounds.append(Calculation.id <= end)
+            # The locked rows are exactly the ones the UPDATE rewrites
+            rows = connection.execute(changes.where(*bounds)).all()
+            updated = connection.execute(stmt.where(*bounds)).rowcount if rows else 0
+            totals["statistics_rows"] += apply_result_changes(
+                connection, [(row.user_id, row.type, row.result, row.new_result) for row in rows]
+            )
+            totals["chunks"] += 1
+            totals["rows_updated"] += updated
+            totals["last_id"] = end
+            connection.execute(
+                update(RecomputeCheckpoint)
+                .where(RecomputeCheckpoint.job == job)
+                .values(last_id=end, chunks=totals["chunks"], rows_updated=totals["rows_updated"],
+                        updated_at=datetime.utcnow())
+            )
+        if progress is not None:
+            progress(dict(totals))
+        walked = end is None
+        if pause and not walked:
+            time.sleep(pause)
+
+    with engine.begin() as connection:
+        connection.execute(delete(RecomputeCheckpoint).where(RecomputeCheckpoint.job == job))
+    return totals
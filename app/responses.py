@@ -0,0 +1,43 @@
+"""
+Fast JSON rendering for list endpoints.
+
+FastAPI validates a handler's return value against ``response_model``,
+converts the result to Python primitives and then encodes those to JSON.
+The list endpoints skip that: they select plain columns instead of ORM
+entities, each row is validated once by a pre-built ``TypeAdapter`` and
+dumped straight to JSON bytes by pydantic-core. The ``response_model``
+declarations stay for the OpenAPI schema.
+"""
+from typing import List, Sequence
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy.engine import Row
+
+from app.schemas import CalculationRead, UserRead
+
+JSON_MEDIA_TYPE = "application/json"
+
+USER_LIST = TypeAdapter(List[UserRead])
+CALCULATION_LIST = TypeAdapter(List[CalculationRead])
+
+
+def json_list_response(adapter: TypeAdapter, rows: Sequence[Row], response: Response = None) -> Response:
+    """
+    Serialize result rows to a JSON array response.
+
+    Args:
+        adapter: TypeAdapter for the list type being returned
+        rows: Column rows (e.g. from ``select(*Model.__table__.columns)``);
+            validating their dicts is much cheaper than reading attributes
+        response: The handler's injected response, whose headers (e.g.
+            X-Next-Cursor) are carried over
+
+    Returns:
+        A response with the encoded body
+    """
+    body = adapter.dump_json(adapter.validate_python([row._asdict() for row in rows]))
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers=headers)
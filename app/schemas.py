@@ -1,9 +1,11 @@
 """
 Pydantic schemas for request/response validation and serialization.
 """
+import math
+
 from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Union
 from uuid import UUID
 from enum import Enum
 
@@ -91,6 +93,18 @@ class OperationType(str, Enum):
     DIVIDE = "Divide"
 
 
+class ExportFormat(str, Enum):
+    """Enumeration for supported export formats."""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class TotalMode(str, Enum):
+    """How list endpoints compute the optional total count."""
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+
+
 class CalculationCreate(BaseModel):
     """
     Schema for creating a new calculation.
@@ -148,12 +162,122 @@ class CalculationRead(BaseModel):
         }
 
 
+# Upper bound on items accepted by POST /calculations/batch
+MAX_BATCH_SIZE = 10000
+
+
+class CalculationBatchItem(BaseModel):
+    """
+    One operand pair in a batch request.
+
+    Division by zero is not rejected here; it is reported for the item in
+    the batch response so the rest of the batch still succeeds.
+    """
+    a: float = Field(..., description="First operand")
+    b: float = Field(..., description="Second operand")
+    type: OperationType = Field(..., description="Operation type (Add, Subtract, Multiply, Divide)")
+
+
+class CalculationBatchCreate(BaseModel):
+    """Schema for creating many calculations in one request."""
+    items: List[CalculationBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    user_id: Optional[UUID] = Field(None, description="Optional user ID applied to every item")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {"a": 10.5, "b": 5.0, "type": "Add"},
+                    {"a": 1.0, "b": 0.0, "type": "Divide"}
+                ]
+            }
+        }
+
+
+class CalculationBatchResult(BaseModel):
+    """Outcome of one batch item: the stored calculation or an error."""
+    index: int
+    calculation: Optional[CalculationRead] = None
+    error: Optional[str] = None
+
+
+class CalculationBatchRead(BaseModel):
+    """Schema for returning the results of a batch request."""
+    created: int
+    failed: int
+    results: List[CalculationBatchResult]
+
+
+class CalculationStatsRead(BaseModel):
+    """Aggregate statistics of one user's results for one operation type."""
+    type: str
+    count: int
+    total: float = Field(..., description="Sum of results")
+    mean: float
+    minimum: float
+    maximum: float
+    stddev: float = Field(..., description="Population standard deviation of results")
+
+
+class ExpressionCreate(BaseModel):
+    """
+    Schema for evaluating an arithmetic expression.
+
+    Variables are numbers or arrays; arrays must share one length and the
+    expression is then evaluated element-wise.
+    """
+    expression: str = Field(..., min_length=1, max_length=1000,
+                            description="Arithmetic over numbers and variable names with + - * / and parentheses")
+    variables: Dict[str, Union[float, List[float]]] = Field(default_factory=dict)
+
+    @field_validator("variables")
+    @classmethod
+    def validate_variables(cls, variables):
+        """Ensure names are identifiers, values are finite and arrays fit in one batch."""
+        for name, value in variables.items():
+            if not name.isidentifier():
+                raise ValueError(f"Invalid variable name: {name}")
+            if isinstance(value, list) and not 1 <= len(value) <= MAX_BATCH_SIZE:
+                raise ValueError(f"Array variables must have 1 to {MAX_BATCH_SIZE} values")
+            if not all(math.isfinite(item) for item in (value if isinstance(value, list) else [value])):
+                raise ValueError(f"Variable {name} must be finite")
+        return variables
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "expression": "(price - discount) * quantity / 100",
+                "variables": {"price": 250.0, "discount": 20.0, "quantity": [1, 2, 5]}
+            }
+        }
+
+
+class ExpressionRead(BaseModel):
+    """Schema for returning an evaluated expression."""
+    id: UUID
+    expression: str
+    variables: Dict[str, Union[float, List[float]]]
+    result: Union[float, List[Optional[float]]]
+    errors: Optional[List[Optional[str]]] = None
+    user_id: UUID
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class UserLogin(BaseModel):
     """Schema for user login."""
     username: str
     password: str
 
 
+class CurrentUser(BaseModel):
+    """Identity of the user an access token was issued to."""
+    id: UUID
+    username: str
+
+
 class CalculationUpdate(BaseModel):
     """Schema for updating a calculation."""
     a: Optional[float] = None
@@ -2,16 +2,38 @@
 Password hashing utilities using bcrypt and JWT token generation.
 
 Provides secure password hashing, verification functions, and JWT handling.
+The ``*_async`` variants run bcrypt in a bounded worker pool so request
+handlers never block the event loop while hashing.
 """
+import asyncio
 import bcrypt
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from jose import jwt
+from typing import Callable, Dict, List, Optional
+from jose import JWTError, jwt
 import os
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-keep-it-secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# bcrypt releases the GIL, so one worker per core keeps every core busy
+BCRYPT_POOL_SIZE = int(os.getenv("BCRYPT_POOL_SIZE", str(os.cpu_count() or 1)))
+# Calls allowed to wait for (or run in) the pool before new ones are rejected
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "64"))
+# Cost factor used until (or instead of) calibration; setting BCRYPT_ROUNDS pins it
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS")
+# Calibration picks the cost whose hash time is closest to this target
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+# Security floor and upper bound for the calibrated cost
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "16"))
+# Cheap cost timed during calibration; each extra round doubles the work
+BCRYPT_PROBE_ROUNDS = 6
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """
@@ -34,6 +56,28 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class InvalidTokenError(ValueError):
+    """Raised when an access token is malformed, has a bad signature or has expired."""
+
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verify a JWT access token and return its claims.
+
+    Args:
+        token: Encoded JWT string
+
+    Returns:
+        Dictionary of decoded claims
+
+    Raises:
+        InvalidTokenError: If the token is invalid or expired
+    """
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        raise InvalidTokenError("Could not validate credentials") from e
+
 def hash_password(password: str) -> str:
     """
     Hash a plain-text password using bcrypt.
@@ -50,9 +94,9 @@ def hash_password(password: str) -> str:
     if not password or not isinstance(password, str):
         raise ValueError("Password must be a non-empty string")
     
-    # bcrypt generates a random salt and includes it in the hash
-    # Default cost factor is 12, which is secure and reasonably fast
-    salt = bcrypt.gensalt(rounds=12)
+    # bcrypt generates a random salt and includes it in the hash, along with
+    # the cost factor (12 unless calibrated for this machine)
+    salt = bcrypt.gensalt(rounds=get_bcrypt_rounds())
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
@@ -81,3 +125,208 @@ def verify_password(password: str, password_hash: str) -> bool:
     except ValueError:
         # Invalid hash format
         return False
+
+
+_bcrypt_rounds: Optional[int] = None
+
+
+def get_bcrypt_rounds() -> int:
+    """Return the cost factor new hashes are created with."""
+    if _bcrypt_rounds is not None:
+        return _bcrypt_rounds
+    return int(BCRYPT_ROUNDS) if BCRYPT_ROUNDS else BCRYPT_DEFAULT_ROUNDS
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float = BCRYPT_TARGET_MS,
+    min_rounds: int = BCRYPT_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_MAX_ROUNDS,
+    samples: int = 3
+) -> int:
+    """
+    Pick the cost factor whose hash time on this machine is closest to ``target_ms``.
+
+    A cheap cost is timed (best of ``samples`` to ignore scheduler noise) and
+    extrapolated, since every extra round doubles bcrypt's work.
+
+    Returns:
+        The chosen cost, clamped to ``[min_rounds, max_rounds]``
+    """
+    password = b"calibration-password"
+    salt = bcrypt.gensalt(rounds=BCRYPT_PROBE_ROUNDS)
+    best = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.hashpw(password, salt)
+        best = min(best, time.perf_counter() - start)
+    rounds = BCRYPT_PROBE_ROUNDS + round(math.log2(target_ms / 1000 / max(best, 1e-9)))
+    return max(min_rounds, min(max_rounds, rounds))
+
+
+def configure_bcrypt_rounds() -> int:
+    """
+    Set the cost factor for this process, calibrating it on first call.
+
+    Calibration is skipped when BCRYPT_ROUNDS pins the cost. Run by the
+    application lifespan at startup.
+
+    Returns:
+        The cost factor now in use
+    """
+    global _bcrypt_rounds
+    if _bcrypt_rounds is None:
+        _bcrypt_rounds = int(BCRYPT_ROUNDS) if BCRYPT_ROUNDS else calibrate_bcrypt_rounds()
+    return _bcrypt_rounds
+
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """Return the cost factor stored in a bcrypt hash, or None if it is not a bcrypt hash."""
+    parts = password_hash.split("$") if isinstance(password_hash, str) else []
+    # "$2b$12$<salt+digest>" splits into ["", "2b", "12", "<salt+digest>"]
+    if len(parts) != 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """
+    Whether a stored hash should be replaced with one at the current cost factor.
+
+    A calibrated cost only ever upgrades hashes: workers whose noisy timings
+    land on either side of a rounding boundary would otherwise keep
+    rewriting the same hash back and forth, paying an extra bcrypt hash
+    per login. A cost pinned with BCRYPT_ROUNDS is the same on every worker,
+    so hashes are then moved to it in either direction.
+    """
+    rounds = hash_rounds(password_hash)
+    if rounds is None:
+        return True
+    if BCRYPT_ROUNDS:
+        return rounds != get_bcrypt_rounds()
+    return rounds < get_bcrypt_rounds()
+
+
+class HashingPoolFullError(RuntimeError):
+    """Raised when the hashing pool already has its maximum number of pending calls."""
+
+
+class HashingPool:
+    """
+    Bounded thread pool for bcrypt work.
+
+    Limits both the number of concurrent hashes (``max_workers``) and the
+    number of calls allowed to queue behind them (``max_pending``), and
+    records per-operation timings.
+
+    Attributes:
+        max_workers: Number of worker threads
+        max_pending: Maximum number of queued plus running calls
+        observers: Callables invoked as ``observer(name, seconds)`` after every call
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.observers: List[Callable[[str, float], None]] = []
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def pending(self) -> int:
+        """Number of calls currently queued or running."""
+        return self._pending
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Create the executor on first use so it is never inherited across a fork."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="bcrypt"
+                )
+            return self._executor
+
+    def _record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            timing["count"] += 1
+            timing["total_seconds"] += seconds
+            timing["max_seconds"] = max(timing["max_seconds"], seconds)
+        for observer in self.observers:
+            observer(name, seconds)
+
+    def _timed(self, name: str, func: Callable, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    async def run(self, name: str, func: Callable, *args):
+        """
+        Run ``func(*args)`` in the pool and await its result.
+
+        Args:
+            name: Operation name used for timing statistics
+            func: Blocking callable to run
+            *args: Positional arguments for ``func``
+
+        Raises:
+            HashingPoolFullError: If ``max_pending`` calls are already in flight
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingPoolFullError("Password hashing pool is at capacity")
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), self._timed, name, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> dict:
+        """Return pool configuration, current load and per-operation timings."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "timings": {name: dict(timing) for name, timing in self._timings.items()},
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker threads; the pool is recreated on next use."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+hashing_pool = HashingPool(BCRYPT_POOL_SIZE, BCRYPT_MAX_PENDING)
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash a password in the bcrypt worker pool.
+
+    Raises:
+        ValueError: If password is empty or invalid
+        HashingPoolFullError: If the pool is at capacity
+    """
+    return await hashing_pool.run("hash", hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    """
+    Verify a password against a bcrypt hash in the bcrypt worker pool.
+
+    Raises:
+        ValueError: If either parameter is invalid
+        HashingPoolFullError: If the pool is at capacity
+    """
+    return await hashing_pool.run("verify", verify_password, password, password_hash)
@@ -0,0 +1,322 @@
+"""
+Incremental per-user, per-operation statistics.
+
+Each calculation write applies a delta to its ``CalculationStats`` row in
+the same transaction: additions are a single upsert, removals adjust the
+running sums and only rescan the user's calculations of that type when
+the removed result was the current minimum or maximum. Only finite
+results are accepted; if the running sums still leave the finite range
+(e.g. squares of very large results, or rows stored by older releases),
+the row is recomputed from the user's calculations of that type instead.
+Concurrent writers can still leave min/max slightly stale in rare
+interleavings; ``rebuild_statistics`` recomputes everything from the
+calculations table.
+
+Sums of finite results can still exceed the float range. SQLite then
+returns infinity, while PostgreSQL raises on float8 overflow, so running
+sums saturate at ±infinity explicitly and PostgreSQL aggregates results
+as NUMERIC before converting the sums back.
+"""
+import math
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Float, Numeric, Text, and_, case, cast, delete, func, insert, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.factory import FLOAT_MAX
+from app.models import Calculation, CalculationStats
+from app.schemas import CalculationStatsRead
+
+# INSERT ... ON CONFLICT constructs by dialect name
+UPSERT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def _saturating_fsum(values) -> float:
+    """Exact sum of ``values``, or ±infinity when it leaves the float range."""
+    values = list(values)
+    try:
+        return math.fsum(values)
+    except OverflowError:
+        # Only raised for finite inputs whose sum overflows
+        return sum(values)
+
+
+def _saturating_add(column, value):
+    """``column + value`` that saturates at ±infinity instead of raising on PostgreSQL."""
+    if isinstance(value, float):
+        value = literal(value, Float)
+    overflow = and_(
+        or_(and_(column > 0, value > 0), and_(column < 0, value < 0)),
+        func.abs(column) > FLOAT_MAX - func.abs(value),
+    )
+    return case((overflow, case((column > 0, math.inf), else_=-math.inf)), else_=column + value)
+
+
+def _upsert_insert(db: AsyncSession):
+    dialect = db.get_bind().dialect.name
+    upsert = UPSERT_INSERTS.get(dialect)
+    if upsert is None:
+        raise ValueError(f"No upsert support for dialect: {dialect}")
+    return upsert
+
+
+async def record_results(db: AsyncSession, user_id: Optional[UUID], results: Iterable[Tuple[str, float]]) -> None:
+    """
+    Add calculation results to their owner's statistics.
+
+    Results are aggregated per type first, so a batch costs one upsert per
+    operation type. Rows are upserted in type order so concurrent batches
+    lock them in the same order and cannot deadlock.
+
+    Args:
+        db: Session whose transaction the change joins
+        user_id: Owner of the calculations; unowned calculations are not tracked
+        results: ``(operation type, result)`` pairs
+
+    Raises:
+        ValueError: If a result is not finite
+    """
+    if user_id is None:
+        return
+    groups = defaultdict(list)
+    for operation_type, result in results:
+        if not math.isfinite(result):
+            raise ValueError(f"Cannot record a non-finite {operation_type} result")
+        groups[operation_type].append(float(result))
+    if not groups:
+        return
+
+    upsert = _upsert_insert(db)
+    for operation_type, values in sorted(groups.items()):
+        stmt = upsert(CalculationStats).values(
+            user_id=user_id,
+            type=operation_type,
+            count=len(values),
+            total=_saturating_fsum(values),
+            minimum=min(values),
+            maximum=max(values),
+            sum_squares=_saturating_fsum(value * value for value in values),
+        )
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CalculationStats.user_id, CalculationStats.type],
+            set_={
+                "count": CalculationStats.count + excluded.count,
+                "total": _saturating_add(CalculationStats.total, excluded.total),
+                "minimum": case(
+                    (excluded.minimum < CalculationStats.minimum, excluded.minimum),
+                    else_=CalculationStats.minimum
+                ),
+                "maximum": case(
+                    (excluded.maximum > CalculationStats.maximum, excluded.maximum),
+                    else_=CalculationStats.maximum
+                ),
+                "sum_squares": _saturating_add(CalculationStats.sum_squares, excluded.sum_squares),
+            }
+        )
+        await db.execute(stmt)
+
+
+async def remove_result(db: AsyncSession, user_id: Optional[UUID], operation_type: str, result: float) -> None:
+    """
+    Remove one calculation result from its owner's statistics.
+
+    Must run after the calculation itself was deleted or changed in the same
+    transaction, and after the changed calculation's new result was
+    recorded, since a removed minimum/maximum (or a row whose sums are no
+    longer finite) is recomputed from the remaining calculations.
+    """
+    if user_id is None:
+        return
+    key = (CalculationStats.user_id == user_id, CalculationStats.type == operation_type)
+    if not math.isfinite(result * result):
+        # Subtracting would turn an infinite sum into NaN
+        await _recompute_key(db, user_id, operation_type)
+        return
+    stmt = (
+        update(CalculationStats)
+        .where(*key)
+        .values(
+            count=CalculationStats.count - 1,
+            total=_saturating_add(CalculationStats.total, -result),
+            sum_squares=CalculationStats.sum_squares - result * result,
+        )
+        .returning(
+            CalculationStats.count, CalculationStats.total, CalculationStats.sum_squares,
+            CalculationStats.minimum, CalculationStats.maximum
+        )
+    )
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        return
+    if row.count <= 0:
+        await db.execute(delete(CalculationStats).where(*key))
+    elif not (math.isfinite(row.total) and math.isfinite(row.sum_squares)):
+        await _recompute_key(db, user_id, operation_type)
+    elif result <= row.minimum or result >= row.maximum:
+        bounds = (await db.execute(
+            select(func.min(Calculation.result), func.max(Calculation.result))
+            .where(Calculation.user_id == user_id, Calculation.type == operation_type)
+        )).one()
+        await db.execute(
+            update(CalculationStats).where(*key).values(minimum=bounds[0], maximum=bounds[1])
+        )
+
+
+def _aggregates(dialect: str):
+    """Select one statistics row per (user, type) from the calculations table."""
+    result = Calculation.result
+    total, sum_squares = func.sum(result), func.sum(result * result)
+    if dialect == "postgresql":
+        # float8 SUM raises on overflow; NUMERIC does not. The text detour
+        # keeps every digit (a direct float8 -> numeric cast rounds to 15)
+        wide = cast(cast(result, Text), Numeric)
+        limit = cast(cast(literal(FLOAT_MAX, Float), Text), Numeric)
+        total, sum_squares = (
+            case((aggregate > limit, math.inf), (aggregate < -limit, -math.inf), else_=cast(aggregate, Float))
+            for aggregate in (func.sum(wide), func.sum(wide * wide))
+        )
+    return (
+        select(
+            Calculation.user_id,
+            Calculation.type,
+            func.count(),
+            total,
+            func.min(Calculation.result),
+            func.max(Calculation.result),
+            sum_squares,
+        )
+        .where(Calculation.user_id.is_not(None))
+        .group_by(Calculation.user_id, Calculation.type)
+    )
+
+
+STATS_COLUMNS = ["user_id", "type", "count", "total", "minimum", "maximum", "sum_squares"]
+
+
+async def _recompute_key(db: AsyncSession, user_id: UUID, operation_type: str) -> None:
+    """Replace one statistics row with aggregates of the user's calculations of that type."""
+    await db.execute(delete(CalculationStats).where(
+        CalculationStats.user_id == user_id, CalculationStats.type == operation_type
+    ))
+    aggregates = _aggregates(db.get_bind().dialect.name).where(
+        Calculation.user_id == user_id, Calculation.type == operation_type
+    )
+    await db.execute(insert(CalculationStats).from_select(STATS_COLUMNS, aggregates))
+
+
+def apply_result_changes(connection, changes: Iterable[Tuple[Optional[UUID], str, float, float]]) -> int:
+    """
+    Adjust statistics for calculations whose result was rewritten in place.
+
+    Sync counterpart of ``record_results``/``remove_result`` for bulk jobs:
+    changes are aggregated per (user, type), so each affected row costs one
+    UPDATE, applied in key order like ``record_results``. Bounds are only rescanned from that user's calculations of that
+    type when a replaced result was the current minimum or maximum. Must run
+    in the same transaction, after the calculations were updated.
+
+    Args:
+        connection: Sync SQLAlchemy connection
+        changes: ``(owner, operation type, old result, new result)`` per rewritten calculation
+
+    Returns:
+        Number of statistics rows adjusted
+    """
+    groups = defaultdict(list)
+    for user_id, operation_type, old, new in changes:
+        if user_id is not None:
+            groups[(user_id, operation_type)].append((old, new))
+
+    adjusted = 0
+    for (user_id, operation_type), pairs in sorted(groups.items()):
+        key = (CalculationStats.user_id == user_id, CalculationStats.type == operation_type)
+        old_values = [old for old, _ in pairs]
+        new_values = [new for _, new in pairs]
+        squares = [value * value for value in old_values + new_values]
+        if not all(math.isfinite(value) for value in squares):
+            _recompute_key_sync(connection, user_id, operation_type)
+            adjusted += 1
+            continue
+        lowest, highest = min(new_values), max(new_values)
+        row = connection.execute(
+            update(CalculationStats)
+            .where(*key)
+            .values(
+                total=_saturating_add(
+                    CalculationStats.total, _saturating_fsum(new_values + [-old for old in old_values])
+                ),
+                sum_squares=_saturating_add(CalculationStats.sum_squares, _saturating_fsum(
+                    squares[len(old_values):] + [-square for square in squares[:len(old_values)]]
+                )),
+                minimum=case((CalculationStats.minimum > lowest, lowest), else_=CalculationStats.minimum),
+                maximum=case((CalculationStats.maximum < highest, highest), else_=CalculationStats.maximum),
+            )
+            .returning(CalculationStats.total, CalculationStats.sum_squares,
+                       CalculationStats.minimum, CalculationStats.maximum)
+        ).first()
+        if row is None:
+            # No rollup row for this owner and type (e.g. never backfilled)
+            continue
+        adjusted += 1
+        if not (math.isfinite(row.total) and math.isfinite(row.sum_squares)):
+            _recompute_key_sync(connection, user_id, operation_type)
+        elif min(old_values) <= row.minimum or max(old_values) >= row.maximum:
+            bounds = connection.execute(
+                select(func.min(Calculation.result), func.max(Calculation.result))
+                .where(Calculation.user_id == user_id, Calculation.type == operation_type)
+            ).one()
+            connection.execute(update(CalculationStats).where(*key).values(minimum=bounds[0], maximum=bounds[1]))
+    return adjusted
+
+
+def _recompute_key_sync(connection, user_id: UUID, operation_type: str) -> None:
+    """Sync variant of ``_recompute_key`` for bulk jobs."""
+    connection.execute(delete(CalculationStats).where(
+        CalculationStats.user_id == user_id, CalculationStats.type == operation_type
+    ))
+    aggregates = _aggregates(connection.dialect.name).where(
+        Calculation.user_id == user_id, Calculation.type == operation_type
+    )
+    connection.execute(insert(CalculationStats).from_select(STATS_COLUMNS, aggregates))
+
+
+def rebuild_statistics(connection) -> int:
+    """
+    Recompute every statistics row from the calculations table.
+
+    Runs as one DELETE plus one INSERT ... SELECT ... GROUP BY, inside the
+    caller's transaction.
+
+    Args:
+        connection: Sync SQLAlchemy connection (use ``run_sync`` from asyncio code)
+
+    Returns:
+        Number of statistics rows written
+    """
+    connection.execute(delete(CalculationStats))
+    aggregates = _aggregates(connection.dialect.name)
+    result = connection.execute(insert(CalculationStats).from_select(STATS_COLUMNS, aggregates))
+    return result.rowcount
+
+
+def describe(stats: CalculationStats) -> CalculationStatsRead:
+    """Derive mean and standard deviation from a statistics row."""
+    mean = stats.total / stats.count
+    # Clamp tiny negative values caused by floating point cancellation
+    variance = max(stats.sum_squares / stats.count - mean * mean, 0.0)
+    return CalculationStatsRead(
+        type=stats.type,
+        count=stats.count,
+        total=stats.total,
+        mean=mean,
+        minimum=stats.minimum,
+        maximum=stats.maximum,
+        stddev=math.sqrt(variance),
+    )
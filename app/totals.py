@@ -0,0 +1,213 @@
+"""
+Total counts for paginated list endpoints.
+
+Running ``COUNT(*)`` on every list request costs a full index scan, which
+takes seconds on a large calculations table. Totals are therefore opt-in
+(``include_total``) and never counted per request:
+
+- ``exact``: the table's ``COUNT(*)`` is cached per process. Only the
+  first request for a table counts inline; afterwards a background task
+  started by the application lifespan recounts every cached table once its
+  value is older than ``total_count_refresh_seconds``, and requests are
+  answered with the previous value meanwhile.
+- ``estimate``: the planner's row estimate (``pg_class.reltuples`` on
+  PostgreSQL, ``sqlite_stat1`` or ``max(rowid)`` on SQLite), falling back to
+  the cached exact count when the database has no statistics yet.
+
+A user's own calculations are counted from the statistics rollup, which
+is kept exact in the same transaction as every write.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Response
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Base, Settings, get_async_session_local
+from app.models import CalculationStats
+from app.schemas import TotalMode
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_KIND_HEADER = "X-Total-Count-Kind"
+
+
+class CountCache:
+    """
+    Per-process cache of exact counts, recounted in the background.
+
+    Attributes:
+        refresh_seconds: Age after which a count is recounted
+        refreshes: Counts run so far
+        failed_refreshes: Background recounts that raised
+    """
+
+    def __init__(self, refresh_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failed_refreshes = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the background refresh task is active."""
+        return self._task is not None and not self._task.done()
+
+    async def _store(self, key: str, count: Callable[[], Awaitable[int]]) -> None:
+        value = await count()
+        self.refreshes += 1
+        self._entries[key] = (value, self.clock())
+
+    async def get(self, key: str, count: Callable[[], Awaitable[int]]) -> int:
+        """
+        Return the cached count for ``key``, running ``count`` only if it was never counted.
+
+        Requests never wait for a recount: once a value exists it is
+        returned as is, however old, and ``refresh_due`` replaces it.
+        Concurrent first requests for a key share one count.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry[0]
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            if key not in self._entries:
+                await self._store(key, count)
+            return self._entries[key][0]
+
+    def due(self) -> List[str]:
+        """Return the keys whose count is at least ``refresh_seconds`` old."""
+        now = self.clock()
+        return [key for key, (_, counted_at) in self._entries.items() if now - counted_at >= self.refresh_seconds]
+
+    async def refresh_due(self, recount: Callable[[str], Awaitable[int]]) -> None:
+        """
+        Recount every key that is due, keeping the previous value if a recount fails.
+
+        Args:
+            recount: Returns the current count for a key
+        """
+        for key in self.due():
+            try:
+                await self._store(key, lambda: recount(key))
+            except Exception:
+                self.failed_refreshes += 1
+
+    def _next_due(self) -> float:
+        """Seconds until the oldest count becomes due (a full interval when nothing is cached)."""
+        if not self._entries:
+            return self.refresh_seconds
+        oldest = min(counted_at for _, counted_at in self._entries.values())
+        return max(oldest + self.refresh_seconds - self.clock(), 0.0)
+
+    def start(self, recount: Callable[[str], Awaitable[int]]) -> None:
+        """Start the background task refreshing due counts with ``recount``."""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run(recount))
+
+    async def _run(self, recount: Callable[[str], Awaitable[int]]) -> None:
+        while True:
+            await asyncio.sleep(self._next_due())
+            await self.refresh_due(recount)
+
+    async def close(self) -> None:
+        """Stop the background task, if one was started."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_count_cache: Optional[CountCache] = None
+
+
+def get_count_cache() -> CountCache:
+    """Return the process-wide count cache, creating it on first use."""
+    global _count_cache
+    if _count_cache is None:
+        _count_cache = CountCache(Settings().total_count_refresh_seconds)
+    return _count_cache
+
+
+def reset_count_cache() -> None:
+    """Drop cached counts so the next request recounts (mainly for tests)."""
+    global _count_cache
+    _count_cache = None
+
+
+async def _count_rows(db: AsyncSession, table) -> int:
+    return (await db.execute(select(func.count()).select_from(table))).scalar_one()
+
+
+async def _recount(name: str) -> int:
+    """Count a cached table in a session of its own, for the background refresh."""
+    async with get_async_session_local()() as db:
+        return await _count_rows(db, Base.metadata.tables[name])
+
+
+def start_count_refresh() -> None:
+    """Start refreshing the process-wide cached counts in the background."""
+    get_count_cache().start(_recount)
+
+
+async def stop_count_refresh() -> None:
+    """Stop the background refresh, if one was started."""
+    if _count_cache is not None:
+        await _count_cache.close()
+
+
+async def exact_table_count(db: AsyncSession, table) -> int:
+    """Return the table's cached row count, counting inline only the first time."""
+    return await get_count_cache().get(table.name, lambda: _count_rows(db, table))
+
+
+async def _planner_estimate(db: AsyncSession, table) -> Optional[int]:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        # reltuples is -1 (or 0 before PostgreSQL 14) until the table is first analyzed
+        estimate = (await db.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table.name}
+        )).scalar()
+        return int(estimate) if estimate is not None and estimate > 0 else None
+    if dialect == "sqlite":
+        try:
+            # sqlite_stat1 exists once ANALYZE has run; its stat column starts with the row count
+            stat = (await db.execute(
+                text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1"), {"table": table.name}
+            )).scalar()
+        except DBAPIError:
+            stat = None
+        if stat:
+            return int(stat.split()[0])
+        # Rowids grow with inserts, so the largest one bounds the count from above
+        return (await db.execute(text(f'SELECT max(rowid) FROM "{table.name}"'))).scalar() or 0
+    return None
+
+
+async def estimated_table_count(db: AsyncSession, table) -> int:
+    """Return the planner's row estimate, or the cached exact count without statistics."""
+    estimate = await _planner_estimate(db, table)
+    if estimate is None:
+        return await exact_table_count(db, table)
+    return estimate
+
+
+async def user_calculation_count(db: AsyncSession, user_id: UUID) -> int:
+    """Return how many calculations ``user_id`` owns, from the statistics rollup."""
+    stmt = select(func.coalesce(func.sum(CalculationStats.count), 0)).where(CalculationStats.user_id == user_id)
+    return (await db.execute(stmt)).scalar_one()
+
+
+def set_total_headers(response: Response, total: int, mode: TotalMode) -> None:
+    """Add the X-Total-Count and X-Total-Count-Kind headers."""
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
+    response.headers[TOTAL_KIND_HEADER] = mode.value
@@ -0,0 +1,235 @@
+"""
+Write-behind group commit for calculation inserts.
+
+Committing every calculation in its own transaction caps insert
+throughput at the database's commit (fsync) rate. When enabled,
+``create_calculation`` hands its row to a ``CalculationWriter`` instead:
+a background task collects the rows submitted within ``max_delay``
+seconds and stores them with one multi-row INSERT ... RETURNING and one
+commit, then resolves each waiting request with its own row. Requests
+therefore still only answer after their row is durable; they trade a few
+milliseconds of latency for far fewer commits.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Settings, get_async_session_local
+from app.models import Calculation
+from app.schemas import CalculationRead
+from app.statistics import record_results
+
+
+class WriteBehindFullError(RuntimeError):
+    """Raised when the writer already holds its maximum number of pending rows."""
+
+
+# A submitted row and the future its request is waiting on
+Pending = Tuple[dict, asyncio.Future]
+
+
+class CalculationWriter:
+    """
+    Groups calculation inserts from concurrent requests into shared commits.
+
+    The queue and flush task are created on first use inside the running
+    event loop, and dropped again by :meth:`close`, so the writer can be
+    reused by a later event loop (e.g. a new test client).
+
+    Attributes:
+        session_factory: Callable returning a new ``AsyncSession``
+        max_delay: Seconds to gather rows after the first one arrives
+        max_batch: Rows stored per INSERT at most
+        max_pending: Rows allowed to wait for a flush before new ones are rejected
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_delay: float,
+        max_batch: int,
+        max_pending: int
+    ):
+        self.session_factory = session_factory
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._flushes = 0
+        self._rows = 0
+        self._largest_batch = 0
+        self._failed_flushes = 0
+        self._flush_seconds = 0.0
+
+    @property
+    def pending(self) -> int:
+        """Number of rows waiting for a flush."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _start(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._closing = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(self._queue, self._closing))
+        return self._queue
+
+    async def submit(self, values: dict) -> CalculationRead:
+        """
+        Queue one calculation and wait until it has been committed.
+
+        Args:
+            values: Column values for the new ``Calculation`` row
+
+        Returns:
+            The stored calculation
+
+        Raises:
+            WriteBehindFullError: If ``max_pending`` rows are already waiting
+        """
+        queue = self._start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait((values, future))
+        except asyncio.QueueFull:
+            raise WriteBehindFullError("Calculation writer is at capacity") from None
+        return await future
+
+    async def _run(self, queue: asyncio.Queue, closing: asyncio.Event) -> None:
+        """Flush task: wait for a row, gather more for ``max_delay``, store them."""
+        while True:
+            first = await queue.get()
+            if first is None:
+                return
+            if queue.qsize() < self.max_batch - 1 and not closing.is_set():
+                try:
+                    # Cut short by close() so shutdown does not wait out the delay
+                    await asyncio.wait_for(closing.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch: List[Pending] = [first]
+            stop = False
+            while len(batch) < self.max_batch and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[Pending]) -> None:
+        """
+        Store ``batch`` in one transaction and resolve its futures.
+
+        If the shared transaction fails (e.g. an owner was deleted while its
+        row was queued), each row is retried in its own transaction so one
+        bad row only fails its own request.
+        """
+        start = time.perf_counter()
+        try:
+            stored = await self._store([values for values, _ in batch])
+        except Exception as e:
+            self._failed_flushes += 1
+            if len(batch) > 1:
+                for item in batch:
+                    await self._flush([item])
+            else:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._flush_seconds += time.perf_counter() - start
+
+        self._flushes += 1
+        self._rows += len(batch)
+        self._largest_batch = max(self._largest_batch, len(batch))
+        for (_, future), calculation in zip(batch, stored):
+            # The request may have been cancelled while its row was queued
+            if not future.done():
+                future.set_result(calculation)
+
+    async def _store(self, rows: List[dict]) -> List[CalculationRead]:
+        """Insert ``rows`` and their statistics deltas, commit, and return the stored rows."""
+        async with self.session_factory() as db:
+            stmt = insert(Calculation).returning(Calculation, sort_by_parameter_order=True)
+            calculations = (await db.scalars(stmt, rows)).all()
+            by_owner = defaultdict(list)
+            for row in rows:
+                by_owner[row["user_id"]].append((row["type"], row["result"]))
+            # Owners in a fixed order, so flushes of different workers lock
+            # statistics rows in the same order and cannot deadlock
+            for owner_id, results in sorted(by_owner.items(), key=lambda item: str(item[0])):
+                await record_results(db, owner_id, results)
+            await db.commit()
+            return [CalculationRead.model_validate(calculation) for calculation in calculations]
+
+    async def close(self) -> None:
+        """Flush every queued row, then stop the flush task."""
+        queue, task, closing = self._queue, self._task, self._closing
+        self._queue = self._task = self._closing = None
+        if queue is None:
+            return
+        closing.set()
+        # Queued behind every pending row; the flush task keeps draining, so
+        # this only waits while the queue is full
+        await queue.put(None)
+        await task
+
+    def stats(self) -> dict:
+        """Return configuration, queue depth and flush counters."""
+        return {
+            "enabled": True,
+            "max_delay_ms": self.max_delay * 1000,
+            "max_batch": self.max_batch,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "rows": self._rows,
+            "largest_batch": self._largest_batch,
+            "average_batch": self._rows / self._flushes if self._flushes else 0.0,
+            "flush_seconds_total": self._flush_seconds,
+        }
+
+
+_writer: Optional[CalculationWriter] = None
+_disabled = False
+
+
+def get_calculation_writer() -> Optional[CalculationWriter]:
+    """
+    Return the process-wide writer, or None when group commit is disabled.
+
+    Used as a FastAPI dependency so tests can substitute a writer bound to
+    their own database.
+    """
+    global _writer, _disabled
+    if _writer is None and not _disabled:
+        settings = Settings()
+        if not settings.calculation_write_behind:
+            _disabled = True
+            return None
+        _writer = CalculationWriter(
+            lambda: get_async_session_local()(),
+            max_delay=settings.write_behind_max_delay_ms / 1000,
+            max_batch=settings.write_behind_max_batch,
+            max_pending=settings.write_behind_max_pending,
+        )
+    return _writer
+
+
+async def close_calculation_writer() -> None:
+    """Flush and stop the process-wide writer, if one was started, so the next use reads the settings again."""
+    global _writer, _disabled
+    if _writer is not None:
+        await _writer.close()
+    _writer = None
+    _disabled = False
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark for calculation dispatch.
+
+Compares the per-call cost of the precompiled CalculationFactory dispatch
+table against the two paths it replaced: instantiating an Operation on
+every call, and the if/elif chain that used to live in app.main. The
+public ``calculate`` is timed with the optional result memo
+(CALCULATION_MEMO_SIZE) off and on.
+
+Usage:
+    python -m benchmarks.bench_factory [--iterations N] [--json PATH]
+"""
+import argparse
+import json
+import sys
+import timeit
+from functools import lru_cache
+
+from app.factory import CalculationFactory
+from app.schemas import OperationType
+
+
+def if_elif_chain(a: float, b: float, op: OperationType) -> float:
+    """The calculation chain formerly in app.main.perform_calculation."""
+    if op == OperationType.ADD:
+        return a + b
+    elif op == OperationType.SUBTRACT:
+        return a - b
+    elif op == OperationType.MULTIPLY:
+        return a * b
+    elif op == OperationType.DIVIDE:
+        if b == 0:
+            raise ValueError("Division by zero")
+        return a / b
+    raise ValueError("Invalid operation")
+
+
+def instantiate_per_call(a: float, b: float, op: OperationType) -> float:
+    """The former CalculationFactory.calculate: a new Operation per call."""
+    return CalculationFactory._operations[op.value]().calculate(a, b)
+
+
+def dispatch(a: float, b: float, op: OperationType) -> float:
+    """The dispatch table without the result memo."""
+    return CalculationFactory._compute(op, a, b)
+
+
+def calculate(a: float, b: float, op: OperationType) -> float:
+    """The public entry point, with the memo off (the default)."""
+    return CalculationFactory.calculate(op, a, b)
+
+
+def calculate_memoized(a: float, b: float, op: OperationType) -> float:
+    """The public entry point with the memo on (run() enables it around this candidate)."""
+    return CalculationFactory.calculate(op, a, b)
+
+
+CANDIDATES = {
+    "if_elif_chain": if_elif_chain,
+    "instantiate_per_call": instantiate_per_call,
+    "dispatch_table": dispatch,
+    "calculate": calculate,
+    "calculate_memoized": calculate_memoized,
+}
+
+
+def run(iterations: int) -> dict:
+    """Time every candidate over all operation types; returns ns per call."""
+    operations = list(OperationType)
+    results = {}
+    for name, func in CANDIDATES.items():
+        def loop(func=func):
+            for op in operations:
+                func(7.0, 3.0, op)
+        memo = CalculationFactory._memo
+        if func is calculate_memoized:
+            CalculationFactory._memo = lru_cache(maxsize=4096)(CalculationFactory._compute)
+        elif func is calculate:
+            CalculationFactory._memo = None
+        try:
+            # Best of five runs to reduce scheduler noise
+            best = min(timeit.repeat(loop, number=iterations, repeat=5))
+        finally:
+            CalculationFactory._memo = memo
+        results[name] = best / (iterations * len(operations)) * 1e9
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.iterations)
+    baseline = results["dispatch_table"]
+    for name, ns in results.items():
+        print(f"{name:<22} {ns:8.1f} ns/call  ({ns / baseline:4.2f}x dispatch)")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"unit": "ns_per_call", "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Benchmark for loading and rendering a page of calculations as JSON.
+
+Each candidate reads the same page from an in-memory SQLite database and
+renders it:
+
+- ``fastapi_default``: ORM entities rendered the way FastAPI does with
+  ``response_model`` and the stdlib JSON response (validate, convert to
+  primitives, ``json.dumps``)
+- ``fastapi_orjson``: the same with ``ORJSONResponse``, now the app default
+- ``type_adapter``: what the list endpoints now do; plain column rows,
+  validated once by a pre-built TypeAdapter and dumped straight to bytes
+  (``app.responses.json_list_response``)
+
+Usage:
+    python -m benchmarks.bench_serialization [--rows N] [--iterations N] [--json PATH]
+"""
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import Calculation, User
+from app.responses import CALCULATION_LIST, json_list_response
+from app.schemas import CalculationRead
+
+
+def make_database(count: int):
+    """Create an in-memory database holding ``count`` calculations of one user."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    user_id = uuid.uuid4()
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{
+            "id": user_id, "username": "bench", "email": "bench@example.com", "password_hash": "x"
+        }])
+        connection.execute(insert(Calculation), [
+            {
+                "id": uuid.uuid4(), "a": float(i), "b": 2.5, "type": "Multiply",
+                "result": i * 2.5, "user_id": user_id, "created_at": start + timedelta(seconds=i),
+            }
+            for i in range(count)
+        ])
+    return engine
+
+
+RESPONSE_FIELD = create_response_field("response", List[CalculationRead], mode="serialization")
+
+
+def fastapi_path(session: Session, response_class) -> bytes:
+    """Load entities, then mirror fastapi.routing.serialize_response and render."""
+    rows = session.scalars(select(Calculation)).all()
+    value, errors = RESPONSE_FIELD.validate(rows, {}, loc=("response",))
+    assert not errors
+    content = RESPONSE_FIELD.serialize(value, mode="json", by_alias=True)
+    body = response_class(content=content).body
+    session.expunge_all()
+    return body
+
+
+def type_adapter_path(session: Session) -> bytes:
+    rows = session.execute(select(*Calculation.__table__.columns)).all()
+    return json_list_response(CALCULATION_LIST, rows).body
+
+
+CANDIDATES = {
+    "fastapi_default": lambda session: fastapi_path(session, JSONResponse),
+    "fastapi_orjson": lambda session: fastapi_path(session, ORJSONResponse),
+    "type_adapter": type_adapter_path,
+}
+
+
+def run(rows: int, iterations: int) -> dict:
+    """Time every candidate on the same page; returns milliseconds per page."""
+    engine = make_database(rows)
+    results = {}
+    with Session(engine) as session:
+        # All candidates must produce the same document
+        documents = {name: json.loads(func(session)) for name, func in CANDIDATES.items()}
+        assert all(document == documents["fastapi_default"] for document in documents.values())
+
+        for name, func in CANDIDATES.items():
+            best = min(timeit.repeat(lambda func=func: func(session), number=iterations, repeat=5))
+            results[name] = best / iterations * 1e3
+    engine.dispose()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.iterations)
+    baseline = results["fastapi_default"]
+    for name, ms in results.items():
+        print(f"{name:<16} {ms:8.2f} ms/page  ({ms / baseline:4.2f}x default)")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"unit": "ms_per_page", "rows": args.rows, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
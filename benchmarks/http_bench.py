@@ -0,0 +1,284 @@
+"""
+HTTP-level benchmark for the API.
+
+Runs the application in-process (through httpx's ASGI transport, so no
+server or network is involved) against a throwaway SQLite file or a local
+PostgreSQL database, drives fixed scenarios at a configurable concurrency,
+and reports latency percentiles and throughput per route.
+
+Compare the JSON reports from before and after a change to app/main.py
+(run both against the same database backend).
+
+Usage:
+    python -m benchmarks.http_bench [--scenario NAME ...] [--requests N]
+        [--concurrency N] [--database-url URL] [--output PATH]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+BASE_URL = "http://bench"
+PASSWORD = "BenchPass123"
+OPERATIONS = ["Add", "Subtract", "Multiply", "Divide"]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class Recorder:
+    """Times requests and groups the samples by route template."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def request(self, route: str, method: str, url: str, expected: int, **kwargs) -> httpx.Response:
+        """Send one request and record its latency under ``route``."""
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(route, []).append(elapsed)
+        if response.status_code != expected:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def report(self, duration: float) -> dict:
+        """Summarise the recorded samples for a run lasting ``duration`` seconds."""
+        routes = {}
+        for route, samples in self.samples.items():
+            ordered = sorted(samples)
+            routes[route] = {
+                "requests": len(ordered),
+                "errors": self.errors.get(route, 0),
+                "requests_per_second": len(ordered) / duration if duration else 0.0,
+                "p50_ms": percentile(ordered, 0.50) * 1000,
+                "p95_ms": percentile(ordered, 0.95) * 1000,
+                "p99_ms": percentile(ordered, 0.99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            "duration_seconds": duration,
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "requests_per_second": total / duration if duration else 0.0,
+            "routes": routes,
+        }
+
+
+class Fixtures:
+    """Users and calculations created before the timed part of a scenario."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.run_id = uuid.uuid4().hex[:8]
+        self._users = 0
+        self.username: Optional[str] = None
+        self.calculation_ids: List[str] = []
+
+    def new_user(self) -> dict:
+        """Return registration data for a user unique to this run."""
+        self._users += 1
+        name = f"bench_{self.run_id}_{self._users}"
+        return {"username": name, "email": f"{name}@example.com", "password": PASSWORD}
+
+    async def authenticate(self) -> None:
+        """Register and log in a user; later requests carry its bearer token."""
+        data = self.new_user()
+        response = await self.client.post("/users/register", json=data)
+        response.raise_for_status()
+        self.username = data["username"]
+        response = await self.client.post("/users/login", json={"username": self.username, "password": PASSWORD})
+        response.raise_for_status()
+        self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    async def calculations(self, count: int) -> None:
+        """Insert ``count`` calculations through the batch endpoint."""
+        for start in range(0, count, 1000):
+            items = [
+                {"a": float(i), "b": float(i % 7 + 1), "type": OPERATIONS[i % len(OPERATIONS)]}
+                for i in range(start, min(start + 1000, count))
+            ]
+            response = await self.client.post("/calculations/batch", json={"items": items})
+            response.raise_for_status()
+            self.calculation_ids.extend(
+                result["calculation"]["id"] for result in response.json()["results"]
+            )
+
+
+def calculation_payload(i: int) -> dict:
+    return {"a": float(i), "b": float(i % 9 + 1), "type": OPERATIONS[i % len(OPERATIONS)]}
+
+
+# Each scenario is (setup, operation). ``operation(recorder, fixtures, i)``
+# performs the i-th timed request(s); setup runs untimed beforehand, after
+# a fresh user has been registered and logged in.
+Operation = Callable[[Recorder, Fixtures, int], Awaitable[None]]
+
+
+async def op_register(rec: Recorder, fx: Fixtures, i: int) -> None:
+    await rec.request("POST /users/register", "POST", "/users/register", 201, json=fx.new_user())
+
+
+async def op_login(rec: Recorder, fx: Fixtures, i: int) -> None:
+    await rec.request("POST /users/login", "POST", "/users/login", 200,
+                      json={"username": fx.username, "password": PASSWORD})
+
+
+async def op_create(rec: Recorder, fx: Fixtures, i: int) -> None:
+    await rec.request("POST /calculations", "POST", "/calculations", 201, json=calculation_payload(i))
+
+
+async def op_list(rec: Recorder, fx: Fixtures, i: int) -> None:
+    await rec.request("GET /calculations", "GET", "/calculations", 200, params={"limit": 50})
+
+
+async def op_get(rec: Recorder, fx: Fixtures, i: int) -> None:
+    calc_id = fx.calculation_ids[i % len(fx.calculation_ids)]
+    await rec.request("GET /calculations/{calc_id}", "GET", f"/calculations/{calc_id}", 200)
+
+
+async def op_update(rec: Recorder, fx: Fixtures, i: int) -> None:
+    calc_id = fx.calculation_ids[i % len(fx.calculation_ids)]
+    await rec.request("PUT /calculations/{calc_id}", "PUT", f"/calculations/{calc_id}", 200,
+                      json={"a": float(i), "b": 2.0})
+
+
+async def op_delete(rec: Recorder, fx: Fixtures, i: int) -> None:
+    # Setup seeds one calculation per request, so each id is deleted once
+    calc_id = fx.calculation_ids[i]
+    await rec.request("DELETE /calculations/{calc_id}", "DELETE", f"/calculations/{calc_id}", 204)
+
+
+# Read-heavy mix: (operation, weight)
+MIXED_WORKLOAD = [(op_get, 50), (op_list, 20), (op_create, 20), (op_update, 10)]
+
+
+async def op_mixed(rec: Recorder, fx: Fixtures, i: int) -> None:
+    operations, weights = zip(*MIXED_WORKLOAD)
+    # Seeded per request index so runs are repeatable
+    operation = random.Random(i).choices(operations, weights)[0]
+    await operation(rec, fx, i)
+
+
+SCENARIOS: Dict[str, tuple] = {
+    "register": (None, op_register),
+    "login": (None, op_login),
+    "create_calculation": (None, op_create),
+    "list_calculations": (lambda fx, n: fx.calculations(500), op_list),
+    "get_calculation": (lambda fx, n: fx.calculations(200), op_get),
+    "update_calculation": (lambda fx, n: fx.calculations(200), op_update),
+    "delete_calculation": (lambda fx, n: fx.calculations(n), op_delete),
+    "mixed": (lambda fx, n: fx.calculations(500), op_mixed),
+}
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, requests: int, concurrency: int) -> dict:
+    """Run one scenario: untimed setup, then ``requests`` operations over ``concurrency`` workers."""
+    setup, operation = SCENARIOS[name]
+    fixtures = Fixtures(client)
+    await fixtures.authenticate()
+    if setup is not None:
+        await setup(fixtures, requests)
+
+    recorder = Recorder(client)
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            await operation(recorder, fixtures, i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder.report(time.perf_counter() - start)
+
+
+async def run(scenarios: List[str], requests: int, concurrency: int) -> dict:
+    """Start the app in-process and run the requested scenarios in order."""
+    from app.database import init_db
+    from app.main import app
+
+    init_db()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    # ASGITransport does not send lifespan events, so enter the lifespan
+    # explicitly to release pools and hashing threads at the end
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url=BASE_URL) as client:
+            for name in scenarios:
+                results[name] = await run_scenario(client, name, requests, concurrency)
+                print_scenario(name, results[name])
+    return results
+
+
+def print_scenario(name: str, result: dict) -> None:
+    print(f"{name}: {result['requests']} requests, {result['requests_per_second']:.1f} req/s, "
+          f"{result['errors']} errors")
+    for route, stats in result["routes"].items():
+        print(f"  {route:<32} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+              f"p99 {stats['p99_ms']:8.2f} ms  {stats['requests_per_second']:8.1f} req/s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="Scenario to run (repeatable); defaults to all")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent in-flight requests")
+    parser.add_argument("--database-url",
+                        help="Database to benchmark against (default: a temporary SQLite file)")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON report path")
+    args = parser.parse_args(argv)
+
+    scratch = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        fd, scratch = tempfile.mkstemp(prefix="http_bench_", suffix=".db")
+        os.close(fd)
+        os.environ["DATABASE_URL"] = f"sqlite:///{scratch}"
+
+    # Every simulated client shares one address, so the login/registration
+    # limits would reject most of the register and login scenarios
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+
+    scenarios = args.scenario or list(SCENARIOS)
+    try:
+        results = asyncio.run(run(scenarios, args.requests, args.concurrency))
+    finally:
+        if scratch:
+            os.remove(scratch)
+
+    report = {
+        "config": {
+            "backend": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
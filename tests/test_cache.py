@@ -0,0 +1,77 @@
+"""
+Unit tests for the read-through cache backends.
+"""
+import pytest
+
+from app.cache import LRUCache, NullCache, user_key, calculation_key
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache:
+    """Test suite for the in-process LRU cache."""
+
+    async def test_get_returns_stored_value(self):
+        """Test a miss followed by a hit."""
+        cache = LRUCache(max_entries=10, ttl_seconds=60)
+        assert await cache.get("k") is None
+        await cache.set("k", "v")
+        assert await cache.get("k") == "v"
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    async def test_entries_expire_after_ttl(self):
+        """Test that entries past their TTL are treated as misses."""
+        clock = FakeClock()
+        cache = LRUCache(max_entries=10, ttl_seconds=5, clock=clock)
+        await cache.set("k", "v")
+        await cache.set("short", "v", ttl=1)
+        clock.now = 2
+        assert await cache.get("short") is None
+        assert await cache.get("k") == "v"
+        clock.now = 5
+        assert await cache.get("k") is None
+        assert cache.stats()["expirations"] == 2
+
+    async def test_least_recently_used_entry_is_evicted(self):
+        """Test that the size limit evicts the least recently used entry."""
+        cache = LRUCache(max_entries=2, ttl_seconds=60)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        await cache.get("a")
+        await cache.set("c", 3)
+        assert await cache.get("b") is None
+        assert await cache.get("a") == 1
+        assert await cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    async def test_delete_and_delete_prefix(self):
+        """Test explicit invalidation."""
+        cache = LRUCache(max_entries=10, ttl_seconds=60)
+        await cache.set(user_key(1), "u1")
+        await cache.set(calculation_key(1), "c1")
+        await cache.set(calculation_key(2), "c2")
+        await cache.delete(user_key(1))
+        await cache.delete_prefix("calculation:")
+        assert cache.stats()["size"] == 0
+
+
+class TestNullCache:
+    """Test suite for the disabled cache backend."""
+
+    async def test_never_stores(self):
+        """Test that the null backend always misses."""
+        cache = NullCache()
+        await cache.set("k", "v")
+        assert await cache.get("k") is None
+        assert cache.stats()["misses"] == 1
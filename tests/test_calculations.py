@@ -322,6 +322,115 @@ class TestCalculationFactory:
             CalculationFactory.calculate("Divide", 10.0, 0.0)
 
 
+class TestCalculationFactoryDispatch:
+    """Test suite for the shared-instance dispatch table."""
+
+    def test_create_operation_returns_shared_instance(self):
+        """Test that operations are instantiated once, not per call."""
+        assert CalculationFactory.create_operation("Add") is CalculationFactory.create_operation("Add")
+
+    def test_dispatch_accepts_operation_type_enum(self):
+        """Test that OperationType members and their names dispatch alike."""
+        assert CalculationFactory.calculate(OperationType.MULTIPLY, 6.0, 7.0) == 42.0
+        assert CalculationFactory.create_operation(OperationType.DIVIDE) is CalculationFactory.create_operation("Divide")
+
+    def test_register_operation_rebuilds_dispatch(self):
+        """Test that newly registered operations are dispatched."""
+        class PowerOperation(Operation):
+            def calculate(self, a: float, b: float) -> float:
+                return a ** b
+
+        try:
+            CalculationFactory.register_operation("Power", PowerOperation)
+            assert CalculationFactory.calculate("Power", 2.0, 3.0) == 8.0
+        finally:
+            del CalculationFactory._operations["Power"]
+            CalculationFactory._build_dispatch()
+        with pytest.raises(ValueError, match="Unsupported operation type: Power"):
+            CalculationFactory.calculate("Power", 2.0, 3.0)
+
+
+class TestCalculationFactoryBatch:
+    """Test suite for column-wise batch evaluation."""
+
+    def test_calculate_array_matches_scalar(self):
+        """Test that vectorized results match the scalar operations."""
+        import numpy as np
+        a = np.array([10.0, -3.5, 0.0])
+        b = np.array([4.0, 2.0, 7.0])
+        for name in CalculationFactory.get_supported_operations():
+            op = CalculationFactory.create_operation(name)
+            expected = [op.calculate(x, y) for x, y in zip(a, b)]
+            assert list(op.calculate_array(a, b)) == expected
+
+    def test_calculate_batch_mixed_operations(self):
+        """Test a batch mixing every operation type."""
+        results, errors = CalculationFactory.calculate_batch(
+            ["Add", "Subtract", "Multiply", "Divide"],
+            [20.0, 20.0, 20.0, 20.0],
+            [4.0, 4.0, 4.0, 4.0]
+        )
+        assert list(results) == [24.0, 16.0, 80.0, 5.0]
+        assert errors == [None, None, None, None]
+
+    def test_calculate_batch_reports_division_by_zero_per_item(self):
+        """Test that a zero divisor fails only its own item."""
+        import math
+        results, errors = CalculationFactory.calculate_batch(
+            ["Divide", "Divide", "Add"],
+            [1.0, 6.0, 1.0],
+            [0.0, 3.0, 0.0]
+        )
+        assert errors[0] == "Division by zero is not allowed"
+        assert math.isnan(results[0])
+        assert errors[1] is None and results[1] == 2.0
+        assert errors[2] is None and results[2] == 1.0
+
+    def test_calculate_batch_reports_unsupported_and_overflow(self):
+        """Test that unsupported types and non-finite results are reported."""
+        results, errors = CalculationFactory.calculate_batch(
+            ["Modulo", "Multiply"],
+            [1.0, 1e308],
+            [1.0, 10.0]
+        )
+        assert "Unsupported operation type" in errors[0]
+        assert errors[1] == "Result is not a finite number"
+
+
+class TestNonFiniteResults:
+    """Test that every calculation path rejects results that are not finite."""
+
+    @pytest.mark.parametrize("operation_type,a,b", [
+        ("Add", 1.7e308, 1.7e308),
+        ("Subtract", -1.7e308, 1.7e308),
+        ("Multiply", 1e308, 10.0),
+        ("Divide", 1e308, 0.1),
+        ("Add", float("inf"), 1.0),
+    ])
+    def test_calculate_rejects_overflow(self, operation_type, a, b):
+        """Test that the scalar path raises instead of returning inf or NaN."""
+        with pytest.raises(ValueError, match="Result is not a finite number"):
+            CalculationFactory.calculate(operation_type, a, b)
+
+    def test_sql_invalid_matches_calculate(self):
+        """Test that the SQL guard flags exactly the operands the scalar path rejects."""
+        from sqlalchemy import create_engine, literal, select, Float
+        engine = create_engine("sqlite://")
+        values = [0.0, 0.5, -0.5, 1.0, -2.0, 10.0, 1e308, -1e308, 1.7e308, -1.7e308, 1e-308]
+        with engine.connect() as connection:
+            for name in CalculationFactory.get_supported_operations():
+                for a in values:
+                    for b in values:
+                        try:
+                            CalculationFactory.calculate(name, a, b)
+                            expected = False
+                        except ValueError:
+                            expected = True
+                        condition = CalculationFactory.sql_invalid(name, literal(a, Float), literal(b, Float))
+                        flagged = bool(connection.execute(select(condition)).scalar())
+                        assert flagged == expected, (name, a, b)
+
+
 class TestFactoryIntegration:
     """Integration tests for factory with all operations."""
     
@@ -348,3 +457,68 @@ class TestFactoryIntegration:
         result2 = CalculationFactory.calculate("Multiply", result1, 2.0)
         result3 = CalculationFactory.calculate("Subtract", result2, 3.0)
         assert result3 == 27.0
+
+
+@pytest.fixture
+def memo_enabled(monkeypatch):
+    """Enable the (normally disabled) result memo for one test."""
+    import app.factory as factory
+    monkeypatch.setattr(factory, "CALCULATION_MEMO_SIZE", 64)
+    CalculationFactory._build_dispatch()
+    yield
+    monkeypatch.undo()
+    CalculationFactory._build_dispatch()
+
+
+@pytest.mark.usefixtures("memo_enabled")
+class TestCalculationFactoryMemo:
+    """Test suite for result memoization and batch deduplication."""
+
+    def test_repeated_inputs_hit_the_memo(self):
+        """Test that a repeated calculation is served from the memo."""
+        before = CalculationFactory.memo_stats()
+        assert CalculationFactory.calculate("Multiply", 1.25, 8.5) == 10.625
+        assert CalculationFactory.calculate("Multiply", 1.25, 8.5) == 10.625
+        after = CalculationFactory.memo_stats()
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"] + 1
+
+    def test_zero_operands_keep_their_sign(self):
+        """Test that 0.0 and -0.0 are not conflated by the memo."""
+        assert str(CalculationFactory.calculate("Multiply", 3.0, -0.0)) == "-0.0"
+        assert str(CalculationFactory.calculate("Multiply", 3.0, 0.0)) == "0.0"
+
+    def test_errors_are_not_memoized(self):
+        """Test that invalid inputs raise every time."""
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                CalculationFactory.calculate("Divide", 1.5, 0.0)
+
+    def test_batch_duplicates_are_collapsed(self):
+        """Test that identical batch items are evaluated once and expanded back."""
+        before = CalculationFactory.memo_stats()
+        results, errors = CalculationFactory.calculate_batch(
+            ["Add", "Divide", "Add", "Divide", "Add"],
+            [1.0, 4.0, 1.0, 4.0, 2.0],
+            [2.0, 0.0, 2.0, 0.0, 2.0]
+        )
+        assert results[0] == results[2] == 3.0
+        assert results[4] == 4.0
+        assert errors[1] == errors[3] == "Division by zero is not allowed"
+        after = CalculationFactory.memo_stats()
+        assert after["batch_items"] == before["batch_items"] + 5
+        assert after["batch_duplicates"] == before["batch_duplicates"] + 2
+
+    def test_register_operation_clears_memo(self):
+        """Test that replacing an operation drops remembered results."""
+        class DoubleAdd(AddOperation):
+            def calculate(self, a, b):
+                return 2 * (a + b)
+
+        CalculationFactory.calculate("Add", 1.5, 1.5)
+        try:
+            CalculationFactory.register_operation("Add", DoubleAdd)
+            assert CalculationFactory.calculate("Add", 1.5, 1.5) == 6.0
+        finally:
+            CalculationFactory.register_operation("Add", AddOperation)
+        assert CalculationFactory.calculate("Add", 1.5, 1.5) == 3.0
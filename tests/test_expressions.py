@@ -0,0 +1,130 @@
+"""
+Unit tests for compiled arithmetic expressions.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from app.expressions import ExpressionError, compile_expression
+from app.factory import AddOperation, CalculationFactory
+
+
+class TestExpressionCompilation:
+    """Test suite for parsing expressions into plans."""
+
+    def test_plan_uses_one_step_per_operator(self):
+        """Test that each binary operator becomes one step over the registered operations."""
+        plan = compile_expression("(a + b) * c / d")
+        assert plan.variables == ("a", "b", "c", "d")
+        assert [name for name, _, _ in plan.steps] == ["Add", "Multiply", "Divide"]
+
+    def test_constant_subexpressions_are_folded(self):
+        """Test that operations on literals are computed at compile time."""
+        plan = compile_expression("x * (2 + 3 * 4)")
+        assert len(plan.steps) == 1
+        assert plan.evaluate({"x": 2.0}) == (28.0, None)
+
+    def test_plans_are_cached_by_source(self):
+        """Test that compiling the same source twice returns the cached plan."""
+        assert compile_expression("p * q + 1") is compile_expression("p * q + 1")
+
+    @pytest.mark.parametrize("source", ["a ** 2", "f(a)", "a.b", "a if b else c", "[a]", "'a'", "a +", ""])
+    def test_unsupported_syntax_is_rejected(self, source):
+        """Test that anything beyond numbers, names and + - * / is rejected."""
+        with pytest.raises(ExpressionError):
+            compile_expression(source)
+
+    def test_constant_division_by_zero_is_rejected(self):
+        """Test that folding 1 / 0 reports the divide operation's error."""
+        with pytest.raises(ValueError, match="Division by zero"):
+            compile_expression("a + 1 / 0")
+
+    def test_integer_literal_beyond_float_range_is_rejected(self):
+        """Test that a literal too large for a float is an expression error, not an OverflowError."""
+        with pytest.raises(ExpressionError, match="finite"):
+            compile_expression("1" + "0" * 400 + " * x")
+
+    def test_overlong_expression_is_rejected(self):
+        """Test that the expression length is bounded."""
+        with pytest.raises(ExpressionError):
+            compile_expression("+".join(["a"] * 600))
+
+
+class TestScalarEvaluation:
+    """Test suite for evaluating plans over numbers."""
+
+    def test_matches_python_arithmetic(self):
+        """Test that precedence and parentheses follow normal arithmetic."""
+        plan = compile_expression("a - b * (c + -d) / 4")
+        values = {"a": 10.0, "b": 3.0, "c": 5.0, "d": 1.0}
+        assert plan.evaluate(values)[0] == pytest.approx(10.0 - 3.0 * (5.0 + -1.0) / 4)
+
+    def test_unary_minus_keeps_sign_of_zero(self):
+        """Test that -x of 0.0 is -0.0, as in Python."""
+        result, _ = compile_expression("-x").evaluate({"x": 0.0})
+        assert math.copysign(1.0, result) == -1.0
+
+    def test_division_by_zero_raises(self):
+        """Test that a zero divisor fails a scalar evaluation."""
+        with pytest.raises(ValueError, match="Division by zero"):
+            compile_expression("a / b").evaluate({"a": 1.0, "b": 0.0})
+
+    def test_overflow_raises(self):
+        """Test that non-finite intermediate results are rejected by the factory."""
+        with pytest.raises(ValueError, match="finite"):
+            compile_expression("a * a").evaluate({"a": 1e200})
+
+    def test_non_finite_input_is_rejected_without_steps(self):
+        """Test that a bare variable is checked like any computed result."""
+        with pytest.raises(ValueError, match="finite"):
+            compile_expression("x").evaluate({"x": float("nan")})
+
+    def test_missing_and_unknown_variables(self):
+        """Test that the variables must match the expression exactly."""
+        plan = compile_expression("a + b")
+        with pytest.raises(ExpressionError, match="Missing variables: b"):
+            plan.evaluate({"a": 1.0})
+        with pytest.raises(ExpressionError, match="Unknown variables: c"):
+            plan.evaluate({"a": 1.0, "b": 2.0, "c": 3.0})
+
+    def test_uses_registered_operation(self):
+        """Test that replacing an operation in the factory changes evaluation."""
+        class ShiftedAdd(AddOperation):
+            def calculate(self, a, b):
+                return a + b + 100
+
+        plan = compile_expression("a + b")
+        try:
+            CalculationFactory.register_operation("Add", ShiftedAdd)
+            assert plan.evaluate({"a": 1.0, "b": 2.0})[0] == 103.0
+        finally:
+            CalculationFactory.register_operation("Add", AddOperation)
+
+
+class TestArrayEvaluation:
+    """Test suite for evaluating plans element-wise."""
+
+    def test_scalars_broadcast_over_arrays(self):
+        """Test that scalar variables apply to every element."""
+        result, errors = compile_expression("(x + 1) * k").evaluate({"x": [1.0, 2.0, 3.0], "k": 10.0})
+        np.testing.assert_array_equal(result, [20.0, 30.0, 40.0])
+        assert errors == [None, None, None]
+
+    def test_invalid_elements_are_reported_individually(self):
+        """Test that a zero divisor only fails its own element, including downstream steps."""
+        result, errors = compile_expression("a / b + 1").evaluate({"a": [1.0, 2.0, 3.0], "b": [1.0, 0.0, 2.0]})
+        assert result[0] == 2.0 and result[2] == 2.5
+        assert math.isnan(result[1])
+        assert errors == [None, "Division by zero is not allowed", None]
+
+    def test_non_finite_elements_are_reported_without_steps(self):
+        """Test that a bare array variable flags its non-finite elements."""
+        result, errors = compile_expression("x").evaluate({"x": [float("inf"), 1.0]})
+        assert math.isnan(result[0]) and result[1] == 1.0
+        assert errors == ["Result is not a finite number", None]
+
+    def test_mismatched_lengths_are_rejected(self):
+        """Test that array variables must have equal lengths."""
+        with pytest.raises(ExpressionError, match="same length"):
+            compile_expression("a + b").evaluate({"a": [1.0, 2.0], "b": [1.0]})
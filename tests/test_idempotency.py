@@ -0,0 +1,147 @@
+"""
+Unit tests for idempotency key handling.
+"""
+import asyncio
+
+import httpx
+import pytest
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.idempotency import IdempotencyMiddleware, MemoryIdempotencyBackend, StoredResponse, should_store
+import app.idempotency as idempotency
+
+
+class CountingApp:
+    """ASGI app that echoes the request body after a delay and counts its calls."""
+
+    def __init__(self, delay: float = 0.0, status_code: int = 201):
+        self.calls = 0
+        self.delay = delay
+        self.status_code = status_code
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = await Request(scope, receive).body()
+        await asyncio.sleep(self.delay)
+        response = JSONResponse({"call": self.calls, "body": body.decode()}, status_code=self.status_code)
+        await response(scope, receive, send)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """A fresh in-memory store used by the middleware."""
+    store = MemoryIdempotencyBackend(max_entries=100, ttl_seconds=60)
+    monkeypatch.setattr(idempotency, "get_idempotency_backend", lambda: store)
+    return store
+
+
+def make_client(inner, wait_seconds: float = 5.0) -> httpx.AsyncClient:
+    middleware = IdempotencyMiddleware(inner, routes=[("POST", "/items")], wait_seconds=wait_seconds)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+
+
+class TestMemoryIdempotencyBackend:
+    """Test suite for the in-process idempotency store."""
+
+    async def test_only_one_caller_acquires_a_key(self):
+        """Test that a key in flight cannot be acquired again until released."""
+        store = MemoryIdempotencyBackend(max_entries=10, ttl_seconds=60)
+        assert await store.acquire("k")
+        assert not await store.acquire("k")
+        await store.release("k", None)
+        assert await store.acquire("k")
+
+    async def test_release_stores_response_and_wakes_waiters(self):
+        """Test that waiters resume once the owner stores its response."""
+        store = MemoryIdempotencyBackend(max_entries=10, ttl_seconds=60)
+        await store.acquire("k")
+        waiter = asyncio.ensure_future(store.wait("k", timeout=5))
+        await asyncio.sleep(0)
+        response = StoredResponse("f", 201, [], b"{}")
+        await store.release("k", response)
+        assert await waiter
+        assert await store.get("k") == response
+
+    async def test_wait_times_out(self):
+        """Test that waiting on a key that stays in flight gives up."""
+        store = MemoryIdempotencyBackend(max_entries=10, ttl_seconds=60)
+        await store.acquire("k")
+        assert not await store.wait("k", timeout=0.01)
+
+    def test_transient_statuses_are_not_stored(self):
+        """Test that server errors and rate limiting leave the key retryable."""
+        assert should_store(201)
+        assert should_store(400)
+        assert not should_store(429)
+        assert not should_store(503)
+
+
+@pytest.mark.usefixtures("backend")
+class TestIdempotencyMiddleware:
+    """Test suite for replaying responses by idempotency key."""
+
+    async def test_duplicate_is_replayed_without_running_again(self):
+        """Test that a repeated key returns the stored response."""
+        inner = CountingApp()
+        async with make_client(inner) as client:
+            first = await client.post("/items", content=b"a", headers={"Idempotency-Key": "1"})
+            second = await client.post("/items", content=b"a", headers={"Idempotency-Key": "1"})
+        assert inner.calls == 1
+        assert second.status_code == first.status_code == 201
+        assert second.content == first.content
+        assert second.headers["Idempotent-Replayed"] == "true"
+
+    async def test_concurrent_duplicates_wait_for_the_original(self):
+        """Test that a duplicate arriving mid-request waits instead of running the handler."""
+        inner = CountingApp(delay=0.05)
+        async with make_client(inner) as client:
+            responses = await asyncio.gather(*(
+                client.post("/items", content=b"a", headers={"Idempotency-Key": "1"}) for _ in range(5)
+            ))
+        assert inner.calls == 1
+        assert {response.content for response in responses} == {responses[0].content}
+
+    async def test_key_reused_with_different_body_is_rejected(self):
+        """Test that one key cannot be used for two different requests."""
+        inner = CountingApp()
+        async with make_client(inner) as client:
+            await client.post("/items", content=b"a", headers={"Idempotency-Key": "1"})
+            response = await client.post("/items", content=b"b", headers={"Idempotency-Key": "1"})
+        assert response.status_code == 422
+        assert inner.calls == 1
+
+    async def test_keys_are_scoped_to_the_caller(self):
+        """Test that the same key from different credentials runs separately."""
+        inner = CountingApp()
+        async with make_client(inner) as client:
+            for token in ("a", "b"):
+                await client.post("/items", content=b"x",
+                                  headers={"Idempotency-Key": "1", "Authorization": f"Bearer {token}"})
+        assert inner.calls == 2
+
+    async def test_server_errors_are_retried(self):
+        """Test that a failed attempt does not pin its key."""
+        inner = CountingApp(status_code=503)
+        async with make_client(inner) as client:
+            for _ in range(2):
+                await client.post("/items", content=b"a", headers={"Idempotency-Key": "1"})
+        assert inner.calls == 2
+
+    async def test_in_flight_timeout_returns_conflict(self):
+        """Test that a duplicate gives up with 409 when the original runs too long."""
+        inner = CountingApp(delay=0.2)
+        async with make_client(inner, wait_seconds=0.01) as client:
+            first, second = await asyncio.gather(
+                client.post("/items", content=b"a", headers={"Idempotency-Key": "1"}),
+                client.post("/items", content=b"a", headers={"Idempotency-Key": "1"}),
+            )
+        assert sorted([first.status_code, second.status_code]) == [201, 409]
+
+    async def test_requests_without_key_pass_through(self):
+        """Test that requests without the header always run."""
+        inner = CountingApp()
+        async with make_client(inner) as client:
+            for _ in range(2):
+                await client.post("/items", content=b"a")
+        assert inner.calls == 2
@@ -5,14 +5,33 @@ These tests use PostgreSQL for testing.
 """
 import pytest
 import os
-from sqlalchemy import create_engine
+from datetime import datetime, timedelta
+from uuid import UUID
+from sqlalchemy import Column, ForeignKey, MetaData, Table, Uuid, create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 
 from app.main import app, Base
-from app.database import get_db
+from app.database import (
+    get_async_db,
+    get_async_database_url,
+    get_async_engine,
+    get_async_session_local,
+    dispose_engines,
+    enable_sqlite_foreign_keys,
+    upgrade_schema,
+)
+from app.metrics import instrument_engine
+from app.auth import get_claims_cache
+from app.security import create_access_token, hashing_pool
+from app.ratelimit import reset_rate_limiter
+from app.idempotency import reset_idempotency_backend
+from app.totals import get_count_cache, reset_count_cache
 from app.models import User, Calculation
 from app.factory import CalculationFactory
+from app.writebehind import CalculationWriter, get_calculation_writer
 
 
 # Use PostgreSQL test database
@@ -24,6 +43,7 @@ def setup_database():
     """Create test database and tables."""
     # Create engine for test database
     engine = create_engine(DATABASE_URL)
+    enable_sqlite_foreign_keys(engine)
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
@@ -58,13 +78,22 @@ def db_session(setup_database):
 @pytest.fixture
 def client(db_session):
     """Provide a test client with database dependency override."""
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
+    # NullPool keeps connections from outliving the TestClient's event loop
+    async_engine = create_async_engine(get_async_database_url(DATABASE_URL), poolclass=NullPool)
+    enable_sqlite_foreign_keys(async_engine)
+    instrument_engine(async_engine)
+    TestingAsyncSessionLocal = get_async_session_local(async_engine)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
     
-    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # Every test starts with full rate limit buckets, no stored responses
+    # and no cached counts
+    reset_rate_limiter()
+    reset_idempotency_backend()
+    reset_count_cache()
     
     with TestClient(app) as test_client:
         yield test_client
@@ -72,6 +101,83 @@ def client(db_session):
     app.dependency_overrides.clear()
 
 
+def create_user_with_token(db_session, username, expires_delta=timedelta(minutes=30)):
+    """Insert a user directly (skipping bcrypt) and return it with a bearer header."""
+    user = User(username=username, email=f"{username}@example.com", password_hash="not-a-bcrypt-hash")
+    db_session.add(user)
+    db_session.commit()
+    token = create_access_token({"sub": username, "uid": str(user.id)}, expires_delta)
+    return user, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def auth_user(client, db_session):
+    """Authenticate the test client as a freshly created user."""
+    user, headers = create_user_with_token(db_session, "calcowner")
+    client.headers.update(headers)
+    return user
+
+
+class TestDatabaseLifecycle:
+    """Test lazy engine creation and disposal."""
+
+    def test_async_database_url_uses_async_driver(self):
+        """Test that sync URLs are mapped to their asyncio drivers."""
+        assert get_async_database_url("postgresql://u:p@localhost/db") == "postgresql+asyncpg://u:p@localhost/db"
+        assert get_async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+
+    async def test_engine_is_cached_until_disposed(self):
+        """Test that the process engine is reused and rebuilt after disposal."""
+        engine = get_async_engine()
+        assert get_async_engine() is engine
+        await dispose_engines()
+        assert get_async_engine() is not engine
+        await dispose_engines()
+
+
+class TestSchemaUpgrade:
+    """Test upgrading tables created by an earlier release."""
+
+    def test_missing_indexes_are_created_once(self):
+        """Test that indexes added to existing tables are created, and a second run is a no-op."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_calculations_user_history"))
+            assert upgrade_schema(connection) == ["created index ix_calculations_user_history"]
+            assert upgrade_schema(connection) == []
+
+    def test_obsolete_indexes_are_dropped(self):
+        """Test that indexes replaced by ix_calculations_user_history are removed."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text("CREATE INDEX ix_calculations_created_at_id ON calculations (created_at, id)"))
+            connection.execute(text("CREATE INDEX ix_calculations_user_id ON calculations (user_id)"))
+            assert sorted(upgrade_schema(connection)) == [
+                "dropped index ix_calculations_created_at_id",
+                "dropped index ix_calculations_user_id",
+            ]
+            assert upgrade_schema(connection) == []
+
+    def test_foreign_key_action_mismatch_is_reported(self):
+        """Test that a foreign key without the model's ON DELETE action is flagged on SQLite."""
+        engine = create_engine("sqlite://")
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE users (id CHAR(32) PRIMARY KEY)"))
+            connection.execute(text(
+                "CREATE TABLE calculations (id CHAR(32) PRIMARY KEY, user_id CHAR(32) REFERENCES users (id))"
+            ))
+            metadata = MetaData()
+            Table("users", metadata, Column("id", Uuid, primary_key=True))
+            Table("calculations", metadata, Column("id", Uuid, primary_key=True),
+                  Column("user_id", Uuid, ForeignKey("users.id", ondelete="SET NULL")))
+            changes = upgrade_schema(connection, metadata)
+        assert changes == [
+            "WARNING: cannot change foreign key calculations(user_id) ON DELETE SET NULL in place; recreate the table"
+        ]
+
+
 class TestHealthEndpoint:
     """Test health check endpoint."""
     
@@ -82,6 +188,44 @@ class TestHealthEndpoint:
         data = response.json()
         assert data["status"] == "healthy"
 
+    def test_database_pool_status(self, client):
+        """Test that pool statistics are reported."""
+        response = client.get("/health/db-pool")
+        assert response.status_code == 200
+        data = response.json()
+        for key in ("pool_class", "checked_out", "idle", "overflow", "wait_seconds_avg", "timeouts"):
+            assert key in data
+
+    def test_calculation_memo_status(self, client):
+        """Test that memo hit-rate statistics are reported."""
+        response = client.get("/health/calculation-memo")
+        assert response.status_code == 200
+        for key in ("enabled", "hits", "misses", "hit_rate", "batch_duplicates"):
+            assert key in response.json()
+
+    def test_write_behind_disabled_by_default(self, client):
+        """Test that group commit is off unless configured."""
+        response = client.get("/health/write-behind")
+        assert response.status_code == 200
+        assert response.json() == {"enabled": False}
+
+    def test_metrics_endpoint(self, client, auth_user):
+        """Test that request, SQL and hashing metrics are exposed."""
+        client.post("/users/register", json={
+            "username": "metricsuser", "email": "metrics@example.com", "password": "password123"
+        })
+        client.post("/calculations", json={"a": 1, "b": 2, "type": "Add"})
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'http_request_duration_seconds_count{method="POST",route="/calculations",status="201"}' in body
+        assert 'db_statement_duration_seconds_count{statement="INSERT"}' in body
+        assert 'password_hashing_duration_seconds_count{operation="hash"}' in body
+        assert "http_requests_in_flight" in body
+        assert "db_pool_connections" in body
+        assert "# TYPE db_pool_checkouts_total counter" in body
+
 
 class TestUserCreation:
     """Test user creation endpoints and constraints."""
@@ -231,6 +375,53 @@ class TestUserLogin:
         response = client.post("/users/login", json=login_data)
         assert response.status_code == 401
 
+class TestPasswordRehash:
+    """Test transparent rehashing of outdated password hashes on login."""
+
+    def test_login_rehashes_outdated_cost(self, client, db_session):
+        """Test that a hash with a lower cost factor is replaced after login."""
+        import bcrypt
+        from app.security import get_bcrypt_rounds, hash_rounds
+        old_hash = bcrypt.hashpw(b"securepassword123", bcrypt.gensalt(rounds=4)).decode()
+        user = User(username="legacy", email="legacy@example.com", password_hash=old_hash)
+        db_session.add(user)
+        db_session.commit()
+
+        response = client.post("/users/login", json={"username": "legacy", "password": "securepassword123"})
+        assert response.status_code == 200
+
+        db_session.refresh(user)
+        assert user.password_hash != old_hash
+        assert hash_rounds(user.password_hash) == get_bcrypt_rounds()
+        response = client.post("/users/login", json={"username": "legacy", "password": "securepassword123"})
+        assert response.status_code == 200
+
+
+class TestPasswordRateLimiting:
+    """Test rate limiting of login and registration attempts."""
+
+    def test_login_flood_is_rejected_before_hashing(self, client):
+        """Test that attempts beyond the username burst get 429 without running bcrypt."""
+        attempts = [
+            client.post("/users/login", json={"username": "ghost", "password": "wrongpassword"})
+            for _ in range(5)
+        ]
+        assert all(response.status_code == 401 for response in attempts)
+
+        verifies = hashing_pool.stats()["timings"].get("verify", {}).get("count", 0)
+        response = client.post("/users/login", json={"username": "ghost", "password": "wrongpassword"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert hashing_pool.stats()["timings"].get("verify", {}).get("count", 0) == verifies
+
+    def test_username_limit_is_per_username(self, client):
+        """Test that exhausting one username's bucket leaves others usable."""
+        for _ in range(6):
+            client.post("/users/login", json={"username": "ghost", "password": "wrongpassword"})
+        response = client.post("/users/login", json={"username": "other", "password": "wrongpassword"})
+        assert response.status_code == 401
+
+
 class TestUserRetrieval:
     """Test user retrieval endpoints."""
     
@@ -264,6 +455,73 @@ class TestUserRetrieval:
         data = response.json()
         assert len(data) == 2
     
+    def test_list_users_with_cursor(self, client):
+        """Test walking every user page by page with the cursor header."""
+        for i in range(5):
+            client.post("/users/register", json={
+                "username": f"user{i}",
+                "email": f"user{i}@example.com",
+                "password": "securepassword123"
+            })
+
+        seen = []
+        cursor = None
+        for _ in range(3):
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/users", params=params)
+            assert response.status_code == 200
+            seen.extend(user["username"] for user in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+        assert cursor is None
+        assert sorted(seen) == [f"user{i}" for i in range(5)]
+        assert len(set(seen)) == 5
+
+    def test_list_users_response_shape(self, client):
+        """Test that the pre-serialized user list matches the UserRead schema."""
+        register = client.post("/users/register", json={
+            "username": "shape",
+            "email": "shape@example.com",
+            "password": "securepassword123"
+        })
+        response = client.get("/users")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == [register.json()]
+
+    def test_list_users_total_is_opt_in_and_cached(self, client, db_session):
+        """Test that the exact total is only sent when requested and is reused between requests."""
+        for i in range(3):
+            create_user_with_token(db_session, f"total{i}")
+        response = client.get("/users", params={"limit": 2})
+        assert "X-Total-Count" not in response.headers
+
+        response = client.get("/users", params={"limit": 2, "include_total": "exact"})
+        assert response.headers["X-Total-Count"] == "3"
+        assert response.headers["X-Total-Count-Kind"] == "exact"
+        assert "X-Next-Cursor" in response.headers
+
+        create_user_with_token(db_session, "total3")
+        response = client.get("/users", params={"include_total": "exact"})
+        assert len(response.json()) == 4
+        assert response.headers["X-Total-Count"] == "3"
+        # Recounts happen in the background task started by the lifespan
+        assert get_count_cache().running
+
+    def test_list_users_estimated_total(self, client, db_session):
+        """Test that the estimate comes from table statistics."""
+        for i in range(3):
+            create_user_with_token(db_session, f"estimate{i}")
+        response = client.get("/users", params={"include_total": "estimate"})
+        assert int(response.headers["X-Total-Count"]) >= 3
+        assert response.headers["X-Total-Count-Kind"] == "estimate"
+
+    def test_list_users_invalid_cursor(self, client):
+        """Test that a malformed cursor is rejected."""
+        response = client.get("/users", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+
     def test_get_user_by_id(self, client):
         """Test retrieving a specific user by ID."""
         # Create a user
@@ -329,6 +587,23 @@ class TestUserUpdate:
         data = response.json()
         assert data["email"] == "newemail@example.com"
     
+    def test_update_user_invalidates_cached_user(self, client):
+        """Test that a cached user is refreshed after an update."""
+        create_response = client.post("/users/register", json={
+            "username": "cacheduser",
+            "email": "cached@example.com",
+            "password": "securepassword123"
+        })
+        user_id = create_response.json()["id"]
+
+        assert client.get(f"/users/{user_id}").json()["username"] == "cacheduser"
+        assert client.get(f"/users/{user_id}").json()["username"] == "cacheduser"
+        client.put(f"/users/{user_id}", json={"username": "renamed"})
+        assert client.get(f"/users/{user_id}").json()["username"] == "renamed"
+
+        stats = client.get("/health/cache").json()
+        assert stats["hits"] >= 1
+
     def test_update_user_duplicate_username(self, client):
         """Test updating with duplicate username is rejected."""
         # Create two users
@@ -353,6 +628,13 @@ class TestUserUpdate:
         assert "Username already exists" in response.json()["detail"]
 
 
+    def test_update_nonexistent_user(self, client):
+        """Test updating a user that does not exist."""
+        response = client.put("/users/00000000-0000-0000-0000-000000000000", json={"username": "ghost"})
+        assert response.status_code == 404
+        assert "User not found" in response.json()["detail"]
+
+
 class TestUserDeletion:
     """Test user deletion endpoints."""
     
@@ -375,14 +657,26 @@ class TestUserDeletion:
         response = client.get(f"/users/{user_id}")
         assert response.status_code == 404
     
+    def test_delete_user_detaches_calculations(self, client, db_session, auth_user):
+        """Test that deleting a user keeps their calculations without an owner."""
+        calc_id = client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"}).json()["id"]
+
+        response = client.delete(f"/users/{auth_user.id}")
+        assert response.status_code == 204
+
+        calc = db_session.get(Calculation, UUID(calc_id))
+        assert calc is not None
+        assert calc.user_id is None
+
     def test_delete_nonexistent_user(self, client):
         """Test deleting a non-existent user."""
         response = client.delete("/users/00000000-0000-0000-0000-000000000000")
         assert response.status_code == 404
         assert "User not found" in response.json()["detail"]
 
+@pytest.mark.usefixtures("auth_user")
 class TestCalculationAPI:
-    """Test calculation API endpoints."""
+    """Test calculation API endpoints as an authenticated user."""
 
     def test_create_calculation(self, client):
         """Test creating a calculation."""
@@ -410,6 +704,12 @@ class TestCalculationAPI:
         response = client.post("/calculations", json=calc_data)
         assert response.status_code == 422 # Pydantic validation error or 400 from logic
 
+    def test_create_calculation_overflow_rejected(self, client):
+        """Test that a result overflowing to infinity is rejected instead of stored."""
+        response = client.post("/calculations", json={"a": 1e308, "b": 10.0, "type": "Multiply"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Result is not a finite number"
+
     def test_get_calculation(self, client):
         """Test retrieving a calculation."""
         calc_data = {
@@ -436,6 +736,94 @@ class TestCalculationAPI:
         data = response.json()
         assert len(data) >= 2
 
+    def test_list_calculations_total(self, client, db_session):
+        """Test that the user's total comes from the statistics rollup and excludes others' rows."""
+        other, headers = create_user_with_token(db_session, "othertotal")
+        client.post("/calculations", json={"a": 1.0, "b": 1.0, "type": "Add"}, headers=headers)
+        for operation_type in ("Add", "Multiply", "Divide"):
+            client.post("/calculations", json={"a": 4.0, "b": 2.0, "type": operation_type})
+
+        for mode in ("exact", "estimate"):
+            response = client.get("/calculations", params={"limit": 1, "include_total": mode})
+            assert response.headers["X-Total-Count"] == "3"
+            assert response.headers["X-Total-Count-Kind"] == "exact"
+
+    def test_list_calculations_keyset_matches_offset(self, client):
+        """Test that cursor pages and legacy offset pages return the same order."""
+        for i in range(5):
+            client.post("/calculations", json={"a": float(i), "b": 1.0, "type": "Add"})
+
+        first = client.get("/calculations", params={"limit": 3})
+        second = client.get("/calculations", params={"limit": 3, "cursor": first.headers["X-Next-Cursor"]})
+        assert "X-Next-Cursor" not in second.headers
+        keyset_ids = [c["id"] for c in first.json() + second.json()]
+
+        offset_ids = []
+        for skip in (0, 3):
+            response = client.get("/calculations", params={"skip": skip, "limit": 3})
+            assert "X-Next-Cursor" not in response.headers
+            offset_ids.extend(c["id"] for c in response.json())
+        assert keyset_ids == offset_ids
+        assert len(keyset_ids) == 5
+
+    def test_create_calculations_batch(self, client):
+        """Test creating several calculations with per-item errors."""
+        batch = {
+            "items": [
+                {"a": 10.0, "b": 5.0, "type": "Add"},
+                {"a": 1.0, "b": 0.0, "type": "Divide"},
+                {"a": 9.0, "b": 3.0, "type": "Divide"}
+            ]
+        }
+        response = client.post("/calculations/batch", json=batch)
+        assert response.status_code == 201
+        data = response.json()
+        assert data["created"] == 2
+        assert data["failed"] == 1
+        results = data["results"]
+        assert [r["index"] for r in results] == [0, 1, 2]
+        assert results[0]["calculation"]["result"] == 15.0
+        assert results[1]["calculation"] is None
+        assert "Division by zero" in results[1]["error"]
+        assert results[2]["calculation"]["result"] == 3.0
+
+        stored = client.get(f"/calculations/{results[2]['calculation']['id']}")
+        assert stored.status_code == 200
+        assert stored.json()["type"] == "Divide"
+
+    def test_create_calculations_batch_rejects_empty(self, client):
+        """Test that an empty batch is rejected."""
+        response = client.post("/calculations/batch", json={"items": []})
+        assert response.status_code == 422
+
+    def test_export_calculations_ndjson(self, client):
+        """Test streaming calculations as NDJSON in creation order."""
+        import json
+        for i in range(3):
+            client.post("/calculations", json={"a": float(i), "b": 1.0, "type": "Add"})
+
+        response = client.get("/calculations/export", params={"format": "ndjson"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["a"] for row in rows] == [0.0, 1.0, 2.0]
+        assert rows[0]["result"] == 1.0
+
+    def test_export_calculations_csv_only_own(self, client, db_session, auth_user):
+        """Test that CSV exports only contain the caller's calculations."""
+        import csv
+        import io
+        _, other_headers = create_user_with_token(db_session, "exporter")
+        client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"})
+        client.post("/calculations", json={"a": 3.0, "b": 4.0, "type": "Add"}, headers=other_headers)
+
+        response = client.get("/calculations/export", params={"format": "csv"})
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 1
+        assert rows[0]["user_id"] == str(auth_user.id)
+        assert float(rows[0]["result"]) == 3.0
+
     def test_update_calculation(self, client):
         """Test updating a calculation."""
         calc_data = {
@@ -455,6 +843,41 @@ class TestCalculationAPI:
         assert data["a"] == 20.0
         assert data["result"] == 25.0 # 20 + 5
 
+    def test_update_calculation_invalidates_cached_calculation(self, client):
+        """Test that a cached calculation is refreshed after an update."""
+        calc_id = client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"}).json()["id"]
+        assert client.get(f"/calculations/{calc_id}").json()["result"] == 3.0
+        client.put(f"/calculations/{calc_id}", json={"type": "Multiply"})
+        assert client.get(f"/calculations/{calc_id}").json()["result"] == 2.0
+
+    def test_update_calculation_type_recomputes_result(self, client):
+        """Test that changing only the type recomputes the stored result."""
+        calc_id = client.post("/calculations", json={"a": 12.0, "b": 4.0, "type": "Add"}).json()["id"]
+        response = client.put(f"/calculations/{calc_id}", json={"type": "Divide"})
+        assert response.status_code == 200
+        assert response.json()["type"] == "Divide"
+        assert response.json()["result"] == 3.0
+
+    def test_update_calculation_zero_divisor_rejected(self, client):
+        """Test that setting b to zero on a division is rejected and leaves the row unchanged."""
+        calc_id = client.post("/calculations", json={"a": 12.0, "b": 4.0, "type": "Divide"}).json()["id"]
+        response = client.put(f"/calculations/{calc_id}", json={"b": 0.0})
+        assert response.status_code == 400
+        assert client.get(f"/calculations/{calc_id}").json()["b"] == 4.0
+
+    def test_update_calculation_overflow_rejected(self, client):
+        """Test that an update overflowing the result gets the same 400 as a create."""
+        calc_id = client.post("/calculations", json={"a": 1e308, "b": 2.0, "type": "Divide"}).json()["id"]
+        response = client.put(f"/calculations/{calc_id}", json={"b": 0.1})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Result is not a finite number"
+        assert client.get(f"/calculations/{calc_id}").json()["result"] == 5e307
+
+    def test_update_nonexistent_calculation(self, client):
+        """Test updating a calculation that does not exist."""
+        response = client.put("/calculations/00000000-0000-0000-0000-000000000000", json={"a": 1.0})
+        assert response.status_code == 404
+
     def test_delete_calculation(self, client):
         """Test deleting a calculation."""
         calc_data = {
@@ -470,3 +893,386 @@ class TestCalculationAPI:
 
         response = client.get(f"/calculations/{calc_id}")
         assert response.status_code == 404
+
+
+class TestAuthentication:
+    """Test bearer token validation and per-user scoping of calculations."""
+
+    def test_missing_token_is_rejected(self, client):
+        """Test that calculation endpoints require a bearer token."""
+        response = client.get("/calculations")
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    def test_invalid_token_is_rejected(self, client):
+        """Test that a malformed token is rejected."""
+        response = client.get("/calculations", headers={"Authorization": "Bearer not-a-token"})
+        assert response.status_code == 401
+
+    def test_expired_token_is_rejected(self, client, db_session):
+        """Test that an expired token is rejected."""
+        _, headers = create_user_with_token(db_session, "expired", expires_delta=timedelta(minutes=-1))
+        response = client.get("/calculations", headers=headers)
+        assert response.status_code == 401
+
+    def test_login_token_grants_access(self, client):
+        """Test that the token returned by login authenticates requests."""
+        client.post("/users/register", json={
+            "username": "tokenuser", "email": "token@example.com", "password": "securepassword123"
+        })
+        login = client.post("/users/login", json={"username": "tokenuser", "password": "securepassword123"}).json()
+        headers = {"Authorization": f"Bearer {login['access_token']}"}
+        response = client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"}, headers=headers)
+        assert response.status_code == 201
+        assert response.json()["user_id"] == login["user_id"]
+
+    def test_claims_are_cached_per_token(self, client, auth_user):
+        """Test that repeat requests with a token are served from the claims cache."""
+        client.get("/calculations")
+        hits = get_claims_cache().stats()["hits"]
+        client.get("/calculations")
+        assert get_claims_cache().stats()["hits"] == hits + 1
+
+    def test_deleted_user_token_is_rejected(self, client, auth_user):
+        """Test that a cached token stops working once its user is deleted."""
+        assert client.get("/calculations").status_code == 200
+        client.delete(f"/users/{auth_user.id}")
+        assert client.get("/calculations").status_code == 401
+
+    def test_other_users_calculations_are_hidden(self, client, db_session, auth_user):
+        """Test that another user's calculation cannot be read, listed, updated or deleted."""
+        _, other_headers = create_user_with_token(db_session, "intruder")
+        calc_id = client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"}).json()["id"]
+        # Warm the response cache as the owner first
+        assert client.get(f"/calculations/{calc_id}").status_code == 200
+
+        assert client.get(f"/calculations/{calc_id}", headers=other_headers).status_code == 404
+        assert client.get("/calculations", headers=other_headers).json() == []
+        response = client.put(f"/calculations/{calc_id}", json={"a": 5.0}, headers=other_headers)
+        assert response.status_code == 404
+        assert client.delete(f"/calculations/{calc_id}", headers=other_headers).status_code == 404
+        assert client.get(f"/calculations/{calc_id}").json()["a"] == 1.0
+
+    def test_cannot_create_calculation_for_another_user(self, client, db_session, auth_user):
+        """Test that naming a different owner is forbidden."""
+        other, _ = create_user_with_token(db_session, "someoneelse")
+        response = client.post("/calculations", json={
+            "a": 1.0, "b": 2.0, "type": "Add", "user_id": str(other.id)
+        })
+        assert response.status_code == 403
+
+
+@pytest.mark.usefixtures("auth_user")
+class TestExpressionAPI:
+    """Test evaluating and storing arithmetic expressions."""
+
+    def test_scalar_expression_is_stored(self, client):
+        """Test that a compound formula is evaluated in one request and can be read back."""
+        response = client.post("/expressions", json={
+            "expression": "(a + b) * c / 2", "variables": {"a": 1, "b": 3, "c": 5}
+        })
+        assert response.status_code == 201
+        data = response.json()
+        assert data["result"] == 10.0
+        assert data["errors"] is None
+        assert client.get(f"/expressions/{data['id']}").json() == data
+
+    def test_array_expression_reports_element_errors(self, client):
+        """Test element-wise evaluation with a failing element."""
+        response = client.post("/expressions", json={
+            "expression": "total / count", "variables": {"total": [10, 20], "count": [2, 0]}
+        })
+        assert response.status_code == 201
+        data = response.json()
+        assert data["result"] == [5.0, None]
+        assert data["errors"] == [None, "Division by zero is not allowed"]
+
+    def test_invalid_expression_is_rejected(self, client):
+        """Test that unsupported syntax, scalar division by zero and oversized literals return 400."""
+        assert client.post("/expressions", json={"expression": "__import__('os')"}).status_code == 400
+        response = client.post("/expressions", json={"expression": "a / b", "variables": {"a": 1, "b": 0}})
+        assert response.status_code == 400
+        response = client.post("/expressions", json={"expression": "1" + "0" * 400 + " * x", "variables": {"x": 1}})
+        assert response.status_code == 400
+
+    def test_non_finite_variables_are_rejected(self, client):
+        """Test that NaN and infinite variable values fail validation instead of being stored."""
+        response = client.post(
+            "/expressions", content='{"expression": "x", "variables": {"x": NaN}}',
+            headers={"Content-Type": "application/json"}
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["msg"] == "Value error, Variable x must be finite"
+        response = client.post(
+            "/expressions", content='{"expression": "x", "variables": {"x": [Infinity, 1]}}',
+            headers={"Content-Type": "application/json"}
+        )
+        assert response.status_code == 422
+
+    def test_expression_of_another_user_is_hidden(self, client, db_session):
+        """Test that expressions are only visible to their owner."""
+        _, other_headers = create_user_with_token(db_session, "snoop")
+        expression_id = client.post("/expressions", json={"expression": "1 + 2"}).json()["id"]
+        assert client.get(f"/expressions/{expression_id}", headers=other_headers).status_code == 404
+
+
+class TestIdempotencyKeys:
+    """Test replaying retried creates by Idempotency-Key."""
+
+    def test_retried_calculation_is_created_once(self, client, auth_user):
+        """Test that a retried create returns the first calculation instead of a new one."""
+        payload = {"a": 2.0, "b": 3.0, "type": "Add"}
+        headers = {"Idempotency-Key": "calc-1"}
+        first = client.post("/calculations", json=payload, headers=headers)
+        second = client.post("/calculations", json=payload, headers=headers)
+        assert first.status_code == second.status_code == 201
+        assert second.json() == first.json()
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert len(client.get("/calculations").json()) == 1
+
+    def test_retried_registration_is_not_hashed_again(self, client):
+        """Test that a retried registration replays its 201 without another bcrypt hash."""
+        payload = {"username": "retry", "email": "retry@example.com", "password": "securepassword123"}
+        headers = {"Idempotency-Key": "register-1"}
+        first = client.post("/users/register", json=payload, headers=headers)
+        hashes = hashing_pool.stats()["timings"]["hash"]["count"]
+        second = client.post("/users/register", json=payload, headers=headers)
+        assert second.status_code == 201
+        assert second.json() == first.json()
+        assert hashing_pool.stats()["timings"]["hash"]["count"] == hashes
+
+    def test_key_reused_for_different_calculation_is_rejected(self, client, auth_user):
+        """Test that one key cannot create two different calculations."""
+        headers = {"Idempotency-Key": "calc-2"}
+        client.post("/calculations", json={"a": 1.0, "b": 1.0, "type": "Add"}, headers=headers)
+        response = client.post("/calculations", json={"a": 9.0, "b": 1.0, "type": "Add"}, headers=headers)
+        assert response.status_code == 422
+        assert len(client.get("/calculations").json()) == 1
+
+
+@pytest.mark.usefixtures("auth_user")
+class TestCalculationWriteBehind:
+    """Test creating calculations through the group-commit writer."""
+
+    def test_create_is_committed_by_the_writer(self, client):
+        """Test that a queued calculation is stored and returned once its flush commits."""
+        engine = create_async_engine(get_async_database_url(DATABASE_URL), poolclass=NullPool)
+        enable_sqlite_foreign_keys(engine)
+        writer = CalculationWriter(get_async_session_local(engine), max_delay=0.001, max_batch=100, max_pending=100)
+        app.dependency_overrides[get_calculation_writer] = lambda: writer
+        try:
+            response = client.post("/calculations", json={"a": 6.0, "b": 7.0, "type": "Multiply"})
+            assert response.status_code == 201
+            assert response.json()["result"] == 42.0
+            assert client.get(f"/calculations/{response.json()['id']}").status_code == 200
+            assert client.get("/health/write-behind").json()["rows"] == 1
+        finally:
+            client.portal.call(writer.close)
+
+
+class TestUserCalculationHistory:
+    """Test the per-user calculation history endpoint."""
+
+    def test_history_is_newest_first_across_pages(self, client, auth_user):
+        """Test walking the history with the cursor header, newest first."""
+        created = [
+            client.post("/calculations", json={"a": float(i), "b": 1.0, "type": "Add"}).json()
+            for i in range(3)
+        ]
+        created += client.post("/calculations/batch", json={"items": [
+            {"a": float(i), "b": 1.0, "type": "Multiply"} for i in range(3, 6)
+        ]}).json()["results"]
+        created = [item.get("calculation", item) for item in created]
+
+        seen = []
+        cursor = None
+        for _ in range(3):
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(f"/users/{auth_user.id}/calculations", params=params)
+            assert response.status_code == 200
+            seen.extend(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+        assert cursor is None
+        assert sorted(calc["id"] for calc in seen) == sorted(calc["id"] for calc in created)
+        keys = [(datetime.fromisoformat(calc["created_at"]), calc["id"]) for calc in seen]
+        assert keys == sorted(keys, key=lambda key: (-key[0].timestamp(), key[1]))
+
+    def test_history_excludes_other_users(self, client, db_session, auth_user):
+        """Test that only the requested user's calculations are returned."""
+        _, other_headers = create_user_with_token(db_session, "neighbour")
+        client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"}, headers=other_headers)
+        own = client.post("/calculations", json={"a": 3.0, "b": 4.0, "type": "Add"}).json()
+
+        response = client.get(f"/users/{auth_user.id}/calculations")
+        assert [calc["id"] for calc in response.json()] == [own["id"]]
+
+    def test_history_of_another_user_is_forbidden(self, client, db_session, auth_user):
+        """Test that a user cannot read someone else's history."""
+        other, _ = create_user_with_token(db_session, "private")
+        response = client.get(f"/users/{other.id}/calculations")
+        assert response.status_code == 403
+
+    def test_history_requires_token(self, client, auth_user):
+        """Test that the history endpoint requires a bearer token."""
+        response = client.get(f"/users/{auth_user.id}/calculations", headers={"Authorization": ""})
+        assert response.status_code == 401
+
+    def test_history_invalid_cursor(self, client, auth_user):
+        """Test that a malformed cursor is rejected."""
+        response = client.get(f"/users/{auth_user.id}/calculations", params={"cursor": "bogus"})
+        assert response.status_code == 400
+
+
+@pytest.mark.usefixtures("auth_user")
+class TestCalculationStatistics:
+    """Test the incrementally maintained per-type statistics."""
+
+    def stats_by_type(self, client):
+        response = client.get("/calculations/statistics")
+        assert response.status_code == 200
+        return {row["type"]: row for row in response.json()}
+
+    def test_statistics_follow_creates(self, client):
+        """Test that single and batch creates are aggregated per type."""
+        client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"})
+        client.post("/calculations", json={"a": 2.0, "b": 3.0, "type": "Add"})
+        client.post("/calculations/batch", json={"items": [
+            {"a": 2.0, "b": 5.0, "type": "Add"},
+            {"a": 8.0, "b": 2.0, "type": "Divide"},
+            {"a": 1.0, "b": 0.0, "type": "Divide"},
+        ]})
+
+        stats = self.stats_by_type(client)
+        assert set(stats) == {"Add", "Divide"}
+        add = stats["Add"]
+        assert add["count"] == 3
+        assert add["total"] == pytest.approx(15.0)
+        assert add["mean"] == pytest.approx(5.0)
+        assert add["minimum"] == 3.0
+        assert add["maximum"] == 7.0
+        assert add["stddev"] == pytest.approx((8 / 3) ** 0.5)
+        assert stats["Divide"]["count"] == 1
+
+    def test_statistics_type_filter(self, client):
+        """Test filtering statistics by operation type."""
+        client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"})
+        client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Multiply"})
+        response = client.get("/calculations/statistics", params={"type": "Multiply"})
+        assert [row["type"] for row in response.json()] == ["Multiply"]
+
+    def test_statistics_follow_updates(self, client):
+        """Test that changing a calculation's type moves it between groups."""
+        low = client.post("/calculations", json={"a": 1.0, "b": 0.0, "type": "Add"}).json()["id"]
+        client.post("/calculations", json={"a": 5.0, "b": 0.0, "type": "Add"})
+        client.put(f"/calculations/{low}", json={"type": "Multiply"})
+
+        stats = self.stats_by_type(client)
+        assert stats["Add"]["count"] == 1
+        assert stats["Add"]["minimum"] == 5.0
+        assert stats["Multiply"]["count"] == 1
+        assert stats["Multiply"]["total"] == 0.0
+
+    def test_statistics_follow_deletes(self, client):
+        """Test that deleting extremes recomputes bounds and the last delete removes the row."""
+        ids = [
+            client.post("/calculations", json={"a": value, "b": 0.0, "type": "Add"}).json()["id"]
+            for value in (1.0, 2.0, 9.0)
+        ]
+        client.delete(f"/calculations/{ids[2]}")
+        stats = self.stats_by_type(client)
+        assert stats["Add"]["count"] == 2
+        assert stats["Add"]["maximum"] == 2.0
+
+        client.delete(f"/calculations/{ids[0]}")
+        client.delete(f"/calculations/{ids[1]}")
+        assert self.stats_by_type(client) == {}
+
+    def test_overflowing_results_never_reach_statistics(self, client):
+        """Test that rejected creates and updates leave the rollup usable for later writes."""
+        calc_id = client.post("/calculations", json={"a": 1e308, "b": 1.0, "type": "Multiply"}).json()["id"]
+        assert client.post("/calculations", json={"a": 1e308, "b": 10.0, "type": "Multiply"}).status_code == 400
+        assert client.put(f"/calculations/{calc_id}", json={"b": 10.0}).status_code == 400
+        assert client.post("/calculations", json={"a": -1e308, "b": 1.0, "type": "Multiply"}).status_code == 201
+
+        stats = self.stats_by_type(client)
+        assert stats["Multiply"]["count"] == 2
+        assert stats["Multiply"]["total"] == 0.0
+        assert client.delete(f"/calculations/{calc_id}").status_code == 204
+        assert self.stats_by_type(client)["Multiply"]["count"] == 1
+
+    def test_sums_leaving_float_range_are_recomputed(self, client):
+        """Test that updating and deleting a result whose square overflows keeps exact statistics."""
+        huge = client.post("/calculations", json={"a": 1e200, "b": 0.0, "type": "Add"}).json()["id"]
+        other = client.post("/calculations", json={"a": 1.0, "b": 1.0, "type": "Add"}).json()["id"]
+        assert client.put(f"/calculations/{huge}", json={"a": 3.0}).status_code == 200
+
+        add = self.stats_by_type(client)["Add"]
+        assert (add["count"], add["total"], add["maximum"]) == (2, 5.0, 3.0)
+        assert add["stddev"] == pytest.approx(0.5)
+        assert client.delete(f"/calculations/{huge}").status_code == 204
+        assert client.delete(f"/calculations/{other}").status_code == 204
+        assert self.stats_by_type(client) == {}
+
+    def test_sums_beyond_float_range_saturate(self, client):
+        """Test that finite results whose sum overflows are accepted and later corrected."""
+        first = client.post("/calculations", json={"a": 1e308, "b": 0.0, "type": "Add"}).json()["id"]
+        assert client.post("/calculations", json={"a": 1e308, "b": 0.0, "type": "Add"}).status_code == 201
+        assert client.post("/calculations/batch", json={"items": [
+            {"a": -1e308, "b": 0.0, "type": "Subtract"},
+            {"a": -1e308, "b": 0.0, "type": "Subtract"},
+        ]}).status_code == 201
+        stats = self.stats_by_type(client)
+        assert stats["Add"]["count"] == 2
+        assert stats["Subtract"]["count"] == 2
+
+        assert client.delete(f"/calculations/{first}").status_code == 204
+        add = self.stats_by_type(client)["Add"]
+        assert (add["count"], add["total"], add["maximum"]) == (1, 1e308, 1e308)
+
+    def test_recompute_with_huge_squares_remaining(self, client, setup_database):
+        """Test that recomputing a row over results whose squares overflow does not fail."""
+        from app.statistics import rebuild_statistics
+        huge = client.post("/calculations", json={"a": 1e200, "b": 0.0, "type": "Add"}).json()["id"]
+        client.post("/calculations", json={"a": 2e200, "b": 0.0, "type": "Add"})
+        client.post("/calculations", json={"a": 1.0, "b": 0.0, "type": "Add"})
+        with setup_database.begin() as connection:
+            assert rebuild_statistics(connection) == 1
+        assert self.stats_by_type(client)["Add"]["total"] == pytest.approx(3e200)
+
+        assert client.put(f"/calculations/{huge}", json={"a": 5.0}).status_code == 200
+        assert client.delete(f"/calculations/{huge}").status_code == 204
+        add = self.stats_by_type(client)["Add"]
+        assert (add["count"], add["maximum"]) == (2, 2e200)
+        assert add["total"] == pytest.approx(2e200)
+
+    def test_legacy_infinite_result_can_be_deleted(self, client, db_session, auth_user, setup_database):
+        """Test that a row stored with an infinite result by an older release no longer breaks deletes."""
+        from app.statistics import rebuild_statistics
+        legacy = Calculation(a=1e308, b=10.0, type="Multiply", result=float("inf"), user_id=auth_user.id)
+        db_session.add_all([legacy, Calculation(a=2.0, b=3.0, type="Multiply", result=6.0, user_id=auth_user.id)])
+        db_session.commit()
+        with setup_database.begin() as connection:
+            rebuild_statistics(connection)
+
+        assert client.delete(f"/calculations/{legacy.id}").status_code == 204
+        multiply = self.stats_by_type(client)["Multiply"]
+        assert (multiply["count"], multiply["total"], multiply["minimum"]) == (1, 6.0, 6.0)
+
+    def test_rebuild_matches_incremental(self, client, setup_database):
+        """Test that a full rebuild reproduces the incrementally maintained rows."""
+        from app.statistics import rebuild_statistics
+        client.post("/calculations", json={"a": 1.0, "b": 2.0, "type": "Add"})
+        client.post("/calculations", json={"a": 6.0, "b": 3.0, "type": "Divide"})
+        calc_id = client.post("/calculations", json={"a": 4.0, "b": 4.0, "type": "Add"}).json()["id"]
+        client.put(f"/calculations/{calc_id}", json={"a": 10.0})
+        incremental = self.stats_by_type(client)
+
+        with setup_database.begin() as connection:
+            assert rebuild_statistics(connection) == 2
+        rebuilt = self.stats_by_type(client)
+        assert rebuilt.keys() == incremental.keys()
+        for operation_type, row in rebuilt.items():
+            for field, value in row.items():
+                assert incremental[operation_type][field] == pytest.approx(value)
@@ -0,0 +1,86 @@
+"""
+Unit tests for the Prometheus metrics registry.
+"""
+import pytest
+
+from app.metrics import (
+    POOL_CHECKOUTS, POOL_TIMEOUTS, POOL_WAIT_SECONDS, Counter, Gauge, Histogram, MetricsRegistry, record_pool
+)
+
+
+class TestHistogram:
+    """Test suite for histogram buckets and rendering."""
+
+    def test_observations_fall_into_cumulative_buckets(self):
+        """Test that bucket counts are cumulative and include +Inf."""
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, "/a")
+        lines = histogram.samples()
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1"} 3' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+        assert 'latency_seconds_sum{route="/a"} 2.65' in lines
+        assert 'latency_seconds_count{route="/a"} 4' in lines
+        assert histogram.count("/a") == 4
+
+    def test_wrong_label_count_raises(self):
+        """Test that observations must supply every label."""
+        histogram = Histogram("latency_seconds", "Latency.", ("route",))
+        with pytest.raises(ValueError):
+            histogram.observe(0.1)
+
+
+class TestCounterAndGauge:
+    """Test suite for counters and gauges."""
+
+    def test_counter_increments_per_label_set(self):
+        """Test that counters are tracked per label set."""
+        counter = Counter("errors_total", "Errors.", ("statement",))
+        counter.inc("SELECT")
+        counter.inc("SELECT", amount=2)
+        counter.inc("INSERT")
+        assert counter.value("SELECT") == 3
+        assert counter.value("INSERT") == 1
+        assert counter.value("DELETE") == 0
+
+    def test_gauge_moves_both_ways(self):
+        """Test gauge inc, dec and set."""
+        gauge = Gauge("in_flight", "In flight.")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        assert gauge.value() == 1
+        gauge.set(7)
+        assert gauge.value() == 7
+
+    def test_label_values_are_escaped(self):
+        """Test that quotes and backslashes in label values are escaped."""
+        counter = Counter("hits_total", "Hits.", ("path",))
+        counter.inc('a"b\\c')
+        assert counter.samples() == ['hits_total{path="a\\"b\\\\c"} 1']
+
+
+class TestMetricsRegistry:
+    """Test suite for registry rendering."""
+
+    def test_render_runs_collectors_and_includes_metadata(self):
+        """Test that collectors refresh gauges before rendering."""
+        registry = MetricsRegistry()
+        gauge = registry.register(Gauge("pool_idle", "Idle connections."))
+        registry.add_collector(lambda: gauge.set(3))
+        text = registry.render()
+        assert "# HELP pool_idle Idle connections." in text
+        assert "# TYPE pool_idle gauge" in text
+        assert "pool_idle 3" in text
+        assert text.endswith("\n")
+
+    def test_pool_totals_are_counters(self):
+        """Test that cumulative pool figures are exposed as *_total counters."""
+        record_pool({"checked_out": 1, "idle": 2, "overflow": 0,
+                     "checkouts": 5, "timeouts": 1, "wait_seconds_total": 0.25})
+        for metric in (POOL_CHECKOUTS, POOL_TIMEOUTS, POOL_WAIT_SECONDS):
+            assert metric.type_name == "counter"
+            assert metric.name.endswith("_total")
+        assert POOL_CHECKOUTS.samples() == ["db_pool_checkouts_total 5"]
+        assert POOL_WAIT_SECONDS.samples() == ["db_pool_wait_seconds_total 0.25"]
@@ -0,0 +1,65 @@
+"""
+Unit tests for keyset pagination predicates and the indexes serving them.
+"""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.database import Base
+from app.main import CALCULATION_ORDER, USER_HISTORY_ORDER
+from app.models import Calculation
+from app.pagination import KeysetOrder
+
+POSITION = [datetime(2024, 1, 1), uuid.uuid4()]
+
+
+def compiled(clause) -> str:
+    return str(clause.compile(dialect=postgresql.dialect()))
+
+
+def query_plan(stmt) -> str:
+    """Return SQLite's plan for ``stmt`` against the application schema."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.connect() as connection:
+        sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+        return " ".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+class TestKeysetPredicates:
+    """Test suite for the WHERE clauses continuing after a cursor."""
+
+    def test_single_direction_uses_row_value_comparison(self):
+        """Test that history pages compare (created_at, id) as one row value."""
+        sql = compiled(USER_HISTORY_ORDER.after(POSITION))
+        assert sql.startswith("(calculations.created_at, calculations.id) <")
+        assert " OR " not in sql
+
+    def test_mixed_directions_bound_the_leading_column(self):
+        """Test that the OR form carries an inclusive bound usable as an index range."""
+        order = KeysetOrder([(Calculation.created_at, True), (Calculation.id, False)])
+        sql = compiled(order.after(POSITION))
+        assert sql.startswith("calculations.created_at <= ")
+        assert " OR " in sql
+
+
+class TestListQueryPlans:
+    """Test that every per-user listing is answered from ix_calculations_user_history."""
+
+    def test_history_page_scans_index_without_sorting(self):
+        """Test that a deep history page is one index range scan with no sort step."""
+        stmt = select(Calculation.id).where(Calculation.user_id == POSITION[1])
+        plan = query_plan(USER_HISTORY_ORDER.apply(stmt, USER_HISTORY_ORDER.encode(
+            Calculation(created_at=POSITION[0], id=POSITION[1])
+        ), 10))
+        assert "ix_calculations_user_history" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_oldest_first_listing_uses_same_index(self):
+        """Test that GET /calculations and exports read the same index forwards."""
+        stmt = select(Calculation.id).where(Calculation.user_id == POSITION[1])
+        plan = query_plan(CALCULATION_ORDER.apply(stmt, None, 10))
+        assert "ix_calculations_user_history" in plan
+        assert "TEMP B-TREE" not in plan
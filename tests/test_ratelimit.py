@@ -0,0 +1,84 @@
+"""
+Unit tests for the login/registration rate limiter.
+"""
+import pytest
+
+from app.ratelimit import MemoryRateLimitBackend, RateLimiter, RateLimitExceededError
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemoryRateLimitBackend:
+    """Test suite for in-process token buckets."""
+
+    async def test_allows_burst_then_reports_wait(self):
+        """Test that a full bucket allows its capacity and then asks the caller to wait."""
+        backend = MemoryRateLimitBackend(max_keys=100, clock=FakeClock())
+        for _ in range(3):
+            assert await backend.take("k", capacity=3, refill_per_second=0.5) == 0
+        assert await backend.take("k", capacity=3, refill_per_second=0.5) == pytest.approx(2.0)
+
+    async def test_tokens_refill_over_time(self):
+        """Test that tokens are replenished at the refill rate."""
+        clock = FakeClock()
+        backend = MemoryRateLimitBackend(max_keys=100, clock=clock)
+        assert await backend.take("k", capacity=1, refill_per_second=1) == 0
+        assert await backend.take("k", capacity=1, refill_per_second=1) > 0
+        clock.now = 1.0
+        assert await backend.take("k", capacity=1, refill_per_second=1) == 0
+
+    async def test_buckets_are_independent(self):
+        """Test that keys do not share tokens."""
+        backend = MemoryRateLimitBackend(max_keys=100, clock=FakeClock())
+        assert await backend.take("a", capacity=1, refill_per_second=1) == 0
+        assert await backend.take("b", capacity=1, refill_per_second=1) == 0
+
+    async def test_least_recently_used_bucket_is_dropped(self):
+        """Test that the number of tracked keys is bounded."""
+        backend = MemoryRateLimitBackend(max_keys=2, clock=FakeClock())
+        await backend.take("a", capacity=1, refill_per_second=1)
+        await backend.take("b", capacity=1, refill_per_second=1)
+        await backend.take("c", capacity=1, refill_per_second=1)
+        # "a" was evicted, so it starts again with a full bucket
+        assert await backend.take("a", capacity=1, refill_per_second=1) == 0
+
+
+class TestRateLimiter:
+    """Test suite for the combined IP and username limits."""
+
+    def make_limiter(self):
+        backend = MemoryRateLimitBackend(max_keys=100, clock=FakeClock())
+        return RateLimiter(backend, ip_capacity=3, ip_refill_per_second=1,
+                           username_capacity=1, username_refill_per_second=0.1)
+
+    async def test_username_limit(self):
+        """Test that repeated attempts for one username are rejected."""
+        limiter = self.make_limiter()
+        await limiter.check("login", "10.0.0.1", "alice")
+        with pytest.raises(RateLimitExceededError) as exc_info:
+            await limiter.check("login", "10.0.0.2", "Alice")
+        assert exc_info.value.scope == "username"
+        assert exc_info.value.retry_after == pytest.approx(10.0)
+
+    async def test_ip_limit(self):
+        """Test that one IP cycling through usernames is rejected."""
+        limiter = self.make_limiter()
+        for name in ("a", "b", "c"):
+            await limiter.check("login", "10.0.0.1", name)
+        with pytest.raises(RateLimitExceededError) as exc_info:
+            await limiter.check("login", "10.0.0.1", "d")
+        assert exc_info.value.scope == "ip"
+
+    async def test_routes_have_separate_buckets(self):
+        """Test that login and registration limits are tracked separately."""
+        limiter = self.make_limiter()
+        await limiter.check("login", "10.0.0.1", "alice")
+        await limiter.check("register", "10.0.0.1", "alice")
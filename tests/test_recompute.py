@@ -0,0 +1,219 @@
+"""
+Unit tests for the chunked bulk recompute job.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, event, func, insert, select
+
+from app.cli import main as cli_main
+from app.database import Base
+from app.factory import AddOperation, CalculationFactory, DivideOperation
+from app.models import Calculation, CalculationStats, RecomputeCheckpoint, User
+from app.recompute import recompute_results
+from app.statistics import rebuild_statistics
+
+OWNER_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Sync engine for a fresh SQLite database with 50 calculations, some stale, and their rollup."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'recompute.db'}")
+    Base.metadata.create_all(engine)
+    rows = []
+    for i in range(50):
+        a, b = float(i), float(i % 5)
+        operation_type = ["Add", "Multiply", "Divide"][i % 3]
+        if operation_type == "Divide" and b == 0:
+            result = 0.0
+        else:
+            result = CalculationFactory.calculate(operation_type, a, b)
+        # Every fourth row carries a wrong result
+        if i % 4 == 0:
+            result += 1000
+        rows.append({"a": a, "b": b, "type": operation_type, "result": result, "user_id": OWNER_ID})
+    with engine.begin() as connection:
+        connection.execute(insert(User).values(id=OWNER_ID, username="owner", email="o@example.com",
+                                               password_hash="x"))
+        connection.execute(insert(Calculation), rows)
+        rebuild_statistics(connection)
+    yield engine
+    engine.dispose()
+
+
+def stale_rows(engine) -> int:
+    """Count rows whose result differs from a fresh calculation (ignoring invalid operands)."""
+    count = 0
+    with engine.connect() as connection:
+        for calc in connection.execute(select(Calculation)):
+            try:
+                expected = CalculationFactory.calculate(calc.type, calc.a, calc.b)
+            except ValueError:
+                continue
+            count += calc.result != pytest.approx(expected)
+    return count
+
+
+def statistics(engine) -> dict:
+    """Return the rollup as ``{type: (count, total, minimum, maximum, sum_squares)}``."""
+    with engine.connect() as connection:
+        return {
+            row.type: (row.count, row.total, row.minimum, row.maximum, row.sum_squares)
+            for row in connection.execute(select(CalculationStats))
+        }
+
+
+def interrupt_after(chunks: int):
+    """Progress callback that aborts the job once ``chunks`` chunks are committed."""
+    def progress(totals):
+        if totals["chunks"] == chunks:
+            raise KeyboardInterrupt
+    return progress
+
+
+class TestRecomputeResults:
+    """Test suite for recomputing stored results."""
+
+    def test_fixes_stale_results_in_chunks(self, engine):
+        """Test that every stale result is rewritten and correct rows are untouched."""
+        before = stale_rows(engine)
+        assert before > 0
+        chunks = []
+        totals = recompute_results(engine, chunk_size=8, progress=chunks.append)
+
+        assert stale_rows(engine) == 0
+        assert totals["rows_updated"] == before
+        assert totals["chunks"] == len(chunks) == 7
+        with engine.connect() as connection:
+            assert connection.execute(select(RecomputeCheckpoint)).first() is None
+
+    def test_invalid_operands_are_left_alone(self, engine):
+        """Test that rows with a zero divisor keep their stored result."""
+        recompute_results(engine, chunk_size=10)
+        with engine.connect() as connection:
+            results = connection.execute(
+                select(Calculation.result).where(Calculation.type == "Divide", Calculation.b == 0)
+            ).scalars().all()
+        assert results and all(result in (0.0, 1000.0) for result in results)
+
+    def test_only_selected_types_are_recomputed(self, engine):
+        """Test that restricting the job to one type leaves other types stale."""
+        recompute_results(engine, operation_types=["Add"], chunk_size=10)
+        with engine.connect() as connection:
+            rows = connection.execute(select(Calculation)).all()
+        assert all(row.result == row.a + row.b for row in rows if row.type == "Add")
+        assert any(row.result != row.a * row.b for row in rows if row.type == "Multiply")
+
+    def test_statistics_follow_recomputed_results(self, engine):
+        """Test that per-chunk adjustments leave the rollup equal to a full rebuild."""
+        totals = recompute_results(engine, chunk_size=10)
+        adjusted = statistics(engine)
+        with engine.begin() as connection:
+            rebuild_statistics(connection)
+        expected = statistics(engine)
+
+        assert totals["statistics_rows"] > 0
+        assert adjusted.keys() == expected.keys()
+        for operation_type, row in expected.items():
+            assert adjusted[operation_type] == pytest.approx(row)
+
+    def test_statistics_of_other_types_are_untouched(self, engine):
+        """Test that restricting the job to one type only adjusts that type's rollup."""
+        before = statistics(engine)
+        recompute_results(engine, operation_types=["Add"], chunk_size=10)
+        after = statistics(engine)
+        assert after["Add"] != before["Add"]
+        assert after["Multiply"] == before["Multiply"]
+        assert after["Divide"] == before["Divide"]
+
+    def test_interrupted_run_keeps_statistics_consistent(self, engine):
+        """Test that committed chunks carry their rollup adjustments with them."""
+        with pytest.raises(KeyboardInterrupt):
+            recompute_results(engine, chunk_size=8, progress=interrupt_after(2))
+        adjusted = statistics(engine)
+        with engine.begin() as connection:
+            rebuild_statistics(connection)
+        for operation_type, row in statistics(engine).items():
+            assert adjusted[operation_type] == pytest.approx(row)
+
+    def test_resumes_after_interruption(self, engine):
+        """Test that a failed run continues from its last committed chunk."""
+        with pytest.raises(KeyboardInterrupt):
+            recompute_results(engine, chunk_size=8, progress=interrupt_after(2))
+        with engine.connect() as connection:
+            checkpoint = connection.execute(select(RecomputeCheckpoint)).one()
+        assert checkpoint.chunks == 2
+
+        totals = recompute_results(engine, chunk_size=8)
+        assert totals["resumed"]
+        assert totals["chunks"] == 7
+        assert stale_rows(engine) == 0
+
+    def test_restart_ignores_checkpoint(self, engine):
+        """Test that restart begins again from the first row."""
+        with pytest.raises(KeyboardInterrupt):
+            recompute_results(engine, chunk_size=8, progress=interrupt_after(1))
+        totals = recompute_results(engine, chunk_size=8, restart=True)
+        assert not totals["resumed"]
+        assert totals["chunks"] == 7
+
+    def test_uses_current_operation_implementation(self, engine):
+        """Test that a replaced operation's SQL expression drives the recompute."""
+        class DoubledAdd(AddOperation):
+            def calculate(self, a, b):
+                return (a + b) * 2
+
+        try:
+            CalculationFactory.register_operation("Add", DoubledAdd)
+            recompute_results(engine, operation_types=["Add"], chunk_size=100)
+        finally:
+            CalculationFactory.register_operation("Add", AddOperation)
+        with engine.connect() as connection:
+            rows = connection.execute(select(Calculation).where(Calculation.type == "Add")).all()
+        assert all(row.result == (row.a + row.b) * 2 for row in rows)
+
+    def test_invalid_operands_are_never_evaluated(self, engine):
+        """Test that the guard runs before the expression, as PostgreSQL needs (SQLite's x/0 is NULL)."""
+        def strict_divide(a, b):
+            if b == 0:
+                raise ZeroDivisionError("division by zero")
+            return a / b
+
+        class StrictDivide(DivideOperation):
+            def sql_expression(self, a, b):
+                return func.strict_divide(a, b)
+
+        def register(dbapi_connection, connection_record):
+            dbapi_connection.create_function("strict_divide", 2, strict_divide)
+
+        engine.dispose()
+        event.listen(engine, "connect", register)
+        try:
+            CalculationFactory.register_operation("Divide", StrictDivide)
+            totals = recompute_results(engine, operation_types=["Divide"], chunk_size=10)
+        finally:
+            CalculationFactory.register_operation("Divide", DivideOperation)
+        assert totals["rows_updated"] > 0
+        with engine.connect() as connection:
+            rows = connection.execute(select(Calculation).where(Calculation.type == "Divide")).all()
+        assert all(row.result == row.a / row.b for row in rows if row.b != 0)
+        assert all(row.result in (0.0, 1000.0) for row in rows if row.b == 0)
+
+    def test_unknown_type_is_rejected(self, engine):
+        """Test that unsupported operation types fail before any update."""
+        with pytest.raises(ValueError):
+            recompute_results(engine, operation_types=["Modulo"])
+
+
+class TestRecomputeCommand:
+    """Test the recompute CLI command."""
+
+    def test_command_reports_progress(self, engine, monkeypatch, capsys):
+        """Test that the command recomputes through the process engine and prints totals."""
+        monkeypatch.setattr("app.cli.get_engine", lambda: engine)
+        assert cli_main(["recompute", "--chunk-size", "30"]) == 0
+        output = capsys.readouterr().out
+        assert "chunk 1:" in output
+        assert "in 2 chunks" in output
+        assert stale_rows(engine) == 0
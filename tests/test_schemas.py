@@ -205,3 +205,17 @@ class TestCalculationUpdateSchema:
         with pytest.raises(ValidationError) as exc_info:
             CalculationUpdate(b=0.0, type=OperationType.DIVIDE)
         assert "Division by zero" in str(exc_info.value)
+
+
+from app.schemas import ExpressionCreate
+
+
+class TestExpressionCreateSchema:
+    """Test suite for ExpressionCreate schema."""
+
+    def test_non_finite_variables_rejected(self):
+        """Test that NaN and infinite scalars and array elements are rejected."""
+        for value in (float("nan"), float("inf"), [1.0, float("-inf")]):
+            with pytest.raises(ValidationError) as exc_info:
+                ExpressionCreate(expression="x", variables={"x": value})
+            assert "must be finite" in str(exc_info.value)
@@ -1,8 +1,25 @@
 """
 Unit tests for password hashing and security utilities.
 """
+import asyncio
+import bcrypt
 import pytest
-from app.security import hash_password, verify_password
+from datetime import timedelta
+from app import security
+from app.security import (
+    calibrate_bcrypt_rounds,
+    hash_rounds,
+    needs_rehash,
+    create_access_token,
+    decode_access_token,
+    InvalidTokenError,
+    hash_password,
+    verify_password,
+    hash_password_async,
+    verify_password_async,
+    HashingPool,
+    HashingPoolFullError,
+)
 
 
 class TestPasswordHashing:
@@ -101,3 +118,113 @@ class TestPasswordVerification:
         hashed = hash_password(password)
         assert verify_password(password, hashed) is True
         assert verify_password("WrongPassword", hashed) is False
+
+
+class TestAsyncPasswordHashing:
+    """Test suite for the executor-backed hashing API."""
+
+    async def test_hash_and_verify_async_round_trip(self):
+        """Test that async hashing produces hashes the async verifier accepts."""
+        hashed = await hash_password_async("testpassword123")
+        assert await verify_password_async("testpassword123", hashed) is True
+        assert await verify_password_async("wrongpassword", hashed) is False
+
+    async def test_hash_password_async_validates_input(self):
+        """Test that validation errors propagate from the worker thread."""
+        with pytest.raises(ValueError, match="Password must be a non-empty string"):
+            await hash_password_async("")
+
+    async def test_pool_records_timings(self):
+        """Test that every call is timed per operation name."""
+        pool = HashingPool(max_workers=1, max_pending=4)
+        seen = []
+        pool.observers.append(lambda name, seconds: seen.append(name))
+        try:
+            await pool.run("hash", hash_password, "testpassword123")
+        finally:
+            pool.shutdown()
+        stats = pool.stats()
+        assert stats["timings"]["hash"]["count"] == 1
+        assert stats["timings"]["hash"]["total_seconds"] > 0
+        assert stats["pending"] == 0
+        assert seen == ["hash"]
+
+    async def test_pool_rejects_calls_beyond_max_pending(self):
+        """Test that the queue-depth limit rejects excess calls immediately."""
+        pool = HashingPool(max_workers=1, max_pending=1)
+        try:
+            first = asyncio.ensure_future(pool.run("hash", hash_password, "testpassword123"))
+            await asyncio.sleep(0)
+            with pytest.raises(HashingPoolFullError):
+                await pool.run("hash", hash_password, "testpassword123")
+            assert isinstance(await first, str)
+        finally:
+            pool.shutdown()
+
+
+class TestAccessTokens:
+    """Test suite for JWT access token verification."""
+
+    def test_decode_round_trip(self):
+        """Test that a freshly issued token decodes to its claims."""
+        token = create_access_token({"sub": "alice", "uid": "42"}, timedelta(minutes=5))
+        claims = decode_access_token(token)
+        assert claims["sub"] == "alice"
+        assert claims["uid"] == "42"
+        assert "exp" in claims
+
+    def test_expired_token_raises(self):
+        """Test that an expired token is rejected."""
+        token = create_access_token({"sub": "alice"}, timedelta(minutes=-1))
+        with pytest.raises(InvalidTokenError):
+            decode_access_token(token)
+
+    def test_tampered_token_raises(self):
+        """Test that a token with a modified signature is rejected."""
+        token = create_access_token({"sub": "alice"}, timedelta(minutes=5))
+        with pytest.raises(InvalidTokenError):
+            decode_access_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+
+
+class TestBcryptCostCalibration:
+    """Test suite for the bcrypt cost factor calibration and rehash checks."""
+
+    def test_calibration_respects_floor_and_ceiling(self):
+        """Test that extreme targets are clamped to the configured bounds."""
+        assert calibrate_bcrypt_rounds(target_ms=0.001, min_rounds=10, max_rounds=14) == 10
+        assert calibrate_bcrypt_rounds(target_ms=10 ** 9, min_rounds=10, max_rounds=14) == 14
+
+    def test_hash_uses_configured_rounds(self, monkeypatch):
+        """Test that new hashes carry the process's cost factor."""
+        monkeypatch.setattr(security, "_bcrypt_rounds", 4)
+        hashed = hash_password("testpassword123")
+        assert hash_rounds(hashed) == 4
+        assert verify_password("testpassword123", hashed)
+
+    def test_hash_rounds_parses_cost(self):
+        """Test reading the cost factor from a stored hash."""
+        hashed = bcrypt.hashpw(b"testpassword123", bcrypt.gensalt(rounds=5)).decode()
+        assert hash_rounds(hashed) == 5
+        assert hash_rounds("not-a-bcrypt-hash") is None
+
+    def test_needs_rehash_when_cost_differs(self, monkeypatch):
+        """Test that only hashes with a lower cost need rehashing."""
+        monkeypatch.setattr(security, "_bcrypt_rounds", 5)
+        assert not needs_rehash(bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=5)).decode())
+        assert needs_rehash(bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=4)).decode())
+
+    def test_calibrated_cost_never_downgrades(self, monkeypatch):
+        """Test that workers calibrated one round apart do not keep rewriting each other's hashes."""
+        monkeypatch.setattr(security, "BCRYPT_ROUNDS", None)
+        stored = bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=5)).decode()
+        monkeypatch.setattr(security, "_bcrypt_rounds", 4)
+        assert not needs_rehash(stored)
+        monkeypatch.setattr(security, "_bcrypt_rounds", 5)
+        assert not needs_rehash(stored)
+
+    def test_pinned_cost_rehashes_both_ways(self, monkeypatch):
+        """Test that a cost pinned with BCRYPT_ROUNDS also lowers stored costs."""
+        monkeypatch.setattr(security, "BCRYPT_ROUNDS", "4")
+        monkeypatch.setattr(security, "_bcrypt_rounds", 4)
+        assert needs_rehash(bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=5)).decode())
+        assert not needs_rehash(bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=4)).decode())
@@ -0,0 +1,170 @@
+"""
+Unit tests for list endpoint totals.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base, get_async_session_local
+from app.models import User
+from app.totals import CountCache, estimated_table_count
+import app.totals as totals
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Counter:
+    """Async count function that records its calls and can be held open."""
+
+    def __init__(self, value: int = 10):
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        await self.release.wait()
+        return self.value
+
+
+class TestCountCache:
+    """Test suite for the cached exact counts."""
+
+    async def test_requests_never_recount(self):
+        """Test that only the first request counts, however old the value gets."""
+        clock = FakeClock()
+        cache = CountCache(refresh_seconds=60, clock=clock)
+        counter = Counter()
+        assert await cache.get("users", counter) == 10
+        clock.now = 600
+        counter.value = 11
+        assert await cache.get("users", counter) == 10
+        assert counter.calls == 1
+
+    async def test_refresh_only_recounts_due_keys(self):
+        """Test that a refresh replaces counts that reached the refresh interval."""
+        clock = FakeClock()
+        cache = CountCache(refresh_seconds=60, clock=clock)
+        counter = Counter()
+        await cache.get("users", counter)
+        clock.now = 30
+        await cache.get("calculations", counter)
+        counter.value = 11
+        clock.now = 60
+        assert cache.due() == ["users"]
+
+        await cache.refresh_due(lambda key: counter())
+        assert await cache.get("users", counter) == 11
+        assert await cache.get("calculations", counter) == 10
+        assert counter.calls == 3
+
+    async def test_concurrent_misses_count_once(self):
+        """Test that requests arriving before the first count share it."""
+        cache = CountCache(refresh_seconds=60)
+        counter = Counter()
+        counter.release.clear()
+        waiters = [asyncio.ensure_future(cache.get("users", counter)) for _ in range(5)]
+        await asyncio.sleep(0)
+        counter.release.set()
+        assert await asyncio.gather(*waiters) == [10] * 5
+        assert counter.calls == 1
+
+    async def test_previous_value_served_during_refresh(self):
+        """Test that requests do not wait while the background refresh recounts."""
+        clock = FakeClock()
+        cache = CountCache(refresh_seconds=60, clock=clock)
+        counter = Counter()
+        await cache.get("users", counter)
+        clock.now = 120
+        counter.value = 20
+        counter.release.clear()
+        refresh = asyncio.ensure_future(cache.refresh_due(lambda key: counter()))
+        await asyncio.sleep(0)
+        assert await cache.get("users", counter) == 10
+        counter.release.set()
+        await refresh
+        assert await cache.get("users", counter) == 20
+        assert counter.calls == 2
+
+    async def test_failed_refresh_keeps_previous_value(self):
+        """Test that a recount error leaves the cached count in place."""
+        clock = FakeClock()
+        cache = CountCache(refresh_seconds=60, clock=clock)
+        await cache.get("users", Counter())
+        clock.now = 60
+
+        async def broken(key):
+            raise ConnectionError("database unavailable")
+
+        await cache.refresh_due(broken)
+        assert cache.failed_refreshes == 1
+        assert await cache.get("users", Counter(20)) == 10
+
+    async def test_background_task_refreshes_until_closed(self):
+        """Test that the started task recounts on its own and stops on close."""
+        cache = CountCache(refresh_seconds=0.01)
+        counter = Counter()
+        await cache.get("users", counter)
+        counter.value = 20
+        cache.start(lambda key: counter())
+        assert cache.running
+        await asyncio.sleep(0.05)
+        assert await cache.get("users", counter) == 20
+
+        await cache.close()
+        assert not cache.running
+        calls = counter.calls
+        await asyncio.sleep(0.03)
+        assert counter.calls == calls
+
+
+@pytest.fixture
+async def session(tmp_path):
+    """Async session on a fresh SQLite database holding 30 users."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'totals.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(insert(User), [
+            {"id": uuid.uuid4(), "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"}
+            for i in range(30)
+        ])
+    async with get_async_session_local(engine)() as db:
+        yield db
+    await engine.dispose()
+
+
+class TestEstimatedCount:
+    """Test suite for planner-based estimates on SQLite."""
+
+    async def test_estimate_without_statistics_uses_max_rowid(self, session):
+        """Test that an unanalyzed table is estimated from its largest rowid."""
+        await session.execute(text("DELETE FROM users WHERE username = 'user0'"))
+        assert await estimated_table_count(session, User.__table__) == 30
+
+    async def test_estimate_reads_analyze_statistics(self, session):
+        """Test that sqlite_stat1 is used once ANALYZE has run."""
+        await session.execute(text("ANALYZE"))
+        await session.execute(text("DELETE FROM users WHERE username IN ('user0', 'user1')"))
+        assert await estimated_table_count(session, User.__table__) == 30
+
+    async def test_other_dialects_fall_back_to_cached_count(self, session, monkeypatch):
+        """Test that a database without usable statistics reports the exact count."""
+        async def no_estimate(db, table):
+            return None
+
+        monkeypatch.setattr(totals, "_planner_estimate", no_estimate)
+        monkeypatch.setattr(totals, "get_count_cache", lambda: CountCache(refresh_seconds=60))
+        await session.execute(text("DELETE FROM users WHERE username = 'user0'"))
+        assert await estimated_table_count(session, User.__table__) == 29
@@ -0,0 +1,170 @@
+"""
+Unit tests for the write-behind calculation writer.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base, enable_sqlite_foreign_keys, get_async_session_local
+from app.models import Calculation, CalculationStats, User
+from app.writebehind import (
+    CalculationWriter, WriteBehindFullError, close_calculation_writer, get_calculation_writer
+)
+import app.writebehind as writebehind
+
+OWNER_ID = uuid.uuid4()
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """Session factory for a fresh SQLite database holding one user."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'writebehind.db'}")
+    enable_sqlite_foreign_keys(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    factory = get_async_session_local(engine)
+    async with factory() as db:
+        db.add(User(id=OWNER_ID, username="owner", email="owner@example.com", password_hash="x"))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+
+def row(a: float, user_id=OWNER_ID) -> dict:
+    return {"a": a, "b": 1.0, "type": "Add", "result": a + 1.0, "user_id": user_id}
+
+
+async def count_rows(session_factory) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(Calculation))
+
+
+class TestCalculationWriter:
+    """Test suite for group commit of calculation inserts."""
+
+    async def test_concurrent_rows_share_one_flush(self, session_factory):
+        """Test that rows submitted together are stored by one INSERT and returned to their callers."""
+        writer = CalculationWriter(session_factory, max_delay=0.01, max_batch=100, max_pending=100)
+        stored = await asyncio.gather(*(writer.submit(row(float(i))) for i in range(20)))
+        await writer.close()
+
+        assert [calc.a for calc in stored] == [float(i) for i in range(20)]
+        assert len({calc.id for calc in stored}) == 20
+        assert writer.stats()["flushes"] == 1
+        assert writer.stats()["rows"] == 20
+        assert await count_rows(session_factory) == 20
+
+    async def test_flushes_are_capped_at_max_batch(self, session_factory):
+        """Test that a burst larger than max_batch is split across flushes."""
+        writer = CalculationWriter(session_factory, max_delay=0.01, max_batch=8, max_pending=100)
+        await asyncio.gather(*(writer.submit(row(float(i))) for i in range(20)))
+        await writer.close()
+
+        stats = writer.stats()
+        assert stats["rows"] == 20
+        assert stats["largest_batch"] == 8
+        assert stats["flushes"] == 3
+
+    async def test_full_queue_rejects_new_rows(self, session_factory):
+        """Test that submissions beyond max_pending fail fast instead of queueing."""
+        writer = CalculationWriter(session_factory, max_delay=0.01, max_batch=100, max_pending=2)
+        results = await asyncio.gather(
+            *(writer.submit(row(float(i))) for i in range(3)),
+            return_exceptions=True
+        )
+        await writer.close()
+
+        assert isinstance(results[2], WriteBehindFullError)
+        assert await count_rows(session_factory) == 2
+
+    async def test_close_flushes_queued_rows(self, session_factory):
+        """Test that shutdown stores rows still waiting for their flush."""
+        writer = CalculationWriter(session_factory, max_delay=60, max_batch=100, max_pending=100)
+        tasks = [asyncio.ensure_future(writer.submit(row(float(i)))) for i in range(5)]
+        await asyncio.sleep(0)
+        await writer.close()
+
+        assert all(task.done() for task in tasks)
+        assert await count_rows(session_factory) == 5
+
+    async def test_failing_row_only_fails_its_request(self, session_factory):
+        """Test that a row violating a constraint does not fail the rest of its batch."""
+        writer = CalculationWriter(session_factory, max_delay=0.01, max_batch=100, max_pending=100)
+        results = await asyncio.gather(
+            writer.submit(row(1.0)),
+            writer.submit(row(2.0, user_id=uuid.uuid4())),
+            writer.submit(row(3.0)),
+            return_exceptions=True
+        )
+        await writer.close()
+
+        assert results[0].a == 1.0 and results[2].a == 3.0
+        assert isinstance(results[1], IntegrityError)
+        assert await count_rows(session_factory) == 2
+
+    async def test_statistics_are_updated_in_the_same_commit(self, session_factory):
+        """Test that each flush applies its rows to the owner's statistics."""
+        writer = CalculationWriter(session_factory, max_delay=0.01, max_batch=100, max_pending=100)
+        await asyncio.gather(*(writer.submit(row(float(i))) for i in range(4)))
+        await writer.close()
+
+        async with session_factory() as db:
+            stats = await db.get(CalculationStats, (OWNER_ID, "Add"))
+        assert stats.count == 4
+        assert stats.total == pytest.approx(1.0 + 2.0 + 3.0 + 4.0)
+
+    async def test_statistics_rows_are_locked_in_key_order(self, session_factory):
+        """Test that a flush upserts rollup rows ordered by owner, then type, whatever the arrival order."""
+        other_id = uuid.uuid4()
+        async with session_factory() as db:
+            db.add(User(id=other_id, username="other", email="other@example.com", password_hash="x"))
+            await db.commit()
+        upserts = []
+
+        def record_upsert(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO calculation_stats"):
+                upserts.append((uuid.UUID(hex=parameters[0]), parameters[1]))
+
+        engine = session_factory.kw["bind"].sync_engine
+        event.listen(engine, "before_cursor_execute", record_upsert)
+        writer = CalculationWriter(session_factory, max_delay=0.05, max_batch=100, max_pending=100)
+        rows = [
+            dict(row(8.0, user_id), type=operation_type, result=8.0)
+            for user_id in sorted([OWNER_ID, other_id], reverse=True)
+            for operation_type in ("Divide", "Add")
+        ]
+        await asyncio.gather(*(writer.submit(values) for values in rows))
+        await writer.close()
+        event.remove(engine, "before_cursor_execute", record_upsert)
+
+        assert upserts == sorted(upserts)
+        assert len(upserts) == 4
+
+
+class TestProcessWriter:
+    """Test suite for the process-wide writer dependency."""
+
+    async def test_disabled_decision_is_cached(self, monkeypatch):
+        """Test that settings are read once while group commit is disabled, and again after close."""
+        reads = []
+
+        class DisabledSettings:
+            calculation_write_behind = False
+
+            def __init__(self):
+                reads.append(1)
+
+        monkeypatch.setattr(writebehind, "Settings", DisabledSettings)
+        await close_calculation_writer()
+        assert get_calculation_writer() is None
+        assert get_calculation_writer() is None
+        assert len(reads) == 1
+
+        await close_calculation_writer()
+        assert get_calculation_writer() is None
+        assert len(reads) == 2
+        await close_calculation_writer()